@@ -2,6 +2,13 @@ from django.contrib import admin
 from .models import User, Profile, Photo
 
 # Register your models here.
-admin.site.register(User)
+
+
+@admin.register(User)
+class UserAdmin(admin.ModelAdmin):
+    # Balances only change through the credit ledger (api/credits.py)
+    readonly_fields = ('credits',)
+
+
 admin.site.register(Profile)
 admin.site.register(Photo)
@@ -0,0 +1,162 @@
+"""
+Async variants of the read-heavy endpoints, routed instead of the DRF views
+when the app is served over ASGI (see ``ASYNC_READ_VIEWS`` and
+vivaham_backend/asgi.py).
+
+While one of these requests waits on the database or the cache, its worker
+serves other requests instead of sitting blocked, so a spike of slow,
+connection-bound traffic is absorbed by the event loop rather than needing
+more processes. They answer exactly like the DRF views they replace and
+reuse their query building; ``?order=recommended`` and ``?since=`` feed
+requests, which are CPU-bound, run the sync view in a thread.
+"""
+from asgiref.sync import sync_to_async
+from django.db.models import aprefetch_related_objects
+from django.http import Http404
+from django.shortcuts import aget_object_or_404
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from . import views
+from .authentication import CachedJWTAuthentication
+from .cache import afeed_cache_key, aget_feed_page, aset_feed_page
+from .conditional import check_not_modified, make_etag, set_validators
+from .instrumentation import timed
+from .models import User, Profile
+from .pagination import InvalidCursor, KeysetPagination
+from .serializers import ProfileDetailSerializer, UnlockedProfileSerializer, UserSerializer
+from .sync import is_sync_request
+
+
+def finalize(response):
+    """Render a DRF ``Response`` outside of an ``APIView``; other responses pass through."""
+    if isinstance(response, Response):
+        response.accepted_renderer = JSONRenderer()
+        response.accepted_media_type = JSONRenderer.media_type
+        response.renderer_context = {}
+        response.render()
+    return response
+
+
+class AsyncAPIView(View):
+    """
+    Base for the async views: JWT authentication through the shared auth
+    cache, the DRF request wrapper for ``query_params`` and serializer
+    context, and DRF-style JSON error responses. Only authenticated reads.
+    """
+    http_method_names = ['get', 'head', 'options']
+    authentication = CachedJWTAuthentication()
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(request)
+        try:
+            result = await self.authentication.aauthenticate(request)
+            if result is None:
+                raise exceptions.NotAuthenticated()
+            request.user, request.auth = result
+            response = await super().dispatch(request, *args, **kwargs)
+        except Http404 as exc:
+            response = self.handle_exception(request, exceptions.NotFound(*exc.args))
+        except exceptions.APIException as exc:
+            response = self.handle_exception(request, exc)
+        return finalize(response)
+
+    def handle_exception(self, request, exc):
+        # As rest_framework.views.exception_handler answers them
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = Response(data, status=exc.status_code)
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            response['WWW-Authenticate'] = self.authentication.authenticate_header(request)
+        return response
+
+
+class ProfileFeedView(AsyncAPIView):
+    """Async ``ProfileViewSet.list``."""
+
+    async def get(self, request):
+        viewset = views.ProfileViewSet(request=request, args=(), kwargs={}, action='list', format_kwarg=None)
+        if request.query_params.get('order') == 'recommended' or is_sync_request(request):
+            return await sync_to_async(viewset.list)(request)
+
+        feed = viewset.prepare_feed(request)
+        if isinstance(feed, Response):
+            return feed
+
+        cache_key = feed.cache_params and await afeed_cache_key(feed.candidate_gender, **feed.cache_params)
+        cached = await aget_feed_page(cache_key) if cache_key else None
+        if cached is not None:
+            data, etag = cached
+            return check_not_modified(request, etag) or set_validators(Response(data), etag)
+
+        try:
+            page = await feed.paginator.apaginate_queryset(feed.queryset, request)
+        except InvalidCursor as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        etag = feed.etag(page)
+        not_modified = check_not_modified(request, etag)
+        if not_modified:
+            return not_modified
+
+        with timed('serialize'):
+            data = feed.paginator.get_paginated_data(viewset.get_serializer(page, many=True).data)
+        if cache_key:
+            await aset_feed_page(cache_key, data, etag)
+        return set_validators(Response(data), etag)
+
+
+class ProfileDetailView(AsyncAPIView):
+    """Async ``views.ProfileDetailView``."""
+
+    async def get(self, request, pk):
+        queryset, selected_fields = views.ProfileDetailView.get_profile_queryset(request)
+        try:
+            profile = await queryset.aget(pk=pk)
+        except Profile.DoesNotExist:
+            if not await views.ProfileDetailView.get_unlocks(request).filter(profile_unlocked_id=pk).aexists():
+                return Response({'detail': 'You have not unlocked this profile.'}, status=status.HTTP_403_FORBIDDEN)
+            return Response({'detail': 'Profile not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        if not profile.has_unlocked:
+            return Response({'detail': 'You have not unlocked this profile.'}, status=status.HTTP_403_FORBIDDEN)
+
+        etag = make_etag('profile-detail', profile.pk, profile.updated_at, sorted(selected_fields))
+        not_modified = check_not_modified(request, etag, profile.updated_at)
+        if not_modified:
+            return not_modified
+
+        if 'photos' in selected_fields:
+            await aprefetch_related_objects([profile], 'photos')
+        with timed('serialize'):
+            data = ProfileDetailSerializer(profile, context={'request': request}).data
+        return set_validators(Response(data), etag, profile.updated_at)
+
+
+class UnlockedProfileListView(AsyncAPIView):
+    """Async ``views.UnlockedProfileListView``."""
+
+    async def get(self, request):
+        if is_sync_request(request):
+            return await sync_to_async(views.UnlockedProfileListView().get)(request)
+
+        queryset = views.UnlockedProfileListView.get_unlocked_queryset(request)
+        paginator = KeysetPagination(keys=('unlocked_at', 'id'), descending=True)
+        try:
+            page = await paginator.apaginate_queryset(queryset, request)
+        except InvalidCursor as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        with timed('serialize'):
+            data = paginator.get_paginated_data(UnlockedProfileSerializer(page, many=True, context={'request': request}).data)
+        return Response(data)
+
+
+class UserDetailView(AsyncAPIView):
+    """Async ``views.UserDetailView``."""
+
+    async def get(self, request, pk):
+        user = await aget_object_or_404(User, pk=pk)
+        return Response(UserSerializer(user, context={'request': request}).data)
@@ -0,0 +1,115 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import BlacklistMixin, RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch, get_md5_hash_password
+
+from .cache import aget_auth_user, aset_auth_user, get_auth_user, set_auth_user
+from .instrumentation import timed
+from .models import User
+from .revocation import is_revoked, revoke
+
+
+def get_cached_user(user_id):
+    """
+    The user with its profile attached, from the auth cache or else from one
+    query (which then fills the cache). Raises ``User.DoesNotExist``.
+    """
+    user = get_auth_user(user_id)
+    if user is None:
+        # select_related also records a missing profile, so reading
+        # user.profile never queries again
+        user = User.objects.select_related('profile').get(pk=user_id)
+        set_auth_user(user)
+    return user
+
+
+async def aget_cached_user(user_id):
+    user = await aget_auth_user(user_id)
+    if user is None:
+        user = await User.objects.select_related('profile').aget(pk=user_id)
+        await aset_auth_user(user)
+    return user
+
+
+class RevocableRefreshToken(RefreshToken):
+    """
+    Refresh token revoked through api/revocation.py instead of the
+    token_blacklist tables: issuing a token writes nothing, and only revoked
+    tokens are stored, until they expire.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        # Skip BlacklistMixin, which records every issued token
+        return super(BlacklistMixin, cls).for_user(user)
+
+    def outstand(self):
+        return None
+
+    def check_blacklist(self):
+        if is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        revoke(self.payload[api_settings.JTI_CLAIM], datetime_from_epoch(self.payload['exp']))
+
+
+class TimedJWTAuthentication(JWTAuthentication):
+    """JWT authentication recorded as the ``auth`` Server-Timing span."""
+
+    def authenticate(self, request):
+        with timed('auth'):
+            return super().authenticate(request)
+
+
+class CachedJWTAuthentication(TimedJWTAuthentication):
+    """
+    Resolves the token's user, with the profile attached, from a short-lived
+    shared cache instead of the database. The entry is dropped whenever the
+    user, their profile or their photos are saved, when credits are spent
+    and on logout (see api/signals.py), and expires after
+    ``AUTH_CACHE_TIMEOUT`` seconds regardless.
+    """
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+    def check_user(self, user, validated_token):
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
+
+    def get_user(self, validated_token):
+        try:
+            user = get_cached_user(self.get_user_id(validated_token))
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        return self.check_user(user, validated_token)
+
+    async def aget_user(self, validated_token):
+        try:
+            user = await aget_cached_user(self.get_user_id(validated_token))
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        return self.check_user(user, validated_token)
+
+    async def aauthenticate(self, request):
+        """``authenticate`` for the async views: token checks, then an async user lookup."""
+        with timed('auth'):
+            header = self.get_header(request)
+            if header is None:
+                return None
+            raw_token = self.get_raw_token(header)
+            if raw_token is None:
+                return None
+            validated_token = self.get_validated_token(raw_token)
+            return await self.aget_user(validated_token), validated_token
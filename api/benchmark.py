@@ -0,0 +1,387 @@
+"""
+Seeding and load generation for the ``seed_benchmark_data`` and
+``benchmark_api`` management commands.
+
+Virtual users are threads, each with its own test ``Client`` and database
+connection, driving the real URLconf and middleware in-process. Every
+request is timed and its SQL queries counted; results are written as JSON
+so a run can be compared with a stored baseline.
+
+Given a ``base_url`` they send real HTTP requests to a running server
+instead, so whole server setups (WSGI vs ASGI workers) can be compared.
+Query counts then come from the ``Server-Timing`` header, when the server
+sends it.
+"""
+import io
+import json
+import math
+import random
+import re
+import threading
+import time
+from datetime import date, timedelta
+
+import urllib3
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from .cache import bump_generation
+from .models import User, Profile, CreditEntry
+from .porutham import NAKSHATRAS, RAASIS
+
+BENCH_PREFIX = 'bench-'
+BENCH_PASSWORD = 'bench-password-1'
+BENCH_CREDITS = 1_000_000
+
+EDUCATIONS = ('B.Tech', 'B.Sc', 'B.Com', 'MBA', 'M.Tech', 'MBBS', 'PhD', 'Diploma', '')
+OCCUPATIONS = ('Software Engineer', 'Doctor', 'Teacher', 'Accountant', 'Civil Engineer', 'Business', 'Lawyer')
+CITIES = (
+    ('Chennai', 'Tamil Nadu'), ('Coimbatore', 'Tamil Nadu'), ('Madurai', 'Tamil Nadu'), ('Bengaluru', 'Karnataka'),
+    ('Hyderabad', 'Telangana'), ('Vijayawada', 'Andhra Pradesh'), ('Kochi', 'Kerala'), ('Mumbai', 'Maharashtra'),
+)
+CASTES = ('Iyer', 'Iyengar', 'Mudaliar', 'Pillai', 'Chettiar', 'Naidu', 'Reddy', 'Nair')
+RELIGIONS = ('Hindu', 'Hindu', 'Hindu', 'Christian', 'Muslim')
+MOTHER_TONGUES = ('Tamil', 'Telugu', 'Kannada', 'Malayalam')
+
+# Relative frequency of each endpoint in the virtual user request mix
+DEFAULT_MIX = {
+    'feed': 40,
+    'profile_detail': 20,
+    'unlocked_profiles': 15,
+    'unlock': 10,
+    'upload_photos': 5,
+    'login': 5,
+}
+ENDPOINTS = ('login',) + tuple(name for name in DEFAULT_MIX if name != 'login')
+
+
+def _random_profile(user, gender, rng):
+    city, state = rng.choice(CITIES)
+    return Profile(
+        user=user,
+        full_name=user.username,
+        gender=gender,
+        date_of_birth=date(1985, 1, 1) + timedelta(days=rng.randrange(15 * 365)),
+        height=rng.randrange(145, 190),
+        mother_tongue=rng.choice(MOTHER_TONGUES),
+        religion=rng.choice(RELIGIONS),
+        caste=rng.choice(CASTES),
+        raasi=rng.choice(RAASIS),
+        nakshatram=rng.choice(NAKSHATRAS),
+        city=city,
+        state=state,
+        education=rng.choice(EDUCATIONS),
+        occupation=rng.choice(OCCUPATIONS),
+        salary=round(rng.uniform(2, 60), 1),
+        about='Looking for a kind and understanding partner.' if rng.random() < 0.6 else '',
+    )
+
+
+def seed(profiles, virtual_users, rng, batch_size=1000):
+    """
+    Create ``profiles`` candidate profiles and ``virtual_users`` accounts for
+    the benchmark, all with usernames starting with ``BENCH_PREFIX``.
+
+    Rows are bulk inserted, so the per-save signals do not run: the feed
+    cache is invalidated once at the end, and seeded profiles are not in the
+    search index or the sync change log.
+    """
+    password = make_password(BENCH_PASSWORD)
+    accounts = [(f'{BENCH_PREFIX}p{i}', 'female' if i % 2 else 'male', 0) for i in range(profiles)]
+    accounts += [(f'{BENCH_PREFIX}vu{i}', 'female' if i % 2 else 'male', BENCH_CREDITS) for i in range(virtual_users)]
+
+    for start in range(0, len(accounts), batch_size):
+        chunk = accounts[start:start + batch_size]
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username=username, email=f'{username}@example.com', password=password, credits=credits)
+                for username, _, credits in chunk
+            ])
+            batch = [_random_profile(user, gender, rng) for user, (_, gender, _) in zip(users, chunk)]
+            for profile in batch:
+                profile.sync_match_keys()
+            Profile.objects.bulk_create(batch)
+            # Recorded in the ledger, so the seeded balances reconcile
+            CreditEntry.objects.bulk_create([
+                CreditEntry(user=user, kind='grant', amount=credits)
+                for user, (_, _, credits) in zip(users, chunk) if credits
+            ])
+
+    for gender_key in ('male', 'female'):
+        bump_generation(gender_key)
+    return len(accounts)
+
+
+def delete_seeded():
+    deleted, _ = User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+    return deleted
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+
+class Stats:
+    """Per-endpoint latencies, query counts and status codes; thread safe."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.recording = True
+        self.endpoints = {name: {'latencies': [], 'queries': [], 'status': {}, 'errors': 0} for name in ENDPOINTS}
+
+    def record(self, name, seconds, queries, status_code):
+        with self.lock:
+            if not self.recording:
+                return
+            entry = self.endpoints[name]
+            entry['latencies'].append(seconds * 1000)
+            entry['queries'].append(queries)
+            entry['status'][str(status_code)] = entry['status'].get(str(status_code), 0) + 1
+            if status_code is None or status_code >= 500:
+                entry['errors'] += 1
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {name: {'latencies': [], 'queries': [], 'status': {}, 'errors': 0} for name in ENDPOINTS}
+
+    def summary(self, elapsed):
+        results = {}
+        for name, entry in self.endpoints.items():
+            count = len(entry['latencies'])
+            if not count:
+                continue
+            latencies = sorted(entry['latencies'])
+            results[name] = {
+                'requests': count,
+                'errors': entry['errors'],
+                'status': entry['status'],
+                'throughput_rps': round(count / elapsed, 2),
+                'latency_ms': {
+                    'mean': round(sum(latencies) / count, 2),
+                    'p50': round(percentile(latencies, 50), 2),
+                    'p95': round(percentile(latencies, 95), 2),
+                    'p99': round(percentile(latencies, 99), 2),
+                    'max': round(latencies[-1], 2),
+                },
+                'queries': {
+                    'mean': round(sum(entry['queries']) / count, 2),
+                    'max': max(entry['queries']),
+                },
+            }
+        return results
+
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+class HttpResult:
+    def __init__(self, response):
+        self.status_code = response.status
+        self.content = response.data
+        timing = response.headers.get('Server-Timing', '')
+        match = SERVER_TIMING_QUERIES.search(timing)
+        self.queries = int(match.group(1)) if match else 0
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class HttpTransport:
+    """Sends a virtual user's requests to a running server over one keep-alive connection."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.pool = urllib3.PoolManager(maxsize=1, retries=False, timeout=urllib3.Timeout(total=60))
+
+    def send(self, method, path, headers, data=None, content_type=None):
+        url = self.base_url + path
+        method = method.upper()
+        if method == 'GET':
+            response = self.pool.request(method, url, fields=data, headers=headers)
+        elif content_type == 'application/json':
+            response = self.pool.request(
+                method, url, body=json.dumps(data), headers={**headers, 'Content-Type': content_type},
+            )
+        else:
+            fields = {
+                name: (value.name, value.read(), value.content_type) if hasattr(value, 'read') else value
+                for name, value in (data or {}).items()
+            }
+            response = self.pool.request(method, url, fields=fields, headers=headers)
+        return HttpResult(response)
+
+
+def _test_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (640, 480), (200, 120, 80)).save(buffer, 'JPEG', quality=80)
+    return buffer.getvalue()
+
+
+class VirtualUser(threading.Thread):
+    """
+    Logs in as one seeded account and sends requests from the mix until
+    ``deadline`` or until it has made ``max_requests``.
+    """
+
+    def __init__(self, username, candidate_ids, stats, mix, deadline, max_requests, seed, image, base_url=None):
+        super().__init__(daemon=True)
+        self.username = username
+        self.candidate_ids = candidate_ids
+        self.stats = stats
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.deadline = deadline
+        self.max_requests = max_requests
+        self.rng = random.Random(seed)
+        self.image = image
+        self.client = Client(raise_request_exception=False, HTTP_HOST='localhost')
+        self.http = HttpTransport(base_url) if base_url else None
+        self.headers = {}
+        self.unlocked = []
+        self.cursor = None
+
+    def request(self, name, method, path, **kwargs):
+        status_code = None
+        queries = 0
+        started = time.perf_counter()
+        try:
+            if self.http is not None:
+                response = self.http.send(method, path, self.headers, **kwargs)
+                queries = response.queries
+            else:
+                with CaptureQueriesContext(connection) as captured:
+                    response = getattr(self.client, method)(path, headers=self.headers, **kwargs)
+                queries = len(captured)
+            status_code = response.status_code
+        finally:
+            self.stats.record(name, time.perf_counter() - started, queries, status_code)
+        return response
+
+    def login(self):
+        response = self.request('login', 'post', '/api/auth/login/', data={
+            'username': self.username, 'password': BENCH_PASSWORD,
+        }, content_type='application/json')
+        if response.status_code == 200:
+            self.headers = {'Authorization': f"Bearer {response.json()['access']}"}
+        return response
+
+    def feed(self):
+        # Mostly keep scrolling; sometimes start again from the top
+        data = {'cursor': self.cursor} if self.cursor and self.rng.random() < 0.7 else {}
+        response = self.request('feed', 'get', '/api/profiles/', data=data)
+        self.cursor = response.json().get('next_cursor') if response.status_code == 200 else None
+        return response
+
+    def profile_detail(self):
+        pk = self.rng.choice(self.unlocked or self.candidate_ids)
+        return self.request('profile_detail', 'get', f'/api/profiles/{pk}/')
+
+    def unlocked_profiles(self):
+        return self.request('unlocked_profiles', 'get', '/api/me/unlocked-profiles/')
+
+    def unlock(self):
+        pk = self.rng.choice(self.candidate_ids)
+        response = self.request('unlock', 'post', f'/api/profiles/{pk}/unlock/')
+        if response.status_code == 200:
+            self.unlocked.append(pk)
+        return response
+
+    def upload_photos(self):
+        upload = SimpleUploadedFile('bench.jpg', self.image, content_type='image/jpeg')
+        return self.request('upload_photos', 'post', '/api/me/profile/upload-photos/', data={'photo': upload})
+
+    def run(self):
+        try:
+            self.login()
+            sent = 0
+            while time.monotonic() < self.deadline and (self.max_requests is None or sent < self.max_requests):
+                name = self.rng.choices(self.names, self.weights)[0]
+                sent += 1
+                try:
+                    response = getattr(self, name)()
+                except Exception:
+                    # Already recorded as an error by request()
+                    continue
+                if response.status_code == 401:
+                    # Access tokens are short lived; log in again
+                    self.login()
+        finally:
+            connection.close()
+
+
+def run_load(virtual_users, duration, warmup=0, max_requests=None, mix=None, seed=0, base_url=None):
+    """
+    Drive the API with ``virtual_users`` concurrent users for ``duration``
+    seconds after ``warmup`` unrecorded seconds, in-process or against the
+    server at ``base_url`` (which must use this database). Returns
+    ``(summary, elapsed)``.
+    """
+    usernames = list(
+        User.objects.filter(username__startswith=f'{BENCH_PREFIX}vu').order_by('username')
+        .values_list('username', flat=True)[:virtual_users]
+    )
+    if len(usernames) < virtual_users:
+        raise ValueError(f'Only {len(usernames)} benchmark users exist; seed at least {virtual_users}.')
+    candidate_ids = list(
+        Profile.objects.filter(user__username__startswith=f'{BENCH_PREFIX}p').values_list('id', flat=True)
+    )
+    if not candidate_ids:
+        raise ValueError('No benchmark profiles exist; run seed_benchmark_data first.')
+
+    stats = Stats()
+    image = _test_image()
+    started = time.monotonic()
+    deadline = started + warmup + duration
+    users = [
+        VirtualUser(username, candidate_ids, stats, mix or DEFAULT_MIX, deadline, max_requests, seed + i, image, base_url)
+        for i, username in enumerate(usernames)
+    ]
+    for user in users:
+        user.start()
+    if warmup:
+        time.sleep(warmup)
+        stats.reset()
+    measured_from = time.monotonic()
+    for user in users:
+        user.join()
+    elapsed = time.monotonic() - measured_from
+    with stats.lock:
+        stats.recording = False
+    return stats.summary(elapsed), elapsed
+
+
+def throughput(endpoints):
+    """Requests per second over all endpoints."""
+    return sum(result['throughput_rps'] for result in endpoints.values())
+
+
+def compare(results, baseline, tolerance):
+    """
+    Regressions of ``results`` against ``baseline``: p95 latency more than
+    ``tolerance`` (a fraction) slower, more queries per request on average,
+    or a higher error rate. Returns a list of messages.
+    """
+    regressions = []
+    for name, current in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if not previous:
+            continue
+        p95, base_p95 = current['latency_ms']['p95'], previous['latency_ms']['p95']
+        if p95 > base_p95 * (1 + tolerance):
+            regressions.append(f'{name}: p95 {base_p95:.1f} ms -> {p95:.1f} ms')
+        queries, base_queries = current['queries']['mean'], previous['queries']['mean']
+        if queries > base_queries + 0.5:
+            regressions.append(f'{name}: queries/request {base_queries:.1f} -> {queries:.1f}')
+        error_rate = current['errors'] / current['requests']
+        base_error_rate = previous['errors'] / previous['requests']
+        if error_rate > base_error_rate + 0.01:
+            regressions.append(f'{name}: error rate {base_error_rate:.1%} -> {error_rate:.1%}')
+    return regressions
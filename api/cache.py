@@ -0,0 +1,150 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+FEED_CACHE_ALIAS = getattr(settings, 'FEED_CACHE_ALIAS', 'default')
+FEED_CACHE_TIMEOUT = getattr(settings, 'FEED_CACHE_TIMEOUT', 300)
+
+
+def get_feed_cache():
+    return caches[FEED_CACHE_ALIAS]
+
+
+def _generation_key(gender_key):
+    return f'feed:generation:{gender_key or "-"}'
+
+
+def _fresh_generation():
+    return time.time_ns()
+
+
+def get_generation(gender_key):
+    """
+    Current generation of the feed showing candidates of ``gender_key``.
+    Cached pages embed the generation in their key, so bumping it orphans
+    every page built from the old data without having to find and delete them.
+    """
+    cache = get_feed_cache()
+    key = _generation_key(gender_key)
+    generation = cache.get(key)
+    if generation is None:
+        # Seed from the clock so an evicted generation never comes back at a
+        # value whose pages may still be cached
+        cache.add(key, _fresh_generation(), timeout=None)
+        generation = cache.get(key, 0)
+    return generation
+
+
+async def aget_generation(gender_key):
+    cache = get_feed_cache()
+    key = _generation_key(gender_key)
+    generation = await cache.aget(key)
+    if generation is None:
+        await cache.aadd(key, _fresh_generation(), timeout=None)
+        generation = await cache.aget(key, 0)
+    return generation
+
+
+def bump_generation(gender_key):
+    # A new value written outright rather than incr, which the file cache
+    # does as a get and a set: two concurrent bumps there could land on the
+    # same value and leave pages of the data in between reachable
+    get_feed_cache().set(_generation_key(gender_key), _fresh_generation(), timeout=None)
+
+
+def _digest(params):
+    raw = json.dumps(params, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _feed_page_key(gender_key, generation, params):
+    # v3: entries hold the page and its ETag, no longer a Last-Modified
+    return f'feed:page:v3:{gender_key or "-"}:{generation}:{_digest(params)}'
+
+
+def feed_cache_key(gender_key, **params):
+    """
+    Build the cache key for one feed page. ``params`` must hold everything
+    that shapes the page (viewer gender and DOB, filters, cursor, limit).
+    """
+    return _feed_page_key(gender_key, get_generation(gender_key), params)
+
+
+async def afeed_cache_key(gender_key, **params):
+    return _feed_page_key(gender_key, await aget_generation(gender_key), params)
+
+
+def get_feed_page(key):
+    """Return ``(data, etag)`` for a cached page, or None."""
+    return get_feed_cache().get(key)
+
+
+async def aget_feed_page(key):
+    return await get_feed_cache().aget(key)
+
+
+def set_feed_page(key, data, etag):
+    get_feed_cache().set(key, (data, etag), timeout=FEED_CACHE_TIMEOUT)
+
+
+async def aset_feed_page(key, data, etag):
+    await get_feed_cache().aset(key, (data, etag), timeout=FEED_CACHE_TIMEOUT)
+
+
+def ranking_cache_key(gender_key, **params):
+    """
+    Cache key for the ranked candidates of an ``?order=recommended`` feed.
+    ``params`` hold what decides the ranking: viewer, weights and filters,
+    but not the cursor, so every page of the feed shares the entry.
+    """
+    return f'feed:ranking:v1:{gender_key or "-"}:{get_generation(gender_key)}:{_digest(params)}'
+
+
+def get_ranking(key):
+    """The cached ``[(score, id), ...]``, best first, or None."""
+    return get_feed_cache().get(key)
+
+
+def set_ranking(key, ranked):
+    get_feed_cache().set(key, ranked, timeout=FEED_CACHE_TIMEOUT)
+
+
+AUTH_CACHE_ALIAS = getattr(settings, 'AUTH_CACHE_ALIAS', 'default')
+AUTH_CACHE_TIMEOUT = getattr(settings, 'AUTH_CACHE_TIMEOUT', 60)
+
+
+def _auth_key(user_id):
+    return f'auth:user:v1:{user_id}'
+
+
+def get_auth_user(user_id):
+    """The cached ``User`` (with its profile attached) for ``user_id``, or None."""
+    return caches[AUTH_CACHE_ALIAS].get(_auth_key(user_id))
+
+
+async def aget_auth_user(user_id):
+    return await caches[AUTH_CACHE_ALIAS].aget(_auth_key(user_id))
+
+
+def set_auth_user(user):
+    caches[AUTH_CACHE_ALIAS].set(_auth_key(user.pk), user, timeout=AUTH_CACHE_TIMEOUT)
+
+
+async def aset_auth_user(user):
+    await caches[AUTH_CACHE_ALIAS].aset(_auth_key(user.pk), user, timeout=AUTH_CACHE_TIMEOUT)
+
+
+def invalidate_auth_user(user_id):
+    """
+    Drop the cached user. Done again on commit, so a request that re-caches
+    the old row before the change is committed can't keep it around.
+    """
+    key = _auth_key(user_id)
+    cache = caches[AUTH_CACHE_ALIAS]
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,32 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """Strong ETag over ``parts``, which must have a stable ``repr``."""
+    return quote_etag(hashlib.sha1(repr(parts).encode()).hexdigest())
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Per-user data: clients may keep it but must revalidate before reuse
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def check_not_modified(request, etag, last_modified=None):
+    """
+    Evaluate ``If-None-Match`` / ``If-Modified-Since`` against the current
+    validators. Returns a 304 response when the client's copy is still good,
+    otherwise None. Call this before serializing, so a hit costs nothing
+    beyond computing the validators.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        return None
+    return set_validators(response, etag, last_modified)
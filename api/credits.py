@@ -0,0 +1,216 @@
+"""
+Credit accounting. ``User.credits`` is the balance requests read; every
+change to it is made here, in the same transaction as the ``CreditEntry``
+rows that record it, so the ledger always adds up to the balance and can be
+audited (``reconcile_credits``) or used to rebuild it.
+"""
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .cache import invalidate_auth_user
+from .metrics import credits_added, credits_spent, profile_unlocks, unlock_rejections
+from .models import User, Profile, CreditTransaction, CreditEntry, CreditSnapshot
+
+UNLOCK_COST = 1
+REGISTRATION_GRANT = 20
+SNAPSHOT_INTERVAL = getattr(settings, 'CREDIT_SNAPSHOT_INTERVAL', 100)
+
+
+class InsufficientCredits(Exception):
+    pass
+
+
+def post_entries(user_id, entries):
+    """
+    Append ``entries`` (unsaved ``CreditEntry`` rows of ``user_id``) to the
+    ledger and move ``User.credits`` by their total, in the caller's
+    transaction. Raises ``InsufficientCredits`` if the balance would drop
+    below zero.
+
+    The balance is moved first, with a conditional ``UPDATE``. That locks
+    the user row until commit, so a user's entries are inserted, and
+    numbered, in the order their amounts were applied to the balance.
+    """
+    total = sum(entry.amount for entry in entries)
+    users = User.objects.filter(pk=user_id)
+    if total < 0:
+        users = users.filter(credits__gte=-total)
+    with transaction.atomic(savepoint=False):
+        if not users.update(credits=F('credits') + total):
+            raise InsufficientCredits(-total)
+        CreditEntry.objects.bulk_create(entries)
+        _snapshot_if_due(user_id)
+    # The balance was changed with update(), which sends no signal
+    invalidate_auth_user(user_id)
+
+
+def _snapshot_if_due(user_id):
+    last_snapshot = CreditSnapshot.objects.filter(user_id=user_id).order_by('-entry_id').values('entry_id')[:1]
+    tail = list(
+        CreditEntry.objects
+        .filter(user_id=user_id, id__gt=Coalesce(Subquery(last_snapshot), 0, output_field=models.BigIntegerField()))
+        .order_by('-id').values_list('id', flat=True)[:SNAPSHOT_INTERVAL]
+    )
+    if len(tail) == SNAPSHOT_INTERVAL:
+        # The user row is locked, so the balance is the one as of the newest entry
+        balance = User.objects.values_list('credits', flat=True).get(pk=user_id)
+        CreditSnapshot.objects.create(user_id=user_id, entry_id=tail[0], balance=balance)
+
+
+def grant_registration_credits(user):
+    """Give a new ``user`` their free credits."""
+    post_entries(user.pk, [CreditEntry(user=user, kind='grant', amount=REGISTRATION_GRANT)])
+    user.credits += REGISTRATION_GRANT
+    credits_added.inc(REGISTRATION_GRANT, kind='grant')
+
+
+def purchase_credits(user, amount, reference):
+    """
+    Add ``amount`` bought credits to ``user``'s balance, for the payment
+    ``reference``; call it once the payment is confirmed. A payment is only
+    ever credited once: returns False if ``reference`` already was.
+    """
+    if amount <= 0:
+        raise ValueError('A purchase must add credits.')
+    try:
+        with transaction.atomic():
+            post_entries(user.pk, [CreditEntry(user=user, kind='purchase', amount=amount, reference=reference)])
+    except IntegrityError:
+        return False
+    user.refresh_from_db(fields=['credits'])
+    credits_added.inc(amount, kind='purchase')
+    return True
+
+
+def unlock_profiles(user, profile_ids):
+    """
+    Unlock ``profile_ids`` for ``user`` in one transaction.
+
+    Credits are taken with a single conditional ``UPDATE ... SET credits =
+    credits - n WHERE credits >= n`` (see ``post_entries``), so concurrent
+    requests can never spend the same credit twice, and the unique
+    constraint on unlock transactions stops a profile being charged for
+    twice. Either every new unlock is charged and recorded or none is.
+
+    Returns ``(unlocked, already_unlocked, not_found)`` lists of profile ids
+    and updates ``user.credits`` to the new balance.
+    """
+    profile_ids = list(dict.fromkeys(profile_ids))
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                result = _unlock(user, profile_ids)
+        except InsufficientCredits:
+            unlock_rejections.inc(reason='insufficient_credits')
+            raise
+        except IntegrityError:
+            # A concurrent request unlocked one of these profiles between our
+            # read and insert; everything was rolled back, so recompute once.
+            if attempt:
+                raise
+        else:
+            unlocked = result[0]
+            profile_unlocks.inc(len(unlocked))
+            credits_spent.inc(UNLOCK_COST * len(unlocked), action='unlock')
+            return result
+
+
+def _unlock(user, profile_ids):
+    found = set(Profile.objects.filter(pk__in=profile_ids).values_list('pk', flat=True))
+    already = set(CreditTransaction.objects.filter(
+        user=user, action='unlock', profile_unlocked_id__in=found,
+    ).values_list('profile_unlocked_id', flat=True))
+    not_found = [pk for pk in profile_ids if pk not in found]
+    already_unlocked = [pk for pk in profile_ids if pk in already]
+    to_unlock = [pk for pk in profile_ids if pk in found and pk not in already]
+
+    if to_unlock:
+        post_entries(user.pk, [
+            CreditEntry(user=user, kind='unlock', amount=-UNLOCK_COST, profile_id=pk) for pk in to_unlock
+        ])
+        CreditTransaction.objects.bulk_create([
+            CreditTransaction(user=user, profile_unlocked_id=pk, action='unlock', credits_spent=UNLOCK_COST)
+            for pk in to_unlock
+        ])
+        user.refresh_from_db(fields=['credits'])
+
+    return to_unlock, already_unlocked, not_found
+
+
+def audit_balances(stats, chunk_size=5000):
+    """
+    Check every balance, and every snapshot, against the ledger in one pass.
+
+    Users, entries and snapshots are each streamed in user order (the
+    entries and snapshots through their ``(user, id)`` indexes) and merged,
+    so memory stays flat however long the ledger grows. Yields
+    ``(user_id, problem)``; ``stats`` counts the users and entries checked.
+    """
+    users = User.objects.order_by('pk').values_list('pk', 'credits')
+    entries = CreditEntry.objects.order_by('user_id', 'id').values_list('user_id', 'id', 'amount')
+    snapshots = CreditSnapshot.objects.order_by('user_id', 'entry_id').values_list('user_id', 'entry_id', 'balance')
+    entry_groups = groupby(entries.iterator(chunk_size=chunk_size), key=itemgetter(0))
+    snapshot_groups = groupby(snapshots.iterator(chunk_size=chunk_size), key=itemgetter(0))
+    next_entries = next(entry_groups, None)
+    next_snapshots = next(snapshot_groups, None)
+
+    for user_id, credits in users.iterator(chunk_size=chunk_size):
+        # Skip rows of users missing from the user stream
+        while next_entries and next_entries[0] < user_id:
+            next_entries = next(entry_groups, None)
+        while next_snapshots and next_snapshots[0] < user_id:
+            next_snapshots = next(snapshot_groups, None)
+
+        has_entries = bool(next_entries) and next_entries[0] == user_id
+        has_snapshots = bool(next_snapshots) and next_snapshots[0] == user_id
+        user_snapshots = next_snapshots[1] if has_snapshots else iter(())
+        snapshot = next(user_snapshots, None)
+        balance = 0
+        went_negative = False
+        for _, entry_id, amount in (next_entries[1] if has_entries else ()):
+            balance += amount
+            stats['entries'] += 1
+            if balance < 0 and not went_negative:
+                went_negative = True
+                yield user_id, f'balance drops to {balance} at entry {entry_id}'
+            while snapshot and snapshot[1] <= entry_id:
+                if snapshot[1] < entry_id:
+                    yield user_id, f'snapshot at entry {snapshot[1]}, which is not one of theirs'
+                elif snapshot[2] != balance:
+                    yield user_id, f'snapshot at entry {entry_id} says {snapshot[2]}, ledger gives {balance}'
+                snapshot = next(user_snapshots, None)
+        while snapshot:
+            yield user_id, f'snapshot at entry {snapshot[1]}, which is not one of theirs'
+            snapshot = next(user_snapshots, None)
+        if balance != credits:
+            yield user_id, f'balance is {credits}, ledger gives {balance}'
+        stats['users'] += 1
+
+        if has_entries:
+            next_entries = next(entry_groups, None)
+        if has_snapshots:
+            next_snapshots = next(snapshot_groups, None)
+
+
+def repair_balance(user_id):
+    """
+    Set ``user_id``'s balance to the sum of all their entries, and replace
+    their snapshots with one of that balance.
+    """
+    with transaction.atomic():
+        # Entries are only posted with the user row locked
+        list(User.objects.select_for_update().filter(pk=user_id).values_list('pk', flat=True))
+        entries = CreditEntry.objects.filter(user_id=user_id)
+        balance = entries.aggregate(total=Sum('amount'))['total'] or 0
+        User.objects.filter(pk=user_id).update(credits=balance)
+        CreditSnapshot.objects.filter(user_id=user_id).delete()
+        last_entry = entries.order_by('-id').values_list('id', flat=True).first()
+        if last_entry:
+            CreditSnapshot.objects.create(user_id=user_id, entry_id=last_entry, balance=balance)
+    invalidate_auth_user(user_id)
+    return balance
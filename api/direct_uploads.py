@@ -0,0 +1,123 @@
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+
+from .models import Photo
+
+PHOTO_UPLOAD_MAX_SIZE = getattr(settings, 'PHOTO_UPLOAD_MAX_SIZE', 10 * 1024 * 1024)
+PHOTO_UPLOAD_EXPIRY = getattr(settings, 'PHOTO_UPLOAD_EXPIRY', 15 * 60)  # seconds
+# Raw client uploads land here; the photo worker replaces them with variants
+DIRECT_UPLOAD_DIR = 'uploads'
+
+UPLOAD_ID_SALT = 'api.direct_uploads.upload_id'
+LOCAL_TOKEN_SALT = 'api.direct_uploads.local'
+
+
+class InvalidUpload(ValueError):
+    pass
+
+
+class S3UploadBackend:
+    """
+    Issues presigned POST targets for the bucket behind an ``S3Storage``.
+    The size and content type limits are part of the signed policy, so S3
+    itself rejects anything we would not accept.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    @property
+    def client(self):
+        return self.storage.bucket.meta.client
+
+    def create_target(self, name, request):
+        presigned = self.client.generate_presigned_post(
+            Bucket=self.storage.bucket_name,
+            Key=self.storage._normalize_name(name),
+            Conditions=[
+                ['content-length-range', 1, PHOTO_UPLOAD_MAX_SIZE],
+                ['starts-with', '$Content-Type', 'image/'],
+            ],
+            ExpiresIn=PHOTO_UPLOAD_EXPIRY,
+        )
+        return {'method': 'POST', 'url': presigned['url'], 'fields': presigned['fields'], 'file_field': 'file'}
+
+    def get_size(self, name):
+        try:
+            head = self.client.head_object(Bucket=self.storage.bucket_name, Key=self.storage._normalize_name(name))
+        except self.client.exceptions.ClientError:
+            return None
+        return head['ContentLength']
+
+
+class LocalUploadBackend:
+    """
+    Stand-in for S3 when media is on the local filesystem (dev and tests).
+    Targets point at ``LocalUploadView``, which accepts the same multipart
+    POST a client would send to S3 and authorises it with a signed token.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def create_target(self, name, request):
+        token = signing.dumps(name, salt=LOCAL_TOKEN_SALT)
+        return {
+            'method': 'POST',
+            'url': request.build_absolute_uri(reverse('direct-upload-local')),
+            'fields': {'token': token},
+            'file_field': 'file',
+        }
+
+    def get_size(self, name):
+        if not self.storage.exists(name):
+            return None
+        return self.storage.size(name)
+
+    def read_token(self, token):
+        try:
+            return signing.loads(token, salt=LOCAL_TOKEN_SALT, max_age=PHOTO_UPLOAD_EXPIRY)
+        except signing.BadSignature:
+            raise InvalidUpload('Invalid or expired upload token.')
+
+
+def get_upload_backend():
+    storage = Photo._meta.get_field('image').storage
+    if hasattr(storage, 'bucket'):
+        return S3UploadBackend(storage)
+    return LocalUploadBackend(storage)
+
+
+def create_upload(user, request):
+    """
+    Reserve a storage name for one raw upload and return the target the
+    client uploads to, plus the ``upload_id`` it later confirms.
+    """
+    name = f'{DIRECT_UPLOAD_DIR}/{uuid.uuid4().hex}'
+    target = get_upload_backend().create_target(name, request)
+    target['upload_id'] = signing.dumps({'user': str(user.pk), 'name': name}, salt=UPLOAD_ID_SALT)
+    target['max_size'] = PHOTO_UPLOAD_MAX_SIZE
+    return target
+
+
+def verify_upload(user, upload_id):
+    """
+    Check that ``upload_id`` was issued to ``user``, has not expired and that
+    the object really is in storage within the size limit. Returns its name.
+    """
+    try:
+        data = signing.loads(upload_id, salt=UPLOAD_ID_SALT, max_age=PHOTO_UPLOAD_EXPIRY)
+    except signing.BadSignature:
+        raise InvalidUpload('Invalid or expired upload id.')
+    if data.get('user') != str(user.pk):
+        raise InvalidUpload('Invalid or expired upload id.')
+
+    size = get_upload_backend().get_size(data['name'])
+    if size is None:
+        raise InvalidUpload('File has not been uploaded.')
+    if size > PHOTO_UPLOAD_MAX_SIZE:
+        raise InvalidUpload('File is too large.')
+    return data['name']
@@ -0,0 +1,111 @@
+import io
+import uuid
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+# name -> bounding box (width, height); images are only ever scaled down
+PHOTO_VARIANTS = {
+    'thumb': (160, 160),
+    'card': (480, 640),
+    'full': (1280, 1280),
+}
+# Encoded for every variant; WebP for clients that support it, JPEG fallback
+PHOTO_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+PHOTO_UPLOAD_DIR = 'profile_photos'
+
+
+def is_image(upload):
+    """
+    Cheap check that ``upload`` is an image Pillow can read. The pixels are
+    not decoded here; that happens later in the photo worker.
+    """
+    try:
+        with Image.open(upload) as image:
+            image.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        return False
+    finally:
+        upload.seek(0)
+    return True
+
+
+def render_variants(source):
+    """
+    Decode ``source`` once and re-encode it into every variant and format.
+    EXIF orientation is applied to the pixels and the metadata itself is
+    dropped (GPS, camera serials). Returns ``{variant: {format: bytes}}``.
+    """
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            image = image.convert('RGBA')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode == 'L':
+            image = image.convert('RGB')
+
+        rendered = {}
+        # Largest first, so each smaller variant is resampled from the
+        # previous one instead of from the full-size original
+        current = image
+        for name, size in sorted(PHOTO_VARIANTS.items(), key=lambda item: -item[1][0] * item[1][1]):
+            current = current.copy()
+            current.thumbnail(size, Image.Resampling.LANCZOS)
+            rendered[name] = {}
+            for ext, (fmt, options) in PHOTO_FORMATS.items():
+                buffer = io.BytesIO()
+                current.save(buffer, fmt, **options)
+                rendered[name][ext] = buffer.getvalue()
+    return rendered
+
+
+def store_variants(storage, rendered, stem=None):
+    """
+    Write rendered variants to ``storage`` and return the ``Photo.variants``
+    mapping of ``{variant: {format: name}}``.
+    """
+    stem = stem or uuid.uuid4().hex
+    variants = {}
+    for name, encoded in rendered.items():
+        variants[name] = {}
+        for ext, data in encoded.items():
+            path = f'{PHOTO_UPLOAD_DIR}/{stem}_{name}.{ext}'
+            variants[name][ext] = storage.save(path, ContentFile(data))
+    return variants
+
+
+def process_photo(photo, source=None):
+    """
+    Render and store all variants for ``photo`` and point ``photo.image`` at
+    the EXIF-free full-size JPEG. ``source`` defaults to the stored image.
+    The caller is responsible for saving ``photo``.
+    """
+    storage = photo.image.storage
+    if source is None:
+        with photo.image.open('rb') as stored:
+            rendered = render_variants(stored)
+    else:
+        rendered = render_variants(source)
+    photo.variants = store_variants(storage, rendered)
+    photo.image.name = photo.variants['full']['jpeg']
+    return photo
+
+
+def variant_names(variants):
+    """Every storage name in a ``Photo.variants`` mapping."""
+    return {path for encoded in variants.values() for path in encoded.values()}
+
+
+def variant_urls(storage, variants):
+    return {
+        name: {ext: storage.url(path) for ext, path in encoded.items()}
+        for name, encoded in variants.items()
+    }
@@ -0,0 +1,91 @@
+import heapq
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+# Slowest statements kept per request for the slow-request log
+TOP_QUERIES = 5
+
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Time spent in one request, collected by ``RequestTimingMiddleware``:
+    SQL statements run through ``query_wrapper`` and named spans recorded
+    with ``timed()``.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.spans = {}
+        self.slowest = []  # min-heap of (duration, sql)
+
+    def query_wrapper(self, execute, sql, params, many, context):
+        """``connection.execute_wrapper`` hook timing every statement."""
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - started
+            self.queries += 1
+            self.sql_time += duration
+            # Statements only, never params: they can hold personal data
+            if len(self.slowest) < TOP_QUERIES:
+                heapq.heappush(self.slowest, (duration, sql))
+            elif duration > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (duration, sql))
+
+    def add_span(self, name, duration):
+        self.spans[name] = self.spans.get(name, 0.0) + duration
+
+    def top_queries(self):
+        return sorted(self.slowest, reverse=True)
+
+    def server_timing(self, total):
+        """Value for the ``Server-Timing`` header; durations in ms."""
+        metrics = [f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"']
+        metrics += [f'{name};dur={duration * 1000:.1f}' for name, duration in self.spans.items()]
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every connection (see api/signals.py).
+    Reports to the current request through its context, which also reaches
+    the threads the async ORM runs queries in.
+    """
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings.query_wrapper(execute, sql, params, many, context)
+
+
+def current_timings():
+    """The ``RequestTimings`` of the request being handled, or None."""
+    return _current.get()
+
+
+def start_request():
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+@contextmanager
+def timed(name):
+    """Add the time spent in the block to the current request's ``name`` span."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        timings.add_span(name, perf_counter() - started)
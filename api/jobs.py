@@ -0,0 +1,143 @@
+import logging
+import os
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .images import process_photo
+from .models import Photo, PhotoJob
+
+logger = logging.getLogger(__name__)
+
+PHOTO_JOB_MAX_ATTEMPTS = getattr(settings, 'PHOTO_JOB_MAX_ATTEMPTS', 5)
+PHOTO_JOB_RETRY_DELAY = getattr(settings, 'PHOTO_JOB_RETRY_DELAY', 10)  # seconds, doubled per attempt
+# A running job whose worker died is picked up again after this long
+PHOTO_JOB_LEASE = getattr(settings, 'PHOTO_JOB_LEASE', 300)
+
+
+def get_spool_storage():
+    """
+    Local disk that holds raw uploads until a worker has processed them.
+    Must be visible to both the web and worker processes.
+    """
+    return FileSystemStorage(location=getattr(
+        settings, 'PHOTO_SPOOL_ROOT', os.path.join(settings.BASE_DIR, 'spool'),
+    ))
+
+
+def enqueue_photos(profile, uploads):
+    """
+    Spool ``uploads`` to local disk and queue them for processing.
+    Returns the created pending photos.
+    """
+    spool = get_spool_storage()
+    names = []
+    for upload in uploads:
+        ext = os.path.splitext(upload.name)[1].lower()
+        names.append(spool.save(f'{uuid.uuid4().hex}{ext}', upload))
+    return _create_pending_photos(profile, 'spool', names)
+
+
+def enqueue_stored_photos(profile, names):
+    """
+    Queue raw uploads that the client already put into the configured
+    storage (see api/direct_uploads.py). Returns the created pending photos.
+    """
+    return _create_pending_photos(profile, 'storage', names)
+
+
+def _create_pending_photos(profile, source, names):
+    # Pending Photo rows and their jobs go in as two bulk inserts
+    with transaction.atomic():
+        photos = Photo.objects.bulk_create([
+            Photo(profile=profile, status='pending', upload_name=name if source == 'storage' else '')
+            for name in names
+        ])
+        PhotoJob.objects.bulk_create([
+            PhotoJob(photo=photo, source=source, source_name=name) for photo, name in zip(photos, names)
+        ])
+    return photos
+
+
+def get_source_storage(job):
+    if job.source == 'storage':
+        return Photo._meta.get_field('image').storage
+    return get_spool_storage()
+
+
+def claim_jobs(limit):
+    """
+    Lock up to ``limit`` due jobs for this worker. Uses SKIP LOCKED where the
+    database supports it, so several workers never claim the same job.
+    """
+    now = timezone.now()
+    due = Q(status='queued', available_at__lte=now) | Q(
+        status='running', locked_at__lt=now - timedelta(seconds=PHOTO_JOB_LEASE),
+    )
+    with transaction.atomic():
+        jobs = list(
+            PhotoJob.objects.select_for_update(skip_locked=True)
+            .filter(due).order_by('available_at')[:limit]
+        )
+        PhotoJob.objects.filter(pk__in=[job.pk for job in jobs]).update(status='running', locked_at=now)
+    return jobs
+
+
+def run_job(job):
+    """
+    Process one claimed job. Returns True on success; on failure the job is
+    rescheduled with exponential backoff until it runs out of attempts, and
+    then discarded with its upload and photo.
+    """
+    source_storage = get_source_storage(job)
+    photo = job.photo
+    try:
+        with source_storage.open(job.source_name, 'rb') as source:
+            process_photo(photo, source)
+        photo.status = 'ready'
+        photo.save(update_fields=['image', 'variants', 'status'])
+    except Exception as e:
+        job.attempts += 1
+        job.last_error = str(e)
+        job.locked_at = None
+        if job.attempts >= PHOTO_JOB_MAX_ATTEMPTS:
+            logger.error("Photo job %s for %s failed permanently: %s", job.pk, job.source_name, e)
+            discard_job(job)
+            return False
+        job.status = 'queued'
+        job.available_at = timezone.now() + timedelta(seconds=PHOTO_JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+        logger.warning("Photo job %s failed (attempt %d), retrying: %s", job.pk, job.attempts, e)
+        job.save(update_fields=['attempts', 'last_error', 'locked_at', 'status', 'available_at'])
+        return False
+
+    job.delete()
+    source_storage.delete(job.source_name)
+    return True
+
+
+def discard_job(job):
+    """
+    Give up on ``job``: delete its raw upload and its pending photo (and with
+    it the job), so neither lingers nor shows on the profile.
+    """
+    try:
+        get_source_storage(job).delete(job.source_name)
+    except Exception as e:
+        logger.warning("Could not delete %s of photo job %s: %s", job.source_name, job.pk, e)
+    # post_delete refreshes the feeds that showed the pending photo
+    job.photo.delete()
+
+
+def discard_failed_jobs():
+    """Discard jobs marked failed before failures were discarded straight away."""
+    jobs = PhotoJob.objects.filter(status='failed').select_related('photo')
+    count = 0
+    for job in jobs.iterator():
+        discard_job(job)
+        count += 1
+    return count
@@ -0,0 +1,173 @@
+"""
+Logging pieces for production (wired up in settings_prod.LOGGING).
+
+``BackgroundHandler`` takes records off the request thread: it only
+resolves the message and puts the record on a bounded queue, and a
+listener thread formats and writes it. When the queue is full the record
+is dropped and counted rather than making the request wait. Output is one
+JSON object per line, tagged with the id of the request that logged it.
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import uuid
+import zlib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+
+# Standard LogRecord attributes; anything else was passed with extra=
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'request_id'}
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def new_request_id(header=None):
+    """Use the id from the router (e.g. Heroku's ``X-Request-ID``) or make one."""
+    if header and len(header) <= 200 and header.isprintable():
+        return header
+    return uuid.uuid4().hex
+
+
+def set_request_id(request_id):
+    return _request_id.set(request_id)
+
+
+def reset_request_id(token):
+    _request_id.reset(token)
+
+
+class RequestIdFilter(logging.Filter):
+    """Tags records with the current request's id (None outside a request)."""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """
+    Keeps a ``rate`` fraction of the records at or below ``level``. Within a
+    request the choice is made per request id, so a sampled request keeps
+    all of its debug lines and the others drop all of theirs.
+    """
+
+    def __init__(self, rate=0.1, level='DEBUG'):
+        super().__init__()
+        self.threshold = int(rate * 0xFFFFFFFF)
+        self.level = level if isinstance(level, int) else logging.getLevelName(level)
+
+    def filter(self, record):
+        if record.levelno > self.level:
+            return True
+        request_id = _request_id.get()
+        if request_id is None:
+            return random.random() * 0xFFFFFFFF < self.threshold
+        return zlib.crc32(request_id.encode()) < self.threshold
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'process': record.process,
+            'thread': record.thread,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        if record.stack_info:
+            entry['stack_info'] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+class BackgroundHandler(QueueHandler):
+    """
+    Queues records for a listener thread that writes them to ``stream``.
+
+    Forking (gunicorn with ``preload_app``) leaves the child without the
+    listener thread, so a new queue and listener are started the first time
+    a process logs.
+    """
+
+    def __init__(self, stream=None, queue_size=10000):
+        self.queue_size = queue_size
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.dropped = 0
+        self.listener = None
+        self.pid = None
+        self.start_lock = threading.Lock()
+        super().__init__(queue.Queue(queue_size))
+
+    def setFormatter(self, fmt):
+        # Formatting happens in the listener, on the target handler
+        self.target.setFormatter(fmt)
+
+    def _ensure_listener(self):
+        if self.pid == os.getpid():
+            return
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            if self.pid is not None:
+                # Inherited from the parent, whose listener isn't running here
+                self.queue = queue.Queue(self.queue_size)
+            self.listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+            self.listener.start()
+            self.pid = os.getpid()
+
+    def prepare(self, record):
+        # Just enough that the record no longer refers to request objects;
+        # the JSON formatting is left to the listener
+        record = logging.makeLogRecord(vars(record))
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            warning = logging.makeLogRecord({
+                'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': 'Log queue was full; dropped %d records', 'args': (dropped,),
+            })
+            try:
+                self.queue.put_nowait(self.prepare(warning))
+            except queue.Full:
+                self.dropped += dropped
+
+    def close(self):
+        if self.listener is not None and self.pid == os.getpid():
+            # Flushes what is still queued
+            try:
+                self.listener.stop()
+            except queue.Full:
+                pass
+            self.listener = None
+        self.target.close()
+        super().close()
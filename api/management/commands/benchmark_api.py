@@ -0,0 +1,139 @@
+import json
+import platform
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from api.benchmark import DEFAULT_MIX, ENDPOINTS, compare, run_load, throughput
+from api.models import Profile
+
+
+class Command(BaseCommand):
+    help = 'Load-test the API with concurrent virtual users and report latency percentiles and query counts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users.')
+        parser.add_argument('--duration', type=float, default=30, help='Measured seconds.')
+        parser.add_argument('--warmup', type=float, default=5, help='Seconds to run before measuring.')
+        parser.add_argument('--requests', type=int, help='Stop each virtual user after this many requests.')
+        parser.add_argument(
+            '--endpoints', help=f"Comma-separated subset of: {', '.join(ENDPOINTS)} (default: all).",
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the request mix.')
+        parser.add_argument(
+            '--url', action='append', default=[], metavar='[LABEL=]URL',
+            help='Load a running server (using this database) over HTTP instead of in-process. '
+                 'Repeat to run each in turn and compare them side by side, e.g. '
+                 '--url wsgi=http://127.0.0.1:8000 --url asgi=http://127.0.0.1:8001.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1, help='Worker processes per server, to report throughput per worker.',
+        )
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--baseline', help='Compare with the JSON results of an earlier run.')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2, help='Allowed p95 slowdown against the baseline (0.2 = 20%%).',
+        )
+
+    def handle(self, *args, **options):
+        mix = DEFAULT_MIX
+        if options['endpoints']:
+            names = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+            unknown = [name for name in names if name not in ENDPOINTS]
+            if unknown:
+                raise CommandError(f"Unknown endpoints: {', '.join(unknown)}")
+            mix = {name: weight for name, weight in DEFAULT_MIX.items() if name in names}
+
+        targets = [self.parse_target(value) for value in options['url']] or [(None, None)]
+        if len(targets) > 1 and options['baseline']:
+            raise CommandError('--baseline compares a single run; pass one --url.')
+
+        runs = {}
+        for label, base_url in targets:
+            self.stdout.write(
+                f"Running {options['users']} virtual users for {options['duration']:g}s "
+                f"(+{options['warmup']:g}s warmup) against {base_url or connection.vendor}..."
+            )
+            try:
+                endpoints, elapsed = run_load(
+                    options['users'], options['duration'], options['warmup'], options['requests'], mix,
+                    options['seed'], base_url,
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+
+            runs[label] = results = {
+                'meta': {
+                    'finished_at': timezone.now().isoformat(),
+                    'database': connection.vendor,
+                    'python': platform.python_version(),
+                    'profiles': Profile.objects.count(),
+                    'virtual_users': options['users'],
+                    'measured_seconds': round(elapsed, 2),
+                    'mix': mix,
+                    'target': base_url,
+                    'workers': options['workers'],
+                    'rps_per_worker': round(throughput(endpoints) / options['workers'], 2),
+                },
+                'endpoints': endpoints,
+            }
+            self.report(endpoints)
+            if base_url:
+                self.stdout.write(f"Requests per second per worker: {results['meta']['rps_per_worker']:.1f}")
+
+        if len(runs) > 1:
+            self.report_side_by_side(runs)
+            results = {'targets': runs}
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = compare(results, baseline, options['tolerance'])
+            if regressions:
+                for message in regressions:
+                    self.stderr.write(f'Regression: {message}')
+                raise CommandError(f'{len(regressions)} regressions against {options["baseline"]}.')
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}."))
+
+    def parse_target(self, value):
+        label, sep, url = value.partition('=')
+        if not sep or '://' in label:
+            label = url = value
+        if not url.startswith(('http://', 'https://')):
+            raise CommandError(f'Not an http(s) URL: {url}')
+        return label, url
+
+    def report_side_by_side(self, runs):
+        labels = list(runs)
+        self.stdout.write('')
+        self.stdout.write(f"{'endpoint':<18} " + ' '.join(f"{label[:20]:>20}" for label in labels))
+        self.stdout.write(f"{'':<18} " + ' '.join(f"{'rps / p95 ms':>20}" for _ in labels))
+        names = [name for name in ENDPOINTS if any(name in run['endpoints'] for run in runs.values())]
+        for name in names:
+            cells = []
+            for label in labels:
+                result = runs[label]['endpoints'].get(name)
+                cells.append(
+                    f"{result['throughput_rps']:>9.1f} / {result['latency_ms']['p95']:>8.1f}" if result else f"{'-':>20}"
+                )
+            self.stdout.write(f'{name:<18} ' + ' '.join(cells))
+        self.stdout.write(
+            f"{'rps per worker':<18} " + ' '.join(f"{runs[label]['meta']['rps_per_worker']:>20.1f}" for label in labels)
+        )
+
+    def report(self, endpoints):
+        self.stdout.write(
+            f"{'endpoint':<18} {'reqs':>6} {'err':>4} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}"
+        )
+        for name, result in endpoints.items():
+            latency = result['latency_ms']
+            self.stdout.write(
+                f"{name:<18} {result['requests']:>6} {result['errors']:>4} {result['throughput_rps']:>8.1f} "
+                f"{latency['p50']:>8.1f} {latency['p95']:>8.1f} {latency['p99']:>8.1f} {result['queries']['mean']:>8.1f}"
+            )
@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.images import process_photo, variant_names
+from api.models import Photo
+
+
+class Command(BaseCommand):
+    help = 'Render thumb/card/full WebP and JPEG variants for existing photos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Number of photos processed in parallel.')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Re-render photos that already have variants, from their original upload, replacing the variants.',
+        )
+        parser.add_argument(
+            '--delete-originals', action='store_true',
+            help='Delete the original upload once its variants are stored.',
+        )
+
+    def handle(self, *args, **options):
+        photos = Photo.objects.order_by('pk')
+        if not options['force']:
+            photos = photos.filter(variants={})
+        photos = list(photos)
+        # Once rendered, a photo's image is its own full-size variant and the
+        # upload is gone; rendering that again would re-encode a lossy copy
+        rendered = {photo.pk for photo in photos if photo.image.name in variant_names(photo.variants)}
+        if rendered:
+            self.stdout.write(f'Skipping {len(rendered)} photos whose original upload is no longer their image.')
+            photos = [photo for photo in photos if photo.pk not in rendered]
+        if not photos:
+            self.stdout.write('No photos need variants.')
+            return
+
+        self.stdout.write(f'Processing {len(photos)} photos with {options["workers"]} workers...')
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {executor.submit(self.process, photo, options['delete_originals']): photo for photo in photos}
+            for future in as_completed(futures):
+                photo = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'Photo {photo.pk} ({photo.image.name}) failed: {e}')
+                else:
+                    done += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {done} processed, {failed} failed.'))
+
+    def process(self, photo, delete_original):
+        original = photo.image.name
+        replaced = variant_names(photo.variants)
+        try:
+            process_photo(photo)
+            photo.save(update_fields=['image', 'variants'])
+        finally:
+            # Each pool thread holds its own database connection
+            connection.close()
+        storage = photo.image.storage
+        for name in replaced - variant_names(photo.variants):
+            storage.delete(name)
+        if delete_original and original and original != photo.image.name:
+            storage.delete(original)
@@ -0,0 +1,78 @@
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What a gunicorn master imports before it forks workers (see gunicorn.conf.py)
+STARTUP_CODE = {
+    'wsgi': 'import vivaham_backend.wsgi',
+    'asgi': 'import vivaham_backend.asgi',
+}
+RESOLVE_URLS = 'from django.urls import get_resolver; get_resolver().url_patterns'
+
+# "import time:  self [us] | cumulative | imported package", nested names indented
+LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+
+class Command(BaseCommand):
+    help = 'Profile the imports made at startup (python -X importtime) and list the slowest.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--app', choices=sorted(STARTUP_CODE), default='wsgi', help='Application to import.')
+        parser.add_argument('--limit', type=int, default=25, help='Number of rows to list.')
+        parser.add_argument(
+            '--sort', choices=['self', 'cumulative'], default='cumulative',
+            help='Rank modules by their own import time or including what they import.',
+        )
+        parser.add_argument(
+            '--by-package', action='store_true', help='Sum the import time of each top-level package instead.',
+        )
+
+    def handle(self, *args, **options):
+        code = f"{STARTUP_CODE[options['app']]}; {RESOLVE_URLS}"
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'vivaham_backend.settings')}
+        # A fresh interpreter, so nothing is imported yet; bytecode is already
+        # compiled, as it is on a deployed image
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f'Importing the app failed:\n{result.stderr[-2000:]}')
+
+        imports = []
+        for line in result.stderr.splitlines():
+            match = LINE.match(line)
+            if match:
+                self_us, cumulative_us, indent, name = match.groups()
+                imports.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+        if not imports:
+            raise CommandError('No import timings found in the output.')
+
+        total_us = sum(cumulative_us for _, _, cumulative_us, depth in imports if depth == 0)
+        self.stdout.write(f"Imported {len(imports)} modules in {total_us / 1000:.0f} ms ({options['app']} startup).")
+
+        if options['by_package']:
+            self.report_packages(imports, total_us, options['limit'])
+        else:
+            self.report_modules(imports, options['sort'], options['limit'])
+
+    def report_modules(self, imports, sort, limit):
+        key = 1 if sort == 'self' else 2
+        self.stdout.write(f"\n{'self ms':>9} {'cumul. ms':>10}  module")
+        for name, self_us, cumulative_us, _ in sorted(imports, key=lambda row: row[key], reverse=True)[:limit]:
+            self.stdout.write(f'{self_us / 1000:>9.1f} {cumulative_us / 1000:>10.1f}  {name}')
+
+    def report_packages(self, imports, total_us, limit):
+        packages = defaultdict(lambda: [0, 0])
+        for name, self_us, _, _ in imports:
+            package = packages[name.split('.')[0]]
+            package[0] += self_us
+            package[1] += 1
+        self.stdout.write(f"\n{'ms':>8} {'share':>6} {'modules':>8}  package")
+        for name, (self_us, count) in sorted(packages.items(), key=lambda item: item[1][0], reverse=True)[:limit]:
+            self.stdout.write(f'{self_us / 1000:>8.1f} {self_us / total_us:>6.0%} {count:>8}  {name}')
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+MB = 1024 * 1024
+
+
+def file_digests(path, threshold, chunksize):
+    """
+    Return ``(md5, etag)`` for a local file. ``etag`` is what S3 reports for
+    the object when it is uploaded with the same multipart settings, so it
+    can be compared with a remote HEAD even for multipart uploads.
+    """
+    md5 = hashlib.md5()
+    part_digests = []
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunksize)
+            if not chunk:
+                break
+            md5.update(chunk)
+            part_digests.append(hashlib.md5(chunk).digest())
+    if os.path.getsize(path) < threshold or len(part_digests) <= 1:
+        return md5.hexdigest(), md5.hexdigest()
+    combined = hashlib.md5(b''.join(part_digests)).hexdigest()
+    return md5.hexdigest(), f'{combined}-{len(part_digests)}'
+
+
+class Manifest:
+    """
+    JSON record of what has already been uploaded, keyed by destination.
+    Saved every ``checkpoint_every`` updates so an interrupted run resumes
+    where it stopped instead of starting over.
+    """
+
+    def __init__(self, path, checkpoint_every=25):
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.lock = threading.Lock()
+        self.pending = 0
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def record(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.pending += 1
+            if self.pending >= self.checkpoint_every:
+                self._save()
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+    def _save(self):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self.pending = 0
+
+
+class Command(BaseCommand):
+    help = 'Upload local media to S3 in parallel, skipping files that are already there.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=settings.MEDIA_ROOT, help='Local media directory (default: MEDIA_ROOT).')
+        parser.add_argument('--bucket', default=os.environ.get('AWS_STORAGE_BUCKET_NAME') or getattr(settings, 'AWS_STORAGE_BUCKET_NAME', None))
+        parser.add_argument(
+            '--prefix', default=getattr(settings, 'AWS_LOCATION', ''),
+            help='Key prefix in the bucket (default: AWS_LOCATION).',
+        )
+        parser.add_argument(
+            '--endpoint-url', default=os.environ.get('AWS_S3_ENDPOINT_URL') or getattr(settings, 'AWS_S3_ENDPOINT_URL', None),
+            help='S3-compatible endpoint, e.g. a local MinIO server.',
+        )
+        parser.add_argument('--region', default=os.environ.get('AWS_S3_REGION_NAME') or getattr(settings, 'AWS_S3_REGION_NAME', None))
+        parser.add_argument('--concurrency', type=int, default=8, help='Files uploaded in parallel.')
+        parser.add_argument('--multipart-threshold', type=int, default=8, help='Size in MB above which multipart upload is used.')
+        parser.add_argument('--multipart-chunksize', type=int, default=8, help='Multipart part size in MB.')
+        parser.add_argument(
+            '--manifest', default=os.path.join(settings.BASE_DIR, '.media_manifest.json'),
+            help='Progress manifest used to skip unchanged files and resume.',
+        )
+        parser.add_argument('--verify-remote', action='store_true', help='HEAD each object and compare its ETag instead of trusting the manifest.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be uploaded.')
+
+    def handle(self, *args, **options):
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+
+        if not options['bucket']:
+            raise CommandError('No bucket given; pass --bucket or set AWS_STORAGE_BUCKET_NAME.')
+        if not os.path.isdir(options['source']):
+            raise CommandError(f"Local media directory does not exist: {options['source']}")
+
+        self.client = boto3.client('s3', endpoint_url=options['endpoint_url'], region_name=options['region'])
+        self.bucket = options['bucket']
+        self.prefix = options['prefix'].strip('/')
+        self.threshold = options['multipart_threshold'] * MB
+        self.chunksize = options['multipart_chunksize'] * MB
+        self.transfer_config = TransferConfig(
+            multipart_threshold=self.threshold,
+            multipart_chunksize=self.chunksize,
+            # Parallelism comes from the file pool; one thread per file
+            max_concurrency=1,
+            use_threads=False,
+        )
+        self.verify_remote = options['verify_remote']
+        self.dry_run = options['dry_run']
+        self.manifest = Manifest(options['manifest'])
+
+        files = []
+        for root, _, names in os.walk(options['source']):
+            for name in names:
+                path = os.path.join(root, name)
+                files.append((path, os.path.relpath(path, options['source']).replace(os.sep, '/')))
+        self.stdout.write(f'Found {len(files)} files; uploading with {options["concurrency"]} workers...')
+
+        counts = {'uploaded': 0, 'skipped': 0, 'failed': 0}
+        uploaded_bytes = 0
+        started = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                futures = {executor.submit(self.sync_file, path, rel): rel for path, rel in files}
+                for future in as_completed(futures):
+                    try:
+                        result, size = future.result()
+                    except Exception as e:
+                        counts['failed'] += 1
+                        self.stderr.write(f'Failed: {futures[future]}: {e}')
+                        continue
+                    counts[result] += 1
+                    if result == 'uploaded':
+                        uploaded_bytes += size
+        finally:
+            if not self.dry_run:
+                self.manifest.save()
+
+        elapsed = time.monotonic() - started
+        rate = uploaded_bytes / MB / elapsed if elapsed else 0
+        verb = 'would upload' if self.dry_run else 'uploaded'
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {elapsed:.1f}s: {counts['uploaded']} {verb} ({uploaded_bytes / MB:.1f} MB, {rate:.2f} MB/s), "
+            f"{counts['skipped']} unchanged, {counts['failed']} failed."
+        ))
+
+    def get_key(self, rel):
+        return f'{self.prefix}/{rel}' if self.prefix else rel
+
+    def sync_file(self, path, rel):
+        """Upload one file unless it is unchanged. Returns ``(result, size)``."""
+        stat = os.stat(path)
+        # Keyed by destination, so one manifest can serve several buckets
+        manifest_key = f's3://{self.bucket}/{self.get_key(rel)}'
+        entry = self.manifest.get(manifest_key)
+        # Size and mtime unchanged since the last run: skip without hashing
+        if not self.verify_remote and entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            return 'skipped', stat.st_size
+
+        md5, etag = file_digests(path, self.threshold, self.chunksize)
+        if self.verify_remote:
+            unchanged = self.get_remote_etag(rel) == etag
+        else:
+            unchanged = bool(entry) and entry['size'] == stat.st_size and entry['md5'] == md5
+        new_entry = {'size': stat.st_size, 'mtime': stat.st_mtime, 'md5': md5, 'etag': etag}
+        if unchanged:
+            if not self.dry_run:
+                self.manifest.record(manifest_key, new_entry)
+            return 'skipped', stat.st_size
+
+        if not self.dry_run:
+            self.client.upload_file(path, self.bucket, self.get_key(rel), Config=self.transfer_config)
+            self.manifest.record(manifest_key, new_entry)
+        return 'uploaded', stat.st_size
+
+    def get_remote_etag(self, rel):
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self.get_key(rel))
+        except self.client.exceptions.ClientError:
+            return None
+        return head['ETag'].strip('"')
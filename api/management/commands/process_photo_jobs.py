@@ -0,0 +1,40 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.jobs import claim_jobs, discard_failed_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Run the photo job worker: push spooled uploads to storage with retries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Jobs processed in parallel.')
+        parser.add_argument('--batch', type=int, default=20, help='Jobs claimed per poll.')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Drain the due jobs and exit.')
+
+    def handle(self, *args, **options):
+        discarded = discard_failed_jobs()
+        if discarded:
+            self.stdout.write(f'Discarded {discarded} failed jobs left from earlier runs.')
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            while True:
+                jobs = claim_jobs(options['batch'])
+                if not jobs:
+                    if options['once']:
+                        return
+                    time.sleep(options['sleep'])
+                    continue
+
+                results = list(executor.map(self.run, jobs))
+                self.stdout.write(f'Processed {len(jobs)} jobs: {sum(results)} succeeded, {len(jobs) - sum(results)} retried or failed.')
+
+    def run(self, job):
+        try:
+            return run_job(job)
+        finally:
+            # Each pool thread holds its own database connection
+            connection.close()
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import ProfileChange
+from api.sync import SYNC_RETENTION
+
+
+class Command(BaseCommand):
+    help = 'Delete profile change log rows older than the sync token retention window.'
+
+    def handle(self, *args, **options):
+        # Tokens older than the window are already rejected with 410, so
+        # nothing can still need these rows
+        deleted, _ = ProfileChange.objects.filter(changed_at__lt=timezone.now() - SYNC_RETENTION).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} profile changes.'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from api.models import RevokedToken
+
+
+class Command(BaseCommand):
+    help = 'Delete revoked refresh tokens that have expired, and expired legacy blacklist rows.'
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        # An expired token fails verification before revocation is checked
+        deleted, _ = RevokedToken.objects.filter(expires_at__lte=now).delete()
+        # Left over from before revocation moved to RevokedToken; deleting an
+        # outstanding token cascades to its blacklist entry
+        legacy, _ = OutstandingToken.objects.filter(expires_at__lte=now).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} revoked tokens and {legacy} legacy blacklist rows.'))
@@ -0,0 +1,54 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.credits import audit_balances, repair_balance
+
+
+class Command(BaseCommand):
+    help = 'Check every credit balance and snapshot against the ledger in one streaming pass.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows fetched per round trip.')
+        parser.add_argument('--show', type=int, default=50, help='Number of problems to list.')
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Set the balance of every user with a problem to their ledger total and rebuild their snapshots.',
+        )
+
+    def handle(self, *args, **options):
+        stats = Counter()
+        problems = 0
+        users = []
+        started = time.monotonic()
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # One snapshot for the three streams, so postings made during
+                # the pass can't show up as mismatches
+                with connection.cursor() as cursor:
+                    cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+            for user_id, problem in audit_balances(stats, options['chunk_size']):
+                problems += 1
+                if problems <= options['show']:
+                    self.stdout.write(f'{user_id}: {problem}')
+                if options['fix'] and (not users or users[-1] != user_id):
+                    users.append(user_id)
+        elapsed = time.monotonic() - started
+
+        if problems > options['show']:
+            self.stdout.write(f"...and {problems - options['show']} more.")
+        self.stdout.write(
+            f"Checked {stats['users']} users and {stats['entries']} ledger entries in {elapsed:.1f}s "
+            f"({stats['entries'] / elapsed if elapsed else 0:.0f} entries/s): {problems} problems."
+        )
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('Every balance matches the ledger.'))
+            return
+        if not options['fix']:
+            raise CommandError('Balances disagree with the ledger; rerun with --fix to rebuild them from it.')
+
+        for user_id in users:
+            repair_balance(user_id)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the balances of {len(users)} users from the ledger.'))
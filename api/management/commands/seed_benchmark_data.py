@@ -0,0 +1,21 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from api.benchmark import BENCH_PREFIX, delete_seeded, seed
+
+
+class Command(BaseCommand):
+    help = 'Seed profiles and virtual user accounts for benchmark_api.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=5000, help='Candidate profiles to create.')
+        parser.add_argument('--users', type=int, default=50, help='Virtual user accounts to create.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for a reproducible dataset.')
+        parser.add_argument('--reset', action='store_true', help=f'Delete existing {BENCH_PREFIX}* accounts first.')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            self.stdout.write(f'Deleted {delete_seeded()} existing benchmark rows.')
+        created = seed(options['profiles'], options['users'], random.Random(options['seed']))
+        self.stdout.write(self.style.SUCCESS(f'Created {created} benchmark accounts with profiles.'))
@@ -0,0 +1,286 @@
+"""
+Prometheus-style metrics shared across worker processes.
+
+Each process keeps its counters and histograms in memory and periodically
+writes a snapshot to ``METRICS_DIR/<pid>-<start time>.json``, named so that
+a recycled pid never overwrites a dead worker's file. When a worker exits,
+the gunicorn master folds its last snapshot into ``archive.json`` and
+removes it (``mark_process_dead``), so the directory holds one file per
+live worker and counters never go backwards. The ``/metrics`` endpoint,
+whichever worker serves it, adds up the archive and the snapshot of every
+live worker, so the numbers cover the whole server rather than one process.
+``METRICS_DIR`` must be on a filesystem shared by the workers, and is
+emptied when the master starts (``clear``).
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+
+# Seconds between snapshots; at most this much is lost if a worker is killed
+METRICS_FLUSH_INTERVAL = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+ARCHIVE_NAME = 'archive.json'
+# Names of folded-in snapshots the archive remembers, for readers that
+# listed one of them just before it was removed
+ARCHIVE_ABSORBED_LIMIT = 100
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        return [[list(key), value] for key, value in self.values.items()]
+
+
+class Histogram(Counter):
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            # Per-bucket (not cumulative) counts, then sum and count
+            counts = self.values.setdefault(key, [0] * len(self.buckets) + [0, 0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+
+class Registry:
+    def __init__(self, directory=None, flush_interval=METRICS_FLUSH_INTERVAL):
+        self._directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.metrics = {}
+        self.last_flush = 0.0
+        self.pid = None
+        self.started = None
+
+    @property
+    def directory(self):
+        # Read when used, so tests can point it at a temporary directory
+        return self._directory or getattr(settings, 'METRICS_DIR', os.path.join(settings.BASE_DIR, '.metrics'))
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.metrics.setdefault(name, Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.metrics.setdefault(name, Histogram(self, name, documentation, labelnames, buckets))
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                metric.name: {'samples': metric.samples()}
+                for metric in self.metrics.values() if metric.values
+            }
+
+    def path(self):
+        pid = os.getpid()
+        if pid != self.pid:
+            self.pid, self.started = pid, time.time_ns()
+        return os.path.join(self.directory, f'{pid}-{self.started}.json')
+
+    def forked(self):
+        """Start a child process from zero, rather than from its parent's values."""
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.last_flush = 0.0
+        self.pid = None
+        for metric in self.metrics.values():
+            metric.values = {}
+
+    def flush_at_exit(self):
+        """
+        Write this process's last snapshot when it exits. Only server workers
+        call this (gunicorn's ``post_fork``), so management commands, cron
+        jobs and test runs leave nothing behind for ``collect`` to add up.
+        """
+        atexit.register(lambda: self.metrics and self.flush(force=True))
+
+    def clear(self):
+        """Remove every snapshot and the archive; only before any worker starts."""
+        for path in glob.glob(os.path.join(self.directory, '*.json*')):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def mark_process_dead(self, pid):
+        """
+        Fold the last snapshot of the exited process ``pid`` into the archive
+        and remove it. Only ever called by one process, the gunicorn master.
+
+        The archive is replaced before the snapshot is removed, and lists it
+        as absorbed, so ``collect`` counts it exactly once whenever it reads.
+        """
+        archive = self._read_archive()
+        for path in glob.glob(os.path.join(self.directory, f'{pid}-*.json')):
+            snapshot = _load(path)
+            if snapshot is None:
+                continue
+            totals = _merge([archive['metrics'], snapshot])
+            archive = {
+                'absorbed': (archive['absorbed'] + [os.path.basename(path)])[-ARCHIVE_ABSORBED_LIMIT:],
+                'metrics': {
+                    name: {'samples': [[list(key), value] for key, value in samples.items()]}
+                    for name, samples in totals.items()
+                },
+            }
+            _write(os.path.join(self.directory, ARCHIVE_NAME), archive)
+            os.remove(path)
+
+    def _read_archive(self):
+        return _load(os.path.join(self.directory, ARCHIVE_NAME)) or {'absorbed': [], 'metrics': {}}
+
+    def flush(self, force=False):
+        """Write this process's snapshot, at most once per flush interval."""
+        now = time.monotonic()
+        if not force and now - self.last_flush < self.flush_interval:
+            return
+        # Another thread is already writing it
+        if not self.flush_lock.acquire(blocking=force):
+            return
+        try:
+            self.last_flush = now
+            os.makedirs(self.directory, exist_ok=True)
+            _write(self.path(), self.snapshot())
+        finally:
+            self.flush_lock.release()
+
+    def collect(self):
+        """Samples of every process, added up: ``{name: {labels: value}}``."""
+        snapshots = {}
+        own_path = self.path()
+        for path in glob.glob(os.path.join(self.directory, '[0-9]*-*.json')):
+            if path != own_path:
+                snapshot = _load(path)
+                if snapshot is not None:
+                    snapshots[os.path.basename(path)] = snapshot
+        # Read last: a snapshot gone by now was folded into this archive
+        archive = self._read_archive()
+        for name in archive['absorbed']:
+            snapshots.pop(name, None)
+        # This process's live values rather than its last snapshot
+        merged = _merge([archive['metrics'], *snapshots.values(), self.snapshot()])
+        return {name: merged.get(name, {}) for name in self.metrics}
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for name, samples in self.collect().items():
+            metric = self.metrics[name]
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            for key, value in sorted(samples.items()):
+                labels = [f'{label}="{_escape(v)}"' for label, v in zip(metric.labelnames, key)]
+                if metric.type == 'counter':
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + ('+Inf',), value):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labels + [f"le={_quote(bound)}"])} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(value[-2])}')
+                lines.append(f'{name}_count{_labels(labels)} {value[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None  # replaced or removed while we read it
+
+
+def _write(path, data):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def _merge(snapshots):
+    merged = {}
+    for snapshot in snapshots:
+        for name, data in snapshot.items():
+            samples = merged.setdefault(name, {})
+            for labels, value in data['samples']:
+                key = tuple(labels)
+                current = samples.get(key)
+                if current is None:
+                    samples[key] = value
+                elif isinstance(value, list):
+                    samples[key] = [a + b for a, b in zip(current, value)]
+                else:
+                    samples[key] = current + value
+    return merged
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _quote(bound):
+    return f'"{bound}"' if isinstance(bound, str) else f'"{float(bound):g}"'
+
+
+def _labels(labels):
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+def _number(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+os.register_at_fork(after_in_child=registry.forked)
+
+http_requests = registry.counter(
+    'http_requests_total', 'Requests handled, by view, method and status code.', ('view', 'method', 'status'),
+)
+http_request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Time to handle a request, by view.', ('view',),
+)
+db_queries = registry.histogram(
+    'http_request_db_queries', 'SQL queries run per request, by view.', ('view',), buckets=QUERY_COUNT_BUCKETS,
+)
+profile_unlocks = registry.counter('profile_unlocks_total', 'Profiles unlocked.')
+credits_spent = registry.counter('credits_spent_total', 'Credits spent, by action.', ('action',))
+credits_added = registry.counter('credits_added_total', 'Credits added to balances, by kind.', ('kind',))
+unlock_rejections = registry.counter('unlock_rejections_total', 'Unlock requests refused, by reason.', ('reason',))
+photo_uploads = registry.counter('photo_uploads_total', 'Photos uploaded, by upload path.', ('path',))
+photo_upload_bytes = registry.counter(
+    'photo_upload_bytes_total', 'Bytes of photos uploaded through this server, by upload path.', ('path',),
+)
@@ -0,0 +1,138 @@
+import logging
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .instrumentation import end_request, start_request
+from .log import new_request_id, reset_request_id, set_request_id
+from .metrics import db_queries, http_request_duration, http_requests, registry
+
+logger = logging.getLogger(__name__)
+
+SERVER_TIMING_HEADER = getattr(settings, 'SERVER_TIMING_HEADER', True)
+# Requests slower than this are logged with their slowest queries
+SLOW_REQUEST_THRESHOLD_MS = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', 500)
+
+
+class AsyncCapableMiddleware:
+    """
+    Runs ``start``, ``end`` and ``finish`` around the rest of the chain,
+    natively on both WSGI and ASGI: Django would otherwise run a sync-only
+    middleware in a thread for every ASGI request.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.end(request, state)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.end(request, state)
+        return self.finish(request, response, state)
+
+    def start(self, request):
+        return None
+
+    def end(self, request, state):
+        """Runs whether or not the rest of the chain raised."""
+
+    def finish(self, request, response, state):
+        return response
+
+
+class RequestIdMiddleware(AsyncCapableMiddleware):
+    """
+    Gives every request an id, taken from the router's ``X-Request-ID``
+    header when there is one, which ``api.log.RequestIdFilter`` adds to the
+    request's log records. It is echoed in the response so a client report
+    can be matched to the logs.
+    """
+
+    def start(self, request):
+        request.request_id = new_request_id(request.headers.get('X-Request-ID'))
+        return set_request_id(request.request_id)
+
+    def end(self, request, token):
+        reset_request_id(token)
+
+    def finish(self, request, response, token):
+        response['X-Request-ID'] = request.request_id
+        return response
+
+
+class RequestTimingMiddleware(AsyncCapableMiddleware):
+    """
+    Measures every request: query count and SQL time through the database
+    execute wrapper (``api.instrumentation.query_wrapper``), named spans
+    from ``api.instrumentation.timed`` (JWT auth, serialization, storage
+    URLs) and the total. They are returned in a ``Server-Timing`` header and
+    slow requests are logged.
+
+    Costs two clock reads per query, so it can stay on in production. Put it
+    first in MIDDLEWARE so the total covers the other middleware too.
+    """
+
+    def start(self, request):
+        timings, token = start_request()
+        request.timings = timings
+        return token, perf_counter()
+
+    def end(self, request, state):
+        end_request(state[0])
+
+    def finish(self, request, response, state):
+        timings = request.timings
+        total = perf_counter() - state[1]
+        if SERVER_TIMING_HEADER:
+            response['Server-Timing'] = timings.server_timing(total)
+        if total * 1000 >= SLOW_REQUEST_THRESHOLD_MS:
+            logger.warning(
+                'Slow request: %s %s -> %s in %.0f ms (%d queries, %.0f ms SQL; %s). Slowest queries: %s',
+                request.method, request.path, response.status_code, total * 1000, timings.queries,
+                timings.sql_time * 1000,
+                ', '.join(f'{name} {duration * 1000:.0f} ms' for name, duration in timings.spans.items()) or 'no spans',
+                ' | '.join(f'{duration * 1000:.1f} ms: {sql[:300]}' for duration, sql in timings.top_queries()),
+            )
+        return response
+
+
+class MetricsMiddleware(AsyncCapableMiddleware):
+    """
+    Counts requests and records their latency and query count per view for
+    the ``/metrics`` endpoint. Goes right after ``RequestTimingMiddleware``,
+    whose query count it reuses.
+    """
+
+    def start(self, request):
+        return perf_counter()
+
+    def finish(self, request, response, started):
+        duration = perf_counter() - started
+
+        # The URL name keeps the label set small; unmatched paths share one
+        match = request.resolver_match
+        view = (match.view_name if match else None) or 'unmatched'
+        http_requests.inc(view=view, method=request.method, status=response.status_code)
+        http_request_duration.observe(duration, view=view)
+        timings = getattr(request, 'timings', None)
+        if timings is not None:
+            db_queries.observe(timings.queries, view=view)
+        registry.flush()
+        return response
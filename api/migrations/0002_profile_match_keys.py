@@ -0,0 +1,64 @@
+# Generated by Django 5.2.4 on 2026-10-17 16:23
+
+from django.db import migrations, models
+
+
+MATCH_KEY_FIELDS = {
+    'gender': 'gender_key',
+    'caste': 'caste_key',
+    'religion': 'religion_key',
+    'mother_tongue': 'mother_tongue_key',
+}
+
+
+def populate_match_keys(apps, schema_editor):
+    Profile = apps.get_model('api', 'Profile')
+    batch = []
+    for profile in Profile.objects.only('id', *MATCH_KEY_FIELDS).iterator(chunk_size=1000):
+        for source, target in MATCH_KEY_FIELDS.items():
+            setattr(profile, target, ' '.join((getattr(profile, source) or '').split()).lower())
+        batch.append(profile)
+        if len(batch) >= 1000:
+            Profile.objects.bulk_update(batch, list(MATCH_KEY_FIELDS.values()))
+            batch = []
+    if batch:
+        Profile.objects.bulk_update(batch, list(MATCH_KEY_FIELDS.values()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='caste_key',
+            field=models.CharField(blank=True, editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='gender_key',
+            field=models.CharField(blank=True, editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='mother_tongue_key',
+            field=models.CharField(blank=True, editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='religion_key',
+            field=models.CharField(blank=True, editable=False, max_length=50),
+        ),
+        migrations.RunPython(populate_match_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['gender_key', 'caste_key', 'religion_key', 'date_of_birth', 'id'], name='profile_match_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['gender_key', 'date_of_birth', 'id'], name='profile_gender_dob_idx'),
+        ),
+    ]
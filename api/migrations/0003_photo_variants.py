@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_profile_match_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_photo_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='ready', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='photo',
+            name='image',
+            field=models.ImageField(blank=True, upload_to='profile_photos/'),
+        ),
+        migrations.CreateModel(
+            name='PhotoJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('spool_name', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('photo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='job', to='api.photo')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'available_at'], name='photojob_claim_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_photo_jobs'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='photojob',
+            old_name='spool_name',
+            new_name='source_name',
+        ),
+        migrations.AddField(
+            model_name='photojob',
+            name='source',
+            field=models.CharField(choices=[('spool', 'Local spool'), ('storage', 'Configured storage')], default='spool', max_length=10),
+        ),
+    ]
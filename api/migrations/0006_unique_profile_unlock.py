@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:20
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def remove_duplicate_unlocks(apps, schema_editor):
+    """
+    Keep the first unlock of each (user, profile) pair and refund the
+    credits charged for the duplicates created by concurrent unlocks.
+    """
+    CreditTransaction = apps.get_model('api', 'CreditTransaction')
+    User = apps.get_model('api', 'User')
+    duplicated = (
+        CreditTransaction.objects.filter(action='unlock')
+        .values('user_id', 'profile_unlocked_id')
+        .annotate(first_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for group in duplicated:
+        duplicates = CreditTransaction.objects.filter(
+            action='unlock', user_id=group['user_id'], profile_unlocked_id=group['profile_unlocked_id'],
+        ).exclude(id=group['first_id'])
+        refund = sum(duplicates.values_list('credits_spent', flat=True))
+        duplicates.delete()
+        User.objects.filter(pk=group['user_id']).update(credits=F('credits') + refund)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_photojob_source'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_unlocks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='credittransaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('action', 'unlock')), fields=('user', 'profile_unlocked'), name='unique_profile_unlock'),
+        ),
+    ]
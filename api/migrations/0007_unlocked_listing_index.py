@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_unique_profile_unlock'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='credittransaction',
+            index=models.Index(fields=['user', 'action', '-transaction_date', 'profile_unlocked'], name='credittx_user_action_date_idx'),
+        ),
+    ]
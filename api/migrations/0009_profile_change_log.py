@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:24
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_profile_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('profile_id', models.BigIntegerField()),
+                ('gender_key', models.CharField(blank=True, max_length=10)),
+                ('kind', models.CharField(choices=[('upsert', 'Created or updated'), ('delete', 'Deleted')], max_length=10)),
+                ('changed_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['gender_key', 'id'], name='profilechange_gender_idx'), models.Index(fields=['profile_id', 'id'], name='profilechange_profile_idx')],
+            },
+        ),
+    ]
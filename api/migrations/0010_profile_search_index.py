@@ -0,0 +1,54 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:40
+
+from django.db import migrations
+
+# As of this migration; kept here so later changes to api/search.py can't
+# change what it does
+SEARCH_TABLE = 'api_profile_search'
+SEARCH_FIELDS = ('education', 'occupation', 'designation', 'city', 'about')
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    columns = ', '.join(SEARCH_FIELDS)
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'postgresql':
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ('
+                ' profile_id bigint PRIMARY KEY REFERENCES api_profile (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,'
+                ' document tsvector NOT NULL)'
+            )
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_idx ON {SEARCH_TABLE} USING gin (document)')
+            weights = ('A', 'A', 'B', 'B', 'C')
+            document = ' || '.join(
+                f"setweight(to_tsvector('simple', coalesce({name}, '')), '{weight}')"
+                for name, weight in zip(SEARCH_FIELDS, weights)
+            )
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (profile_id, document) SELECT id, {document} FROM api_profile'
+                ' ON CONFLICT (profile_id) DO NOTHING'
+            )
+        elif vendor == 'sqlite':
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5({columns}, tokenize="unicode61")'
+            )
+            values = ', '.join(f"coalesce({name}, '')" for name in SEARCH_FIELDS)
+            cursor.execute(f'INSERT INTO {SEARCH_TABLE} (rowid, {columns}) SELECT id, {values} FROM api_profile')
+        # Other databases search without an index
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_profile_change_log'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:28
+
+import re
+
+from django.db import migrations, models
+
+# The spellings of api/porutham.py as of this migration, frozen here so that
+# later changes to them don't change what it backfills. Index = code.
+NAKSHATRA_ALIASES = (
+    ('ashwini', 'aswini', 'asvini', 'ashvini', 'aswathi', 'ashwathi'),
+    ('bharani', 'barani'),
+    ('krittika', 'kritika', 'krithika', 'kruthika', 'karthika', 'karthigai', 'karthikai', 'kartigai'),
+    ('rohini',),
+    ('mrigashira', 'mrigasira', 'mrigashirsha', 'mrigasheersha', 'mrugasira', 'mirugasirisham', 'makayiram'),
+    ('ardra', 'aardra', 'arudra', 'thiruvathirai', 'thiruvadhirai', 'athira'),
+    ('punarvasu', 'punarpoosam', 'punarpusam', 'punartham'),
+    ('pushya', 'pushyami', 'poosam', 'pusam', 'pooyam'),
+    ('ashlesha', 'aslesha', 'ashlesa', 'ayilyam', 'aayilyam'),
+    ('magha', 'makha', 'magam', 'makam'),
+    ('purvaphalguni', 'poorvaphalguni', 'pooram', 'pubba'),
+    ('uttaraphalguni', 'uthraphalguni', 'uthiram', 'uthram'),
+    ('hasta', 'hastha', 'hastham', 'hastam', 'atham'),
+    ('chitra', 'chithra', 'chitta', 'chithirai', 'chitirai', 'chithira'),
+    ('swati', 'swathi', 'svati', 'chothi'),
+    ('vishakha', 'visakha', 'vishaka', 'visakam', 'vishakam'),
+    ('anuradha', 'anusham', 'anizham'),
+    ('jyeshtha', 'jyeshta', 'jyestha', 'kettai', 'thrikketta', 'triketta'),
+    ('mula', 'moola', 'moolam', 'mulam'),
+    ('purvaashadha', 'purvashadha', 'purvashada', 'poorvashada', 'pooradam'),
+    ('uttaraashadha', 'uttarashadha', 'uttarashada', 'uthiradam', 'uthradam'),
+    ('shravana', 'sravana', 'shravanam', 'sravanam', 'thiruvonam'),
+    ('dhanishta', 'dhanishtha', 'dhanista', 'avittam'),
+    ('shatabhisha', 'satabhisha', 'shatabhishak', 'satabhishak', 'sathayam', 'chathayam'),
+    ('purvabhadrapada', 'poorvabhadrapada', 'purvabhadra', 'poorvabhadra', 'poorattathi', 'pooruruttathi'),
+    ('uttarabhadrapada', 'uttarabhadra', 'uthirattathi', 'uthrattathi'),
+    ('revati', 'revathi'),
+)
+RAASI_ALIASES = (
+    ('mesham', 'mesha', 'medam', 'aries'),
+    ('rishabam', 'rishabham', 'rishaba', 'vrishabha', 'vrishabham', 'edavam', 'taurus'),
+    ('mithunam', 'mithuna', 'mithun', 'gemini'),
+    ('kadagam', 'katakam', 'kataka', 'karkatakam', 'karka', 'karkidakam', 'cancer'),
+    ('simmam', 'simha', 'simham', 'chingam', 'leo'),
+    ('kanni', 'kanya', 'virgo'),
+    ('thulam', 'thula', 'tula', 'thulaam', 'libra'),
+    ('viruchigam', 'vrischika', 'vrishchika', 'vrischikam', 'vrichikam', 'scorpio'),
+    ('dhanusu', 'dhanus', 'dhanu', 'dhanush', 'sagittarius'),
+    ('magaram', 'makara', 'makaram', 'capricorn'),
+    ('kumbam', 'kumbha', 'kumbham', 'aquarius'),
+    ('meenam', 'meena', 'pisces'),
+)
+
+_non_letters_re = re.compile(r'[^a-z]')
+
+
+def _codes(aliases):
+    return {alias: index for index, names in enumerate(aliases) for alias in names}
+
+
+def _lookup_key(value):
+    return _non_letters_re.sub('', (value or '').lower())
+
+
+def populate_horoscope_codes(apps, schema_editor):
+    Profile = apps.get_model('api', 'Profile')
+    nakshatra_codes, raasi_codes = _codes(NAKSHATRA_ALIASES), _codes(RAASI_ALIASES)
+    batch = []
+    for profile in Profile.objects.only('id', 'nakshatram', 'raasi').iterator(chunk_size=1000):
+        profile.nakshatra_code = nakshatra_codes.get(_lookup_key(profile.nakshatram))
+        profile.raasi_code = raasi_codes.get(_lookup_key(profile.raasi))
+        batch.append(profile)
+        if len(batch) >= 1000:
+            Profile.objects.bulk_update(batch, ['nakshatra_code', 'raasi_code'])
+            batch = []
+    if batch:
+        Profile.objects.bulk_update(batch, ['nakshatra_code', 'raasi_code'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_profile_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='nakshatra_code',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='raasi_code',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_horoscope_codes, migrations.RunPython.noop),
+    ]
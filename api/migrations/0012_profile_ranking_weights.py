@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_profile_horoscope_codes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='ranking_weights',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
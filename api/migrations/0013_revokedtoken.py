@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:40
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def copy_blacklisted_tokens(apps, schema_editor):
+    """Carry over the legacy blacklist entries that can still be presented."""
+    BlacklistedToken = apps.get_model('token_blacklist', 'BlacklistedToken')
+    RevokedToken = apps.get_model('api', 'RevokedToken')
+    rows = (
+        BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+        .values_list('token__jti', 'token__expires_at')
+    )
+    batch = []
+    for jti, expires_at in rows.iterator(chunk_size=1000):
+        batch.append(RevokedToken(jti=jti, expires_at=expires_at))
+        if len(batch) >= 1000:
+            RevokedToken.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        RevokedToken.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_profile_ranking_weights'),
+        ('token_blacklist', '0012_alter_outstandingtoken_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedToken',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('jti', models.CharField(max_length=255, unique=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('revoked_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.RunPython(copy_blacklisted_tokens, migrations.RunPython.noop),
+    ]
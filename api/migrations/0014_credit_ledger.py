@@ -0,0 +1,68 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def open_balances(apps, schema_editor):
+    """
+    Start each user's ledger at their current balance. The grants, purchases
+    and unlocks before it can't be rebuilt from what was recorded.
+    """
+    User = apps.get_model('api', 'User')
+    CreditEntry = apps.get_model('api', 'CreditEntry')
+    balances = User.objects.exclude(credits=0).order_by('pk').values_list('pk', 'credits')
+    batch = []
+    for user_id, credits in balances.iterator(chunk_size=1000):
+        batch.append(CreditEntry(user_id=user_id, kind='opening', amount=credits))
+        if len(batch) >= 1000:
+            CreditEntry.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        CreditEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CreditEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('opening', 'Opening Balance'), ('grant', 'Registration Grant'), ('purchase', 'Purchase'), ('unlock', 'Unlock Profile')], max_length=10)),
+                ('amount', models.IntegerField()),
+                ('reference', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('profile', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.profile')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credit_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CreditSnapshot',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('balance', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('entry', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.creditentry')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credit_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='creditentry',
+            index=models.Index(fields=['user', 'id'], name='creditentry_user_id_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='creditentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'purchase')), fields=('reference',), name='unique_credit_purchase'),
+        ),
+        migrations.AddIndex(
+            model_name='creditsnapshot',
+            index=models.Index(fields=['user', 'entry'], name='creditsnapshot_user_entry_idx'),
+        ),
+        migrations.RunPython(open_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:10
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def drop_duplicate_jobs(apps, schema_editor):
+    """Keep the first photo of an upload confirmed twice; the others are copies."""
+    PhotoJob = apps.get_model('api', 'PhotoJob')
+    Photo = apps.get_model('api', 'Photo')
+    duplicated = (
+        PhotoJob.objects.values('source', 'source_name')
+        .annotate(count=Count('id'), first=Min('id')).filter(count__gt=1)
+    )
+    for row in duplicated:
+        copies = PhotoJob.objects.filter(source=row['source'], source_name=row['source_name']).exclude(pk=row['first'])
+        Photo.objects.filter(pk__in=copies.values('photo_id')).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_credit_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='photojob',
+            constraint=models.UniqueConstraint(fields=('source', 'source_name'), name='unique_photojob_source'),
+        ),
+    ]
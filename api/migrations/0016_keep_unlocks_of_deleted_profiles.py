@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_unique_photojob_source'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='credittransaction',
+            name='profile_unlocked',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='unlocked_by', to='api.profile'),
+        ),
+    ]
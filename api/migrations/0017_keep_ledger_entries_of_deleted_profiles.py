@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_keep_unlocks_of_deleted_profiles'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='creditentry',
+            name='profile',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.profile'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:27
+
+from django.db import migrations, models
+
+
+def record_upload_names(apps, schema_editor):
+    """Photos still queued from a direct upload; the rest have no upload left to confirm."""
+    PhotoJob = apps.get_model('api', 'PhotoJob')
+    Photo = apps.get_model('api', 'Photo')
+    for photo_id, name in PhotoJob.objects.filter(source='storage').values_list('photo_id', 'source_name').iterator():
+        Photo.objects.filter(pk=photo_id).update(upload_name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_keep_ledger_entries_of_deleted_profiles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='upload_name',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(record_upload_names, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='photo',
+            constraint=models.UniqueConstraint(condition=models.Q(('upload_name', ''), _negated=True), fields=('upload_name',), name='unique_photo_upload_name'),
+        ),
+    ]
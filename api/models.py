@@ -1,8 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
+from django.utils import timezone
 import uuid
 
+from .porutham import nakshatra_code, raasi_code
+
 
 class User(AbstractUser):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -26,7 +29,28 @@ class User(AbstractUser):
     )
 
 
+def normalize_match_value(value):
+    """
+    Canonical form used for the indexed match columns, so that feed filters can
+    use plain equality instead of iexact (which can't use an ordinary index).
+    """
+    return ' '.join((value or '').split()).lower()
+
+
 class Profile(models.Model):
+    # Source column -> lower-cased shadow column queried by the match feed
+    MATCH_KEY_FIELDS = {
+        'gender': 'gender_key',
+        'caste': 'caste_key',
+        'religion': 'religion_key',
+        'mother_tongue': 'mother_tongue_key',
+    }
+    # Source column -> porutham table index (see api/porutham.py)
+    HOROSCOPE_CODE_FIELDS = {
+        'nakshatram': ('nakshatra_code', nakshatra_code),
+        'raasi': ('raasi_code', raasi_code),
+    }
+
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='profile')
     full_name = models.CharField(max_length=255, blank=True)
     gender = models.CharField(max_length=10, blank=True)
@@ -54,18 +78,158 @@ class Profile(models.Model):
     designation = models.CharField(max_length=100, blank=True)
     salary = models.FloatField(null=True, blank=True)  # Annual salary in Lakhs
     about = models.TextField(blank=True)
+    # The owner's weights for the recommended feed order (see api/ranking.py)
+    ranking_weights = models.JSONField(default=dict, blank=True)
+    # Also bumped when the profile's photos change (see api/signals.py)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Normalized copies of the match filters, kept in sync in save()
+    gender_key = models.CharField(max_length=10, blank=True, editable=False)
+    caste_key = models.CharField(max_length=50, blank=True, editable=False)
+    religion_key = models.CharField(max_length=50, blank=True, editable=False)
+    mother_tongue_key = models.CharField(max_length=50, blank=True, editable=False)
+    # Null when the name is not recognised
+    nakshatra_code = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+    raasi_code = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Shaped like the feed query: equality filters first, then the
+            # date_of_birth range/ordering key and the id tie-breaker.
+            models.Index(
+                fields=['gender_key', 'caste_key', 'religion_key', 'date_of_birth', 'id'],
+                name='profile_match_idx',
+            ),
+            models.Index(fields=['gender_key', 'date_of_birth', 'id'], name='profile_gender_dob_idx'),
+        ]
 
     def __str__(self):
         return self.full_name or self.user.username
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember which feed this row was in, so a gender change can
+        # invalidate the feed it leaves as well as the one it joins
+        instance._loaded_gender_key = instance.__dict__.get('gender_key')
+        return instance
+
+    def sync_match_keys(self):
+        for source, target in self.MATCH_KEY_FIELDS.items():
+            setattr(self, target, normalize_match_value(getattr(self, source)))
+        for source, (target, to_code) in self.HOROSCOPE_CODE_FIELDS.items():
+            setattr(self, target, to_code(getattr(self, source)))
+
+    def save(self, *args, **kwargs):
+        self.sync_match_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            update_fields |= {self.MATCH_KEY_FIELDS[f] for f in update_fields if f in self.MATCH_KEY_FIELDS}
+            update_fields |= {self.HOROSCOPE_CODE_FIELDS[f][0] for f in update_fields if f in self.HOROSCOPE_CODE_FIELDS}
+            update_fields.add('updated_at')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
+
+class ProfileChange(models.Model):
+    """
+    Append-only log of profile changes, fed by signals in api/signals.py.
+    The auto-incrementing id is the watermark handed to syncing clients.
+    ``profile_id`` is a plain column so tombstones outlive the profile.
+    """
+    KIND_CHOICES = [
+        ('upsert', 'Created or updated'),
+        ('delete', 'Deleted'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    profile_id = models.BigIntegerField()
+    # The profile's gender_key, so a feed only reads changes for its candidates
+    gender_key = models.CharField(max_length=10, blank=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['gender_key', 'id'], name='profilechange_gender_idx'),
+            models.Index(fields=['profile_id', 'id'], name='profilechange_profile_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} of profile {self.profile_id}"
+
 
 class Photo(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+
     profile = models.ForeignKey(Profile, related_name='photos', on_delete=models.CASCADE)
-    image = models.ImageField(upload_to='profile_photos/')
+    image = models.ImageField(upload_to='profile_photos/', blank=True)
+    # Resized copies, {variant: {format: storage name}}; see api/images.py
+    variants = models.JSONField(default=dict, blank=True)
+    # Uploads are 'pending' until a PhotoJob has pushed them to storage
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='ready')
+    # Storage name of the direct upload it was confirmed from, so an upload
+    # id is only ever confirmed once (see PhotoUploadConfirmView)
+    upload_name = models.CharField(max_length=255, blank=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['upload_name'],
+                condition=~models.Q(upload_name=''),
+                name='unique_photo_upload_name',
+            ),
+        ]
 
     def __str__(self):
         return f"Photo for {self.profile.full_name}"
 
+
+class PhotoJob(models.Model):
+    """
+    Queued work for turning a raw upload into stored photo variants.
+    Processed by ``manage.py process_photo_jobs``; see api/jobs.py.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('failed', 'Failed'),
+    ]
+
+    SOURCE_CHOICES = [
+        ('spool', 'Local spool'),
+        ('storage', 'Configured storage'),
+    ]
+
+    photo = models.OneToOneField(Photo, on_delete=models.CASCADE, related_name='job')
+    # Where the raw upload is: spooled by PhotoUploadView, or uploaded by the
+    # client straight into storage through a presigned target
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='spool')
+    source_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='photojob_claim_idx'),
+        ]
+        constraints = [
+            # An upload becomes one photo, however often it is confirmed
+            models.UniqueConstraint(fields=['source', 'source_name'], name='unique_photojob_source'),
+        ]
+
+    def __str__(self):
+        return f"{self.status} job for photo {self.photo_id}"
+
 class CreditTransaction(models.Model):
     ACTION_CHOICES = [
         ('unlock', 'Unlock Profile'),
@@ -73,10 +237,120 @@ class CreditTransaction(models.Model):
     ]
     
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='credit_transactions')
-    profile_unlocked = models.ForeignKey(Profile, on_delete=models.CASCADE, null=True, blank=True, related_name='unlocked_by')
+    # Kept when the profile is deleted, so its tombstone still reaches the
+    # users who unlocked it (see UnlockedProfileListView); joins to Profile
+    # drop the dangling rows
+    profile_unlocked = models.ForeignKey(
+        Profile, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='unlocked_by',
+    )
     action = models.CharField(max_length=10, choices=ACTION_CHOICES)
     credits_spent = models.IntegerField(default=1)
     transaction_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Covers the "my unlocked profiles" listing: filtered by user and
+            # action, newest first, with the profile id read from the index
+            models.Index(
+                fields=['user', 'action', '-transaction_date', 'profile_unlocked'],
+                name='credittx_user_action_date_idx',
+            ),
+        ]
+        constraints = [
+            # A profile can only be unlocked (and paid for) once per user
+            models.UniqueConstraint(
+                fields=['user', 'profile_unlocked'],
+                condition=models.Q(action='unlock'),
+                name='unique_profile_unlock',
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user.username} '{self.action}' on {self.transaction_date.strftime('%Y-%m-%d')}"
+
+
+
+class CreditEntry(models.Model):
+    """
+    One movement of credits in the append-only ledger behind
+    ``User.credits``: a user's balance is the sum of their entries. Entries
+    are only ever added, through api/credits.py, in the same transaction
+    that moves the balance.
+    """
+    KIND_CHOICES = [
+        ('opening', 'Opening Balance'),
+        ('grant', 'Registration Grant'),
+        ('purchase', 'Purchase'),
+        ('unlock', 'Unlock Profile'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='credit_entries')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Credits added (positive) or spent (negative)
+    amount = models.IntegerField()
+    # The unlocked profile. Deleting it leaves the entry as it was, with a
+    # dangling id, since ledger rows are never updated
+    profile = models.ForeignKey(
+        Profile, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+',
+    )
+    # Payment id of a purchase
+    reference = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # A user's entries in order: the tail after a snapshot, and the
+            # order reconcile_credits streams the whole ledger in
+            models.Index(fields=['user', 'id'], name='creditentry_user_id_idx'),
+        ]
+        constraints = [
+            # A payment is credited once
+            models.UniqueConstraint(
+                fields=['reference'],
+                condition=models.Q(kind='purchase'),
+                name='unique_credit_purchase',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Credit entries are append-only.')
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.kind} {self.amount:+d} for user {self.user_id}"
+
+
+class CreditSnapshot(models.Model):
+    """
+    A user's balance as of ``entry``, taken every few entries, so the ledger
+    balance is the latest snapshot plus the short tail of entries after it.
+    """
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='credit_snapshots')
+    entry = models.OneToOneField(CreditEntry, on_delete=models.CASCADE, related_name='+')
+    balance = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'entry'], name='creditsnapshot_user_entry_idx'),
+        ]
+
+    def __str__(self):
+        return f"Balance {self.balance} for user {self.user_id} at entry {self.entry_id}"
+
+class RevokedToken(models.Model):
+    """
+    A refresh token revoked on logout, by ``jti``. Kept only until the token
+    would have expired anyway; ``prune_revoked_tokens`` deletes it after
+    that. See api/revocation.py for the lookup path.
+    """
+    id = models.BigAutoField(primary_key=True)
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Revoked token {self.jti}"
@@ -0,0 +1,121 @@
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPagination:
+    """
+    Cursor (keyset) pagination over a fixed tuple of ordering keys.
+
+    Pages are fetched with a ``WHERE (k1, k2, ...) > (v1, v2, ...)`` style
+    filter and ``LIMIT n + 1``, so no COUNT or OFFSET scan is ever run and the
+    cost of a page does not depend on how deep into the feed the client is.
+    The last key must be unique (normally the primary key).
+    """
+    default_limit = 20
+    max_limit = 100
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+
+    def __init__(self, keys, descending=False):
+        self.keys = tuple(keys)
+        self.descending = descending
+        self.next_cursor = None
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get(self.limit_query_param, self.default_limit))
+        except (TypeError, ValueError):
+            return self.default_limit
+        return max(1, min(limit, self.max_limit))
+
+    def get_ordering(self):
+        prefix = '-' if self.descending else ''
+        return [prefix + key for key in self.keys]
+
+    def encode_cursor(self, obj):
+        values = []
+        for key in self.keys:
+            value = getattr(obj, key)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, token, model):
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (ValueError, TypeError):
+            raise InvalidCursor('Invalid cursor.')
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            raise InvalidCursor('Invalid cursor.')
+
+        decoded = []
+        for key, value in zip(self.keys, values):
+            try:
+                field = model._meta.get_field(key)
+            except FieldDoesNotExist:
+                # Annotated keys (ranks, scores) are stored as plain JSON values
+                decoded.append(value)
+                continue
+            try:
+                decoded.append(field.to_python(value))
+            except Exception:
+                raise InvalidCursor('Invalid cursor.')
+        return decoded
+
+    def get_keyset_filter(self, values):
+        """
+        Expand a row-value comparison into an index-friendly OR of prefixes:
+        (a > x) OR (a = x AND b > y) OR ...
+        """
+        lookup = 'lt' if self.descending else 'gt'
+        condition = Q()
+        for index, key in enumerate(self.keys):
+            term = Q(**{f'{key}__{lookup}': values[index]})
+            for prev_key, prev_value in zip(self.keys[:index], values[:index]):
+                term &= Q(**{prev_key: prev_value})
+            condition |= term
+        return condition
+
+    def get_page_queryset(self, queryset, request):
+        """The ordered, filtered and sliced queryset holding the page and one more row."""
+        limit = self.get_limit(request)
+        token = request.query_params.get(self.cursor_query_param)
+
+        queryset = queryset.order_by(*self.get_ordering())
+        if token:
+            queryset = queryset.filter(self.get_keyset_filter(self.decode_cursor(token, queryset.model)))
+        return queryset[:limit + 1], limit
+
+    def finish_page(self, page, limit):
+        if len(page) > limit:
+            page = page[:limit]
+            self.next_cursor = self.encode_cursor(page[-1])
+        else:
+            self.next_cursor = None
+        return page
+
+    def paginate_queryset(self, queryset, request):
+        """
+        Return the list of objects for the requested page. Raises
+        ``InvalidCursor`` if the client sent a malformed cursor.
+        """
+        queryset, limit = self.get_page_queryset(queryset, request)
+        return self.finish_page(list(queryset), limit)
+
+    async def apaginate_queryset(self, queryset, request):
+        queryset, limit = self.get_page_queryset(queryset, request)
+        return self.finish_page([obj async for obj in queryset], limit)
+
+    def get_paginated_data(self, data):
+        return {
+            'next_cursor': self.next_cursor,
+            'results': data,
+        }
@@ -0,0 +1,212 @@
+"""
+Porutham (horoscope compatibility) scores.
+
+Ten poruthams are checked for a bride and groom: seven depend only on their
+nakshatrams (dina, gana, mahendra, stree deergha, yoni, rajju, vedha) and
+three only on their raasis (raasi, raasi adhipathi, vasya). Both halves are
+precomputed once per process into a 27×27 and a 12×12 table indexed
+``[bride][groom]``, so scoring a candidate is two table lookups and the score
+is the number of poruthams that match (0-10).
+
+Profiles store free-text names; ``nakshatra_code`` and ``raasi_code`` map the
+common English, Sanskrit and Tamil spellings to the table indexes.
+"""
+import re
+from functools import lru_cache
+
+from django.db.models import Case, IntegerField, Value, When
+
+MAX_PORUTHAM = 10
+
+NAKSHATRAS = (
+    'Ashwini', 'Bharani', 'Krittika', 'Rohini', 'Mrigashira', 'Ardra', 'Punarvasu', 'Pushya', 'Ashlesha',
+    'Magha', 'Purva Phalguni', 'Uttara Phalguni', 'Hasta', 'Chitra', 'Swati', 'Vishakha', 'Anuradha', 'Jyeshtha',
+    'Mula', 'Purva Ashadha', 'Uttara Ashadha', 'Shravana', 'Dhanishta', 'Shatabhisha', 'Purva Bhadrapada',
+    'Uttara Bhadrapada', 'Revati',
+)
+RAASIS = (
+    'Mesham', 'Rishabam', 'Mithunam', 'Kadagam', 'Simmam', 'Kanni',
+    'Thulam', 'Viruchigam', 'Dhanusu', 'Magaram', 'Kumbam', 'Meenam',
+)
+
+# Alternative spellings, compared after lower-casing and dropping everything
+# but letters
+NAKSHATRA_ALIASES = (
+    ('ashwini', 'aswini', 'asvini', 'ashvini', 'aswathi', 'ashwathi'),
+    ('bharani', 'barani'),
+    ('krittika', 'kritika', 'krithika', 'kruthika', 'karthika', 'karthigai', 'karthikai', 'kartigai'),
+    ('rohini',),
+    ('mrigashira', 'mrigasira', 'mrigashirsha', 'mrigasheersha', 'mrugasira', 'mirugasirisham', 'makayiram'),
+    ('ardra', 'aardra', 'arudra', 'thiruvathirai', 'thiruvadhirai', 'athira'),
+    ('punarvasu', 'punarpoosam', 'punarpusam', 'punartham'),
+    ('pushya', 'pushyami', 'poosam', 'pusam', 'pooyam'),
+    ('ashlesha', 'aslesha', 'ashlesa', 'ayilyam', 'aayilyam'),
+    ('magha', 'makha', 'magam', 'makam'),
+    ('purvaphalguni', 'poorvaphalguni', 'pooram', 'pubba'),
+    ('uttaraphalguni', 'uthraphalguni', 'uthiram', 'uthram'),
+    ('hasta', 'hastha', 'hastham', 'hastam', 'atham'),
+    ('chitra', 'chithra', 'chitta', 'chithirai', 'chitirai', 'chithira'),
+    ('swati', 'swathi', 'svati', 'chothi'),
+    ('vishakha', 'visakha', 'vishaka', 'visakam', 'vishakam'),
+    ('anuradha', 'anusham', 'anizham'),
+    ('jyeshtha', 'jyeshta', 'jyestha', 'kettai', 'thrikketta', 'triketta'),
+    ('mula', 'moola', 'moolam', 'mulam'),
+    ('purvaashadha', 'purvashadha', 'purvashada', 'poorvashada', 'pooradam'),
+    ('uttaraashadha', 'uttarashadha', 'uttarashada', 'uthiradam', 'uthradam'),
+    ('shravana', 'sravana', 'shravanam', 'sravanam', 'thiruvonam'),
+    ('dhanishta', 'dhanishtha', 'dhanista', 'avittam'),
+    ('shatabhisha', 'satabhisha', 'shatabhishak', 'satabhishak', 'sathayam', 'chathayam'),
+    ('purvabhadrapada', 'poorvabhadrapada', 'purvabhadra', 'poorvabhadra', 'poorattathi', 'pooruruttathi'),
+    ('uttarabhadrapada', 'uttarabhadra', 'uthirattathi', 'uthrattathi'),
+    ('revati', 'revathi'),
+)
+RAASI_ALIASES = (
+    ('mesham', 'mesha', 'medam', 'aries'),
+    ('rishabam', 'rishabham', 'rishaba', 'vrishabha', 'vrishabham', 'edavam', 'taurus'),
+    ('mithunam', 'mithuna', 'mithun', 'gemini'),
+    ('kadagam', 'katakam', 'kataka', 'karkatakam', 'karka', 'karkidakam', 'cancer'),
+    ('simmam', 'simha', 'simham', 'chingam', 'leo'),
+    ('kanni', 'kanya', 'virgo'),
+    ('thulam', 'thula', 'tula', 'thulaam', 'libra'),
+    ('viruchigam', 'vrischika', 'vrishchika', 'vrischikam', 'vrichikam', 'scorpio'),
+    ('dhanusu', 'dhanus', 'dhanu', 'dhanush', 'sagittarius'),
+    ('magaram', 'makara', 'makaram', 'capricorn'),
+    ('kumbam', 'kumbha', 'kumbham', 'aquarius'),
+    ('meenam', 'meena', 'pisces'),
+)
+
+_non_letters_re = re.compile(r'[^a-z]')
+
+
+def _build_lookup(aliases):
+    return {alias: index for index, names in enumerate(aliases) for alias in names}
+
+
+_nakshatra_lookup = _build_lookup(NAKSHATRA_ALIASES)
+_raasi_lookup = _build_lookup(RAASI_ALIASES)
+
+
+def _lookup_key(value):
+    return _non_letters_re.sub('', (value or '').lower())
+
+
+def nakshatra_code(value):
+    """Index (0-26) of a nakshatram name, or None if it is not recognised."""
+    return _nakshatra_lookup.get(_lookup_key(value))
+
+
+def raasi_code(value):
+    """Index (0-11) of a raasi name, or None if it is not recognised."""
+    return _raasi_lookup.get(_lookup_key(value))
+
+
+# Per-nakshatra attributes used by the star poruthams
+GANAS = 'DMRMDMDDRRMMDRDRDRRMMDRRMMD'  # Deva, Manushya, Rakshasa
+YONIS = (
+    'horse', 'elephant', 'sheep', 'serpent', 'serpent', 'dog', 'cat', 'sheep', 'cat',
+    'rat', 'rat', 'cow', 'buffalo', 'tiger', 'buffalo', 'tiger', 'deer', 'deer',
+    'dog', 'monkey', 'mongoose', 'monkey', 'lion', 'horse', 'lion', 'cow', 'elephant',
+)
+YONI_ENEMIES = {
+    frozenset(pair) for pair in (
+        ('horse', 'buffalo'), ('elephant', 'lion'), ('sheep', 'monkey'), ('serpent', 'mongoose'),
+        ('dog', 'deer'), ('cat', 'rat'), ('cow', 'tiger'),
+    )
+}
+RAJJUS = ('paada', 'kati', 'nabhi', 'kanta', 'siro', 'kanta', 'nabhi', 'kati', 'paada') * 3
+VEDHA_PAIRS = {
+    frozenset(pair) for pair in (
+        (0, 17), (1, 16), (2, 15), (3, 14), (5, 21), (6, 20), (7, 19), (8, 18),
+        (9, 26), (10, 25), (11, 24), (12, 23), (4, 13), (4, 22), (13, 22),
+    )
+}
+
+# Per-raasi attributes used by the raasi poruthams
+RAASI_LORDS = (
+    'mars', 'venus', 'mercury', 'moon', 'sun', 'mercury',
+    'venus', 'mars', 'jupiter', 'saturn', 'saturn', 'jupiter',
+)
+PLANET_ENEMIES = {
+    'sun': {'venus', 'saturn'},
+    'moon': set(),
+    'mars': {'mercury'},
+    'mercury': {'moon'},
+    'jupiter': {'mercury', 'venus'},
+    'venus': {'sun', 'moon'},
+    'saturn': {'sun', 'moon', 'mars'},
+}
+VASYA = (
+    {4, 7}, {3, 6}, {5}, {7, 8}, {6}, {2, 11},
+    {9, 5}, {3}, {11}, {10, 0}, {0}, {9},
+)
+
+
+def nakshatra_porutham(bride, groom):
+    """Number of the seven star poruthams that match (0-7)."""
+    # Counted inclusively from the bride's star to the groom's
+    count = (groom - bride) % 27 + 1
+    gana = GANAS[bride] == GANAS[groom] or {GANAS[bride], GANAS[groom]} == {'D', 'M'}
+    return sum((
+        count % 9 in (0, 2, 4, 6, 8),                                   # dina
+        gana,                                                           # gana
+        count in (4, 7, 10, 13, 16, 19, 22, 25),                        # mahendra
+        count > 13,                                                     # stree deergha
+        frozenset((YONIS[bride], YONIS[groom])) not in YONI_ENEMIES,    # yoni
+        RAJJUS[bride] != RAJJUS[groom],                                 # rajju
+        frozenset((bride, groom)) not in VEDHA_PAIRS,                   # vedha
+    ))
+
+
+def raasi_porutham(bride, groom):
+    """Number of the three raasi poruthams that match (0-3)."""
+    count = (groom - bride) % 12 + 1
+    bride_lord, groom_lord = RAASI_LORDS[bride], RAASI_LORDS[groom]
+    lords = bride_lord == groom_lord or (
+        groom_lord not in PLANET_ENEMIES[bride_lord] and bride_lord not in PLANET_ENEMIES[groom_lord]
+    )
+    return sum((
+        count == 1 or count > 6,                                # raasi
+        lords,                                                  # raasi adhipathi
+        groom in VASYA[bride] or bride in VASYA[groom],         # vasya
+    ))
+
+
+@lru_cache(maxsize=None)
+def nakshatra_table():
+    """27×27 star scores indexed ``[bride][groom]``, built once per process."""
+    return tuple(tuple(nakshatra_porutham(b, g) for g in range(27)) for b in range(27))
+
+
+@lru_cache(maxsize=None)
+def raasi_table():
+    """12×12 raasi scores indexed ``[bride][groom]``, built once per process."""
+    return tuple(tuple(raasi_porutham(b, g) for g in range(12)) for b in range(12))
+
+
+def porutham_score(bride_nakshatra, bride_raasi, groom_nakshatra, groom_raasi):
+    return nakshatra_table()[bride_nakshatra][groom_nakshatra] + raasi_table()[bride_raasi][groom_raasi]
+
+
+def porutham_expression(viewer_nakshatra, viewer_raasi, viewer_is_bride):
+    """
+    SQL expression scoring every candidate row against the viewer.
+
+    The viewer's row and column of each table is inlined as a ``CASE`` over
+    the candidate's codes, so the database does the lookup per row and can
+    filter and order by the result. Candidates whose nakshatram or raasi is
+    unknown score NULL.
+    """
+    stars, raasis = nakshatra_table(), raasi_table()
+    if viewer_is_bride:
+        star_scores = stars[viewer_nakshatra]
+        raasi_scores = raasis[viewer_raasi]
+    else:
+        star_scores = [row[viewer_nakshatra] for row in stars]
+        raasi_scores = [row[viewer_raasi] for row in raasis]
+    return Case(
+        *[When(nakshatra_code=code, then=Value(score)) for code, score in enumerate(star_scores)],
+        output_field=IntegerField(),
+    ) + Case(
+        *[When(raasi_code=code, then=Value(score)) for code, score in enumerate(raasi_scores)],
+        output_field=IntegerField(),
+    )
@@ -0,0 +1,181 @@
+import heapq
+import re
+from bisect import bisect_right
+
+from django.conf import settings
+from django.db.models import Case, Exists, IntegerField, OuterRef, Q, Value, When
+
+from .cache import get_ranking, set_ranking
+from .models import Photo, normalize_match_value
+from .pagination import InvalidCursor
+
+RANKING_SIGNALS = ('age', 'height', 'salary', 'education', 'location', 'completeness', 'photos')
+DEFAULT_RANKING_WEIGHTS = {
+    'age': 3, 'height': 1, 'salary': 1, 'education': 2, 'location': 2, 'completeness': 1, 'photos': 2,
+}
+MAX_RANKING_WEIGHT = 10
+# Rows fetched per round trip while scoring the candidates
+RANKING_BATCH_SIZE = getattr(settings, 'RANKING_BATCH_SIZE', 2000)
+# Best candidates of a feed ranked once and cached; pages within them are
+# sliced from the cache, pages past them scan again
+RANKING_CACHE_SIZE = getattr(settings, 'RANKING_CACHE_SIZE', 1000)
+
+# Years the groom is older than the bride that scores best; each year
+# further away costs a tenth of the signal
+IDEAL_AGE_GAP = 3
+# Groom taller than the bride by up to this many cm scores best
+IDEAL_HEIGHT_GAP = 20
+# Annual salary band edges, in lakhs
+SALARY_BANDS = (3, 6, 10, 20, 50)
+EDUCATION_LEVELS = (
+    (4, re.compile(r'\b(ph\.?\s?d|doctorate)\b')),
+    (3, re.compile(r'\b(master|m\.?\s?(tech|sc|a|com|e|ca|ba|s|d|phil)|mba|pg)\b')),
+    (2, re.compile(r'\b(bachelor|b\.?\s?(tech|sc|a|com|e|ca|ba|arch|pharm|ed)|mbbs|bds|ca|degree|graduate)\b')),
+    (1, re.compile(r'\b(diploma|iti|polytechnic)\b')),
+)
+# Columns counted towards profile completeness
+COMPLETENESS_FIELDS = (
+    'full_name', 'height', 'education', 'occupation', 'city', 'salary',
+    'raasi', 'nakshatram', 'about', 'fathers_name', 'mothers_name',
+)
+_NUMERIC_FIELDS = {'height', 'salary'}
+
+# Columns read for each candidate, in the order ``Ranker.score`` expects
+SCORING_COLUMNS = (
+    'id', 'date_of_birth', 'height', 'salary', 'education', 'city', 'state', 'filled_fields', 'has_photos',
+)
+
+
+def get_ranking_weights(profile):
+    """The profile's stored weights over the defaults."""
+    weights = dict(DEFAULT_RANKING_WEIGHTS)
+    weights.update({
+        name: value for name, value in (profile.ranking_weights or {}).items() if name in DEFAULT_RANKING_WEIGHTS
+    })
+    return weights
+
+
+def education_level(value):
+    """0 (unknown) to 4 (doctorate), from the free-text education field."""
+    text = (value or '').lower()
+    for level, pattern in EDUCATION_LEVELS:
+        if pattern.search(text):
+            return level
+    return 0
+
+
+def annotate_for_ranking(queryset):
+    """Add ``filled_fields`` and ``has_photos``, computed in the database."""
+    filled = Value(0)
+    for name in COMPLETENESS_FIELDS:
+        condition = Q(**{f'{name}__isnull': False}) if name in _NUMERIC_FIELDS else ~Q(**{name: ''})
+        filled = filled + Case(When(condition, then=Value(1)), default=Value(0), output_field=IntegerField())
+    return queryset.annotate(
+        filled_fields=filled,
+        has_photos=Exists(Photo.objects.filter(profile=OuterRef('pk'), status='ready')),
+    )
+
+
+class Ranker:
+    """
+    Scores candidates for one viewer. Every signal is scaled to 0-1 and the
+    score is their weighted sum, so only the relative size of the weights
+    matters.
+    """
+
+    def __init__(self, viewer, weights):
+        self.weights = weights
+        self.viewer_is_bride = normalize_match_value(viewer.gender) == 'female'
+        self.dob = viewer.date_of_birth
+        self.height = viewer.height
+        self.education = education_level(viewer.education)
+        self.city = normalize_match_value(viewer.city)
+        self.state = normalize_match_value(viewer.state)
+
+    def score(self, row):
+        _, dob, height, salary, education, city, state, filled_fields, has_photos = row
+        w = self.weights
+        total = w['completeness'] * filled_fields / len(COMPLETENESS_FIELDS) + w['photos'] * bool(has_photos)
+        if dob is not None and self.dob is not None:
+            bride_dob, groom_dob = (self.dob, dob) if self.viewer_is_bride else (dob, self.dob)
+            gap = (bride_dob - groom_dob).days / 365.25
+            total += w['age'] * max(0.0, 1 - abs(gap - IDEAL_AGE_GAP) / 10)
+        if height is not None and self.height is not None:
+            # How much taller the groom is than the bride
+            gap = height - self.height if self.viewer_is_bride else self.height - height
+            off = -gap if gap < 0 else max(0, gap - IDEAL_HEIGHT_GAP)
+            total += w['height'] * max(0.0, 1 - off / 15)
+        if salary is not None:
+            total += w['salary'] * bisect_right(SALARY_BANDS, salary) / len(SALARY_BANDS)
+        if self.education:
+            level = education_level(education)
+            if level:
+                total += w['education'] * (1 - abs(level - self.education) / 4)
+        if self.city and normalize_match_value(city) == self.city:
+            total += w['location']
+        elif self.state and normalize_match_value(state) == self.state:
+            total += w['location'] / 2
+        return round(total, 6)
+
+
+def rank_candidates(queryset, ranker, count, before=None):
+    """
+    Return the best ``count`` ``(score, id)`` pairs from ``queryset``, best
+    first, skipping those that rank at or above ``before``.
+
+    Candidates are streamed in batches of plain tuples and pushed through a
+    heap of size ``count``, so memory stays O(count) however large the feed.
+    """
+    rows = annotate_for_ranking(queryset.prefetch_related(None).order_by()).values_list(*SCORING_COLUMNS)
+    heap = []
+    for row in rows.iterator(chunk_size=RANKING_BATCH_SIZE):
+        key = (ranker.score(row), row[0])
+        if before is not None and key >= before:
+            continue
+        if len(heap) < count:
+            heapq.heappush(heap, key)
+        elif key > heap[0]:
+            heapq.heapreplace(heap, key)
+    return sorted(heap, reverse=True)
+
+
+def get_ranked_page(queryset, ranker, paginator, request, cache_key=None):
+    """
+    One page of ``queryset`` in ranking order, using ``paginator``'s cursor
+    (keys ``('match_score', 'id')``, descending). Only the profiles on the
+    page are loaded as instances, each with ``match_score`` set.
+    Raises ``InvalidCursor`` for a malformed cursor.
+
+    The best ``RANKING_CACHE_SIZE`` candidates are scored once and kept
+    under ``cache_key`` (see ``ranking_cache_key``) until the feed's
+    generation changes, so later pages slice them instead of scoring every
+    candidate again.
+    """
+    limit = paginator.get_limit(request)
+    token = request.query_params.get(paginator.cursor_query_param)
+    before = tuple(paginator.decode_cursor(token, queryset.model)) if token else None
+    if before is not None and not isinstance(before[0], (int, float)):
+        raise InvalidCursor('Invalid cursor.')
+
+    top = get_ranking(cache_key) if cache_key else None
+    if top is None:
+        top = rank_candidates(queryset, ranker, RANKING_CACHE_SIZE)
+        if cache_key:
+            set_ranking(cache_key, top)
+    # ``top`` is best first; skip to the first candidate ranked below the cursor
+    start = 0 if before is None else bisect_right(top, (-before[0], -before[1]), key=lambda key: (-key[0], -key[1]))
+    ranked = top[start:start + limit + 1]
+    if len(ranked) <= limit and len(top) == RANKING_CACHE_SIZE:
+        # Past the cached candidates, which may not be all of them
+        ranked = rank_candidates(queryset, ranker, limit + 1, before)
+
+    scores = {pk: score for score, pk in ranked[:limit]}
+    profiles = queryset.in_bulk(list(scores))
+    page = []
+    for pk, score in scores.items():
+        if pk in profiles:
+            profiles[pk].match_score = score
+            page.append(profiles[pk])
+
+    paginator.next_cursor = paginator.encode_cursor(page[-1]) if len(ranked) > limit and page else None
+    return page
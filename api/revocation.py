@@ -0,0 +1,139 @@
+"""
+Refresh token revocation keyed by ``jti``.
+
+Revoked tokens are ``RevokedToken`` rows, kept until the token expires and
+then deleted by ``prune_revoked_tokens``, so the table only ever holds the
+tokens revoked within one refresh token lifetime.
+
+Each process keeps a Bloom filter of the revoked ``jti``s. A token the
+filter has never seen is cleared without touching the database; only the
+few that hit (revoked, or a false positive) are looked up. Processes learn
+about revocations made elsewhere through a generation value in the shared
+cache, rewritten on every revocation: when it changes, the filter loads the
+rows revoked since its last sync.
+"""
+import hashlib
+import math
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import AUTH_CACHE_ALIAS
+from .models import RevokedToken
+
+# Revoked tokens the filter holds at the target error rate; it is rebuilt
+# from the unexpired rows once it has taken in more than this
+REVOCATION_FILTER_CAPACITY = getattr(settings, 'REVOCATION_FILTER_CAPACITY', 100_000)
+REVOCATION_FILTER_ERROR_RATE = getattr(settings, 'REVOCATION_FILTER_ERROR_RATE', 0.01)
+# Rows revoked this long before the last sync are read again, covering
+# transactions that committed after a later one
+REVOCATION_SYNC_OVERLAP = timedelta(seconds=getattr(settings, 'REVOCATION_SYNC_OVERLAP', 60))
+
+GENERATION_KEY = 'auth:revocation:generation'
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        # Double hashing: two 64-bit halves of one digest give every position
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        added = False
+        for position in self._positions(value):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                added = True
+        # Values already (or apparently) present don't count towards capacity
+        self.count += added
+
+    def __contains__(self, value):
+        return all(self.bits[position // 8] & (1 << (position % 8)) for position in self._positions(value))
+
+
+def get_generation():
+    cache = caches[AUTH_CACHE_ALIAS]
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # A fresh value, so an evicted generation still makes every process sync
+        cache.add(GENERATION_KEY, uuid.uuid4().hex, timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    # A new random value rather than incr: concurrent bumps can't cancel out
+    caches[AUTH_CACHE_ALIAS].set(GENERATION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+class RevocationIndex:
+    """The per-process filter, kept in step with ``RevokedToken``."""
+
+    def __init__(self, capacity=REVOCATION_FILTER_CAPACITY, error_rate=REVOCATION_FILTER_ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.filter = None
+        self.generation = None
+        self.synced_at = None
+
+    def sync(self):
+        generation = get_generation()
+        if self.filter is not None and generation == self.generation:
+            return
+        with self.lock:
+            if self.filter is not None and generation == self.generation:
+                return
+            # Read before the generation we saw is recorded: a revocation
+            # committed meanwhile bumps it again and is picked up next time
+            now = timezone.now()
+            if self.filter is None or self.filter.count > self.capacity:
+                bloom = BloomFilter(self.capacity, self.error_rate)
+                rows = RevokedToken.objects.filter(expires_at__gt=now)
+            else:
+                bloom = self.filter
+                rows = RevokedToken.objects.filter(revoked_at__gte=self.synced_at - REVOCATION_SYNC_OVERLAP)
+            for jti in rows.values_list('jti', flat=True).iterator(chunk_size=2000):
+                bloom.add(jti)
+            self.filter = bloom
+            self.synced_at = now
+            self.generation = generation
+
+    def add(self, jti):
+        with self.lock:
+            if self.filter is not None:
+                self.filter.add(jti)
+
+    def might_contain(self, jti):
+        self.sync()
+        return jti in self.filter
+
+
+index = RevocationIndex()
+
+
+def is_revoked(jti):
+    """Whether the token ``jti`` was revoked; a database hit only on a filter match."""
+    if not index.might_contain(jti):
+        return False
+    return RevokedToken.objects.filter(jti=jti).exists()
+
+
+def revoke(jti, expires_at):
+    """Revoke the token ``jti`` until ``expires_at``, when it lapses anyway."""
+    RevokedToken.objects.get_or_create(jti=jti, defaults={'expires_at': expires_at})
+    index.add(jti)
+    transaction.on_commit(bump_generation)
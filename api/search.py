@@ -0,0 +1,167 @@
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Profile
+
+# Profile columns covered by the search index
+SEARCH_FIELDS = ('education', 'occupation', 'designation', 'city', 'about')
+SEARCH_TABLE = 'api_profile_search'
+
+_word_re = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(query):
+    """Split a free-text query into plain words, dropping any operators."""
+    return _word_re.findall(query.lower())[:10]
+
+
+class PostgresSearchBackend:
+    """
+    ``tsvector`` documents in a side table with a GIN index. Uses the
+    'simple' configuration: names of places and degrees should not be
+    stemmed as English words.
+    """
+
+    def create_schema(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ('
+            ' profile_id bigint PRIMARY KEY REFERENCES api_profile (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,'
+            ' document tsvector NOT NULL)'
+        )
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_idx ON {SEARCH_TABLE} USING gin (document)')
+
+    def drop_schema(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def index(self, cursor, profile_id, values):
+        # Weighted so occupation/education matches rank above a word in 'about'
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (profile_id, document) VALUES (%s, '
+            " setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'A') ||"
+            " setweight(to_tsvector('simple', %s), 'B') || setweight(to_tsvector('simple', %s), 'B') ||"
+            " setweight(to_tsvector('simple', %s), 'C'))"
+            ' ON CONFLICT (profile_id) DO UPDATE SET document = EXCLUDED.document',
+            [profile_id, *values],
+        )
+
+    def remove(self, cursor, profile_id):
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE profile_id = %s', [profile_id])
+
+    def to_query(self, terms):
+        # Every word must match; the last one as a prefix (search as you type)
+        return ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+
+    def filter_and_rank(self, queryset, terms):
+        tsquery = self.to_query(terms)
+        table = Profile._meta.db_table
+        matches = RawSQL(
+            f"SELECT profile_id FROM {SEARCH_TABLE} WHERE document @@ to_tsquery('simple', %s)", [tsquery],
+        )
+        rank = RawSQL(
+            f"SELECT ts_rank(document, to_tsquery('simple', %s)) FROM {SEARCH_TABLE}"
+            f' WHERE profile_id = {table}.id', [tsquery], output_field=FloatField(),
+        )
+        return queryset.filter(Q(id__in=matches)).annotate(search_rank=rank)
+
+
+class SQLiteSearchBackend:
+    """
+    FTS5 virtual table keyed by profile id (rowid), used for local
+    development and tests. Ranks with bm25, negated so higher is better.
+    """
+
+    def create_schema(self, cursor):
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+            f'{", ".join(SEARCH_FIELDS)}, tokenize="unicode61")'
+        )
+
+    def drop_schema(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def index(self, cursor, profile_id, values):
+        self.remove(cursor, profile_id)
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, {", ".join(SEARCH_FIELDS)}) VALUES (%s, %s, %s, %s, %s, %s)',
+            [profile_id, *values],
+        )
+
+    def remove(self, cursor, profile_id):
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [profile_id])
+
+    def to_query(self, terms):
+        return ' '.join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+
+    def filter_and_rank(self, queryset, terms):
+        match = self.to_query(terms)
+        table = Profile._meta.db_table
+        matches = RawSQL(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [match])
+        # Column weights mirror the Postgres backend
+        rank = RawSQL(
+            f'SELECT -bm25({SEARCH_TABLE}, 4.0, 4.0, 2.0, 2.0, 1.0) FROM {SEARCH_TABLE}'
+            f' WHERE {SEARCH_TABLE} MATCH %s AND rowid = {table}.id', [match], output_field=FloatField(),
+        )
+        return queryset.filter(Q(id__in=matches)).annotate(search_rank=rank)
+
+
+class ScanSearchBackend:
+    """
+    Any other database: no index to keep, every word matched with
+    ``icontains`` against the searched columns and no ranking. Slow on a
+    large table, but searching and saving profiles keep working.
+    """
+
+    def create_schema(self, cursor):
+        pass
+
+    def drop_schema(self, cursor):
+        pass
+
+    def index(self, cursor, profile_id, values):
+        pass
+
+    def remove(self, cursor, profile_id):
+        pass
+
+    def filter_and_rank(self, queryset, terms):
+        for term in terms:
+            matches = Q()
+            for name in SEARCH_FIELDS:
+                matches |= Q(**{f'{name}__icontains': term})
+            queryset = queryset.filter(matches)
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def get_search_backend(conn=None):
+    vendor = (conn or connection).vendor
+    if vendor == 'postgresql':
+        return PostgresSearchBackend()
+    if vendor == 'sqlite':
+        return SQLiteSearchBackend()
+    return ScanSearchBackend()
+
+
+def index_profile(profile):
+    """Insert or replace ``profile``'s search document."""
+    with connection.cursor() as cursor:
+        get_search_backend().index(cursor, profile.pk, [getattr(profile, name) or '' for name in SEARCH_FIELDS])
+
+
+def remove_profile(profile_id):
+    with connection.cursor() as cursor:
+        get_search_backend().remove(cursor, profile_id)
+
+
+def search_profiles(queryset, query):
+    """
+    Narrow ``queryset`` to profiles matching ``query`` and annotate each
+    with ``search_rank`` (higher is better). Returns None for a query with
+    no searchable words.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return None
+    return get_search_backend().filter_and_rank(queryset, terms)
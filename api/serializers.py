@@ -1,6 +1,69 @@
+from django.db import transaction
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from .models import User, Profile, Photo, CreditTransaction
 from rest_framework.validators import UniqueValidator
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from .authentication import RevocableRefreshToken
+from .credits import grant_registration_credits
+from .images import variant_urls
+from .instrumentation import timed
+from .ranking import DEFAULT_RANKING_WEIGHTS, MAX_RANKING_WEIGHT
+
+# Internal shadow columns used for indexed filtering; never part of the API
+PROFILE_INTERNAL_FIELDS = tuple(Profile.MATCH_KEY_FIELDS.values()) + tuple(
+    target for target, _ in Profile.HOROSCOPE_CODE_FIELDS.values()
+)
+# The owner's own settings; only returned by their profile endpoint
+PROFILE_PRIVATE_FIELDS = ('ranking_weights',)
+
+
+def _split_param(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Lets clients pick the fields they receive on reads:
+
+    - ``?fields=a,b`` returns exactly those fields (plus ``id``)
+    - ``?expand=a,b`` returns ``default_fields`` plus those fields
+    - ``?expand=all`` returns every field
+
+    Writes always see every field. Views use ``get_only_fields`` so that
+    unselected columns are not read from the database at all.
+    """
+    default_fields = None  # None means every field
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = self.select_fields(self.context.get('request'), fields)
+        return {name: field for name, field in fields.items() if name in selected}
+
+    @classmethod
+    def select_fields(cls, request, available):
+        if request is not None and request.method not in SAFE_METHODS:
+            return set(available)
+
+        params = request.query_params if request is not None else {}
+        requested = _split_param(params.get('fields'))
+        if requested:
+            return {name for name in available if name in requested or name == 'id'}
+
+        expand = _split_param(params.get('expand'))
+        if 'all' in expand or cls.default_fields is None:
+            return set(available)
+        return {name for name in available if name in cls.default_fields or name in expand}
+
+    @classmethod
+    def get_selected_fields(cls, request):
+        return set(cls(context={'request': request}).fields)
+
+    @classmethod
+    def get_only_fields(cls, names):
+        """Model columns to load for the selected serializer ``names``."""
+        concrete = {field.name for field in cls.Meta.model._meta.concrete_fields}
+        return sorted(concrete.intersection(names) | {'id'})
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -18,15 +81,16 @@ class RegisterSerializer(serializers.ModelSerializer):
             username=self.validated_data['username'],
             email=self.validated_data['email'],
             phone_number=self.validated_data.get('phone_number'),
-            credits=20  # Grant 20 free credits on registration
         )
         password = self.validated_data['password']
         password2 = self.validated_data['password2']
         if password != password2:
             raise serializers.ValidationError({'password': 'Passwords must match.'})
         user.set_password(password)
-        user.save()
-        Profile.objects.create(user=user)
+        with transaction.atomic():
+            user.save()
+            Profile.objects.create(user=user)
+            grant_registration_credits(user)
         return user
 
 
@@ -37,19 +101,54 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 class PhotoSerializer(serializers.ModelSerializer):
+    variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Photo
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'variants', 'status']
 
+    def get_variants(self, obj):
+        # {thumb|card|full: {webp: url, jpeg: url}}; empty until processed
+        with timed('storage'):
+            return variant_urls(obj.image.storage, obj.variants)
 
-class ProfileSerializer(serializers.ModelSerializer):
+
+class ProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     photos = PhotoSerializer(many=True, read_only=True)
 
     class Meta:
         model = Profile
-        fields = '__all__'
+        exclude = PROFILE_INTERNAL_FIELDS
+
+    def validate_ranking_weights(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError('Expected an object of signal weights.')
+        unknown = sorted(set(value) - set(DEFAULT_RANKING_WEIGHTS))
+        if unknown:
+            raise serializers.ValidationError(f"Unknown signals: {', '.join(unknown)}.")
+        for name, weight in value.items():
+            if isinstance(weight, bool) or not isinstance(weight, (int, float)) or not 0 <= weight <= MAX_RANKING_WEIGHT:
+                raise serializers.ValidationError(f'{name} must be a number from 0 to {MAX_RANKING_WEIGHT}.')
+        return value
 
-class ProfileDetailSerializer(serializers.ModelSerializer):
+
+class ProfileCardSerializer(ProfileSerializer):
+    """
+    Compact card shown in the match feed; the rest of the profile is
+    available through ``?expand=``. ``porutham`` and ``match_score`` are only
+    present when the feed was asked to score by them.
+    """
+    porutham = serializers.IntegerField(read_only=True)
+    match_score = serializers.FloatField(read_only=True)
+    default_fields = [
+        'id', 'full_name', 'date_of_birth', 'height', 'education', 'occupation', 'city', 'photos',
+        'porutham', 'match_score',
+    ]
+
+    class Meta(ProfileSerializer.Meta):
+        exclude = PROFILE_INTERNAL_FIELDS + PROFILE_PRIVATE_FIELDS
+
+class ProfileDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Detailed serializer for individual profile view - ensures only profile-specific photos are included
     """
@@ -57,26 +156,36 @@ class ProfileDetailSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Profile
-        fields = '__all__'
+        exclude = PROFILE_INTERNAL_FIELDS + PROFILE_PRIVATE_FIELDS
 
     def get_photos(self, obj):
-        # Explicitly filter photos for this specific profile
-        profile_photos = Photo.objects.filter(profile=obj)
-        return PhotoSerializer(profile_photos, many=True).data
+        # Uses the prefetched photos for this profile when the view loaded them
+        return PhotoSerializer(obj.photos.all(), many=True).data
         
-class UnlockedProfileSerializer(serializers.ModelSerializer):
+class UnlockedProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for the 'Recently Unlocked Profiles' list on the dashboard.
     Provides a summary of the profile.
     """
     photos = PhotoSerializer(many=True, read_only=True)
+    default_fields = ['id', 'full_name', 'date_of_birth', 'occupation', 'photos']
 
     class Meta:
         model = Profile
-        fields = ['id', 'full_name', 'date_of_birth', 'occupation', 'photos']
+        exclude = PROFILE_INTERNAL_FIELDS + PROFILE_PRIVATE_FIELDS
 
 
 class CreditTransactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = CreditTransaction
-        fields = '__all__' 
\ No newline at end of file
+        fields = '__all__' 
+
+
+class RevocableTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Login, issuing a refresh token that logout can revoke."""
+    token_class = RevocableRefreshToken
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh, refusing refresh tokens revoked at logout."""
+    token_class = RevocableRefreshToken
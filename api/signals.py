@@ -0,0 +1,72 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import bump_generation, invalidate_auth_user
+from .instrumentation import query_wrapper
+from .search import SEARCH_FIELDS, index_profile, remove_profile
+from .models import Photo, Profile, ProfileChange, User
+
+
+def invalidate_profile_feeds(profile):
+    bump_generation(profile.gender_key)
+    loaded_gender_key = getattr(profile, '_loaded_gender_key', None)
+    if loaded_gender_key is not None and loaded_gender_key != profile.gender_key:
+        bump_generation(loaded_gender_key)
+
+
+def log_profile_change(profile, kind):
+    changes = [ProfileChange(profile_id=profile.pk, gender_key=profile.gender_key, kind=kind)]
+    loaded_gender_key = getattr(profile, '_loaded_gender_key', None)
+    if kind == 'upsert' and loaded_gender_key is not None and loaded_gender_key != profile.gender_key:
+        # The profile left the feed of its old gender
+        changes.insert(0, ProfileChange(profile_id=profile.pk, gender_key=loaded_gender_key, kind='delete'))
+    ProfileChange.objects.bulk_create(changes)
+
+
+def profile_changed(profile, kind):
+    log_profile_change(profile, kind)
+    invalidate_profile_feeds(profile)
+    # The owner's cached auth entry holds this profile
+    invalidate_auth_user(profile.user_id)
+    profile._loaded_gender_key = profile.gender_key
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate_auth_user(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+def profile_saved(sender, instance, update_fields=None, **kwargs):
+    profile_changed(instance, 'upsert')
+    if update_fields is None or set(update_fields) & set(SEARCH_FIELDS):
+        index_profile(instance)
+
+
+@receiver(post_delete, sender=Profile)
+def profile_deleted(sender, instance, **kwargs):
+    profile_changed(instance, 'delete')
+    remove_profile(instance.pk)
+
+
+@receiver(post_save, sender=Photo)
+@receiver(post_delete, sender=Photo)
+def photo_changed(sender, instance, **kwargs):
+    # Feed pages, profile ETags and synced copies cover the candidate's photos
+    try:
+        profile = instance.profile
+    except Profile.DoesNotExist:
+        return
+    profile.updated_at = timezone.now()
+    Profile.objects.filter(pk=profile.pk).update(updated_at=profile.updated_at)
+    profile_changed(profile, 'upsert')
+
+
+@receiver(connection_created)
+def time_queries(sender, connection, **kwargs):
+    # Also sent on reconnects; the wrapper list outlives the connection
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
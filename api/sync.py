@@ -0,0 +1,127 @@
+import base64
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ProfileChange
+
+SYNC_BATCH_SIZE = getattr(settings, 'SYNC_BATCH_SIZE', 500)
+# Change log rows older than this are pruned; older tokens need a full refresh
+SYNC_RETENTION = timedelta(days=getattr(settings, 'SYNC_RETENTION_DAYS', 30))
+# Longest a transaction that logs a change may stay open; see read_changes
+SYNC_OVERLAP = timedelta(seconds=getattr(settings, 'SYNC_OVERLAP_SECONDS', 60))
+sync_query_param = 'since'
+
+
+class InvalidSyncToken(ValueError):
+    pass
+
+
+class SyncTokenExpired(InvalidSyncToken):
+    pass
+
+
+def encode_token(change_id, issued_at):
+    raw = json.dumps([change_id, issued_at.isoformat()], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_token(token):
+    """Return ``(change_id, issued_at)`` for a token issued by ``encode_token``."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        change_id, issued_at = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        issued_at = parse_datetime(issued_at)
+    except (ValueError, TypeError):
+        raise InvalidSyncToken('Invalid sync token.')
+    if not isinstance(change_id, int) or issued_at is None:
+        raise InvalidSyncToken('Invalid sync token.')
+    if issued_at < timezone.now() - SYNC_RETENTION:
+        raise SyncTokenExpired('Sync token expired; fetch the full list again.')
+    return change_id, issued_at
+
+
+def is_sync_request(request):
+    return sync_query_param in request.query_params
+
+
+def stable_before(now):
+    """Changes logged before this time are committed, or never will be."""
+    return now - SYNC_OVERLAP
+
+
+def read_changes(since_id, scope, now):
+    """
+    Return ``(profile_ids, watermark, has_more)`` for the next batch of the
+    change log after ``since_id``, limited to the rows matching ``scope``.
+
+    Ids are handed out at insert but transactions commit in any order, so
+    a change with a lower id than one already served can still appear. The
+    watermark therefore only moves past changes older than ``SYNC_OVERLAP``;
+    newer ones are served again on the next sync, together with any that
+    committed late below them, and clients apply them idempotently.
+    """
+    rows = list(
+        ProfileChange.objects.filter(scope, id__gt=since_id).order_by('id')
+        .values_list('id', 'profile_id', 'changed_at')[:SYNC_BATCH_SIZE + 1]
+    )
+    has_more = len(rows) > SYNC_BATCH_SIZE
+    rows = rows[:SYNC_BATCH_SIZE]
+    cutoff = stable_before(now)
+    watermark = since_id
+    for change_id, _, changed_at in rows:
+        if changed_at >= cutoff:
+            break
+        watermark = change_id
+    # A full batch of recent changes: the rest follow once they settle,
+    # rather than the client fetching the same batch in a loop
+    has_more = has_more and watermark > since_id
+    return list(dict.fromkeys(profile_id for _, profile_id, _ in rows)), watermark, has_more
+
+
+def get_sync_data(request, queryset, scope, serialize, extra_queryset=None):
+    """
+    Build a delta response for a profile listing.
+
+    ``queryset`` is the listing with all of its usual filters applied and
+    ``scope`` a ``Q`` over ``ProfileChange`` that narrows the change log to
+    profiles that can appear in it (served by its indexes). Changed
+    profiles that still belong in it are returned in ``changed``; changed
+    ones that no longer do (deleted, or filtered out after an edit) are
+    returned as ``deleted`` tombstones. ``extra_queryset``, when given, is
+    called with a time shortly before the token was issued and adds rows
+    that entered the listing since then without a profile change (e.g. a
+    new unlock).
+
+    An empty ``?since=`` starts a sync: it only returns the current token,
+    which the client should take before its full fetch. The same profile
+    may come back in several responses (see ``read_changes``).
+    """
+    started_at = timezone.now()
+    token = request.query_params.get(sync_query_param)
+    if not token:
+        last_id = (
+            ProfileChange.objects.filter(changed_at__lt=stable_before(started_at))
+            .order_by('-id').values_list('id', flat=True).first() or 0
+        )
+        return {'sync_token': encode_token(last_id, started_at), 'changed': [], 'deleted': [], 'has_more': False}
+
+    since_id, issued_at = decode_token(token)
+    profile_ids, last_id, has_more = read_changes(since_id, scope, started_at)
+
+    changed = list(queryset.filter(pk__in=profile_ids)) if profile_ids else []
+    if extra_queryset is not None:
+        seen = {profile.pk for profile in changed}
+        # Late commits again: back from the token's issue time by the overlap
+        changed += [profile for profile in extra_queryset(stable_before(issued_at)) if profile.pk not in seen]
+
+    found = {profile.pk for profile in changed}
+    return {
+        'sync_token': encode_token(last_id, started_at),
+        'changed': serialize(changed),
+        'deleted': [pk for pk in profile_ids if pk not in found],
+        'has_more': has_more,
+    }
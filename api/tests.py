@@ -1,3 +1,706 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.loader import MigrationLoader
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import async_views, credits, ranking
+from .cache import bump_generation, feed_cache_key, get_feed_cache
+from .credits import InsufficientCredits, grant_registration_credits, post_entries, purchase_credits, unlock_profiles
+from .direct_uploads import UPLOAD_ID_SALT
+from .images import store_variants, variant_names
+from .jobs import PHOTO_JOB_MAX_ATTEMPTS, enqueue_photos, get_spool_storage, run_job
+from .metrics import Registry, registry
+from .models import User, Profile, Photo, PhotoJob, ProfileChange, CreditEntry, CreditSnapshot, CreditTransaction
+from .porutham import nakshatra_code, nakshatra_porutham, porutham_score, raasi_code, raasi_porutham
+from .ranking import DEFAULT_RANKING_WEIGHTS
+from .search import ScanSearchBackend, get_search_backend, search_terms
+from .serializers import RegisterSerializer
+
+
+def make_user(username, profile=None, **kwargs):
+    user = User.objects.create_user(username=username, email=f'{username}@example.com', password='pw', **kwargs)
+    Profile.objects.create(user=user, **(profile or {}))
+    return user
+
+
+# Whatever the tests count stays out of the metrics the server reports
+metrics_settings = override_settings(METRICS_DIR=tempfile.mkdtemp())
+
+
+def setUpModule():
+    metrics_settings.enable()
+
+
+def tearDownModule():
+    metrics_settings.disable()
+
+
+
+class TokenTests(TestCase):
+    def test_tokens_carry_no_profile_data_and_logout_revokes_them(self):
+        make_user('owner', profile={'gender': 'Female', 'date_of_birth': date(1995, 1, 1)})
+        client = APIClient()
+        tokens = client.post(reverse('login'), {'username': 'owner', 'password': 'pw'}, format='json').data
+
+        refreshed = client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(refreshed.status_code, 200)
+        for access in (tokens['access'], refreshed.data['access']):
+            self.assertFalse({'profile_id', 'gender', 'dob'} & set(AccessToken(access).payload))
+
+        client.post(reverse('logout'), {'refresh_token': tokens['refresh']}, format='json')
+        self.assertEqual(
+            client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}, format='json').status_code, 401,
+        )
+
+@override_settings(PHOTO_SPOOL_ROOT=tempfile.mkdtemp())
+class PhotoJobTests(TestCase):
+    def test_exhausted_job_discards_upload_and_photo(self):
+        profile = make_user('owner').profile
+        [photo] = enqueue_photos(profile, [ContentFile(b'not an image', name='broken.jpg')])
+        job = PhotoJob.objects.get(photo=photo)
+        job.attempts = PHOTO_JOB_MAX_ATTEMPTS - 1
+
+        self.assertFalse(run_job(job))
+
+        self.assertFalse(Photo.objects.filter(pk=photo.pk).exists())
+        self.assertFalse(PhotoJob.objects.filter(pk=job.pk).exists())
+        self.assertFalse(get_spool_storage().exists(job.source_name))
+
+    def test_failed_job_is_retried_before_its_last_attempt(self):
+        profile = make_user('owner').profile
+        [photo] = enqueue_photos(profile, [ContentFile(b'not an image', name='broken.jpg')])
+        job = PhotoJob.objects.get(photo=photo)
+
+        self.assertFalse(run_job(job))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertTrue(get_spool_storage().exists(job.source_name))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class GeneratePhotoVariantsTests(TransactionTestCase):
+    """Photos are rendered on a thread pool, whose connections only see committed rows."""
+
+    def setUp(self):
+        self.profile = make_user('owner').profile
+
+    def upload(self):
+        buffer = BytesIO()
+        Image.new('RGB', (40, 30), (200, 30, 30)).save(buffer, 'JPEG')
+        return default_storage.save('profile_photos/original.jpg', ContentFile(buffer.getvalue()))
+
+    def generate(self, **options):
+        call_command('generate_photo_variants', stdout=StringIO(), stderr=StringIO(), **options)
+
+    def test_rendered_photos_are_not_rendered_again(self):
+        photo = Photo.objects.create(profile=self.profile, image=self.upload())
+        self.generate()
+        photo.refresh_from_db()
+        variants = photo.variants
+
+        self.generate(force=True)
+
+        photo.refresh_from_db()
+        self.assertEqual(photo.variants, variants)
+        self.assertEqual(photo.image.name, variants['full']['jpeg'])
+
+    def test_forced_render_replaces_the_old_variants(self):
+        stale = store_variants(default_storage, {'full': {'jpeg': b'old'}, 'thumb': {'jpeg': b'old'}})
+        photo = Photo.objects.create(profile=self.profile, image=self.upload(), variants=stale)
+
+        self.generate(force=True)
+
+        photo.refresh_from_db()
+        self.assertEqual(set(photo.variants), {'thumb', 'card', 'full'})
+        for name in variant_names(stale):
+            self.assertFalse(default_storage.exists(name))
+        for name in variant_names(photo.variants):
+            self.assertTrue(default_storage.exists(name))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PhotoUploadConfirmTests(TestCase):
+    def setUp(self):
+        self.user = make_user('owner')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self):
+        response = self.client.post(reverse('photo-upload-targets'), {'count': 1}, format='json')
+        [target] = response.data['uploads']
+        name = signing.loads(target['upload_id'], salt=UPLOAD_ID_SALT)['name']
+        default_storage.save(name, ContentFile(b'raw upload'))
+        return target['upload_id']
+
+    def test_upload_is_confirmed_once(self):
+        upload_id = self.upload()
+        url = reverse('photo-upload-confirm')
+
+        first = self.client.post(url, {'upload_ids': [upload_id]}, format='json')
+        second = self.client.post(url, {'upload_ids': [upload_id]}, format='json')
+
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(second.status_code, 400)
+        self.assertEqual(Photo.objects.filter(profile=self.user.profile).count(), 1)
+        self.assertEqual(PhotoJob.objects.count(), 1)
+
+    def test_upload_is_not_confirmed_again_once_processed(self):
+        upload_id = self.upload()
+        url = reverse('photo-upload-confirm')
+        self.client.post(url, {'upload_ids': [upload_id]}, format='json')
+        # Processed, with the raw upload still in storage
+        PhotoJob.objects.all().delete()
+
+        response = self.client.post(url, {'upload_ids': [upload_id]}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Photo.objects.filter(profile=self.user.profile).count(), 1)
+
+    def test_upload_ids_must_be_strings(self):
+        url = reverse('photo-upload-confirm')
+        for upload_ids in ([1], [''], [None], [['id']], [{'id': 1}]):
+            response = self.client.post(url, {'upload_ids': upload_ids}, format='json')
+            self.assertEqual(response.status_code, 400, upload_ids)
+
+
+class FeedTestCase(TestCase):
+    def setUp(self):
+        self.viewer = make_user('viewer', profile={'gender': 'Male', 'date_of_birth': date(1990, 1, 1)})
+        self.candidates = [
+            make_user(f'bride{i}', profile={'gender': 'Female', 'date_of_birth': date(1995, 1, i + 1)}).profile
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+
+class FeedGenerationTests(TestCase):
+    def test_every_bump_orphans_the_cached_pages(self):
+        keys = [feed_cache_key('female', page=1)]
+        for _ in range(3):
+            # Written outright, so concurrent bumps can't collapse into one
+            with mock.patch.object(type(get_feed_cache()), 'incr', side_effect=AssertionError):
+                bump_generation('female')
+            keys.append(feed_cache_key('female', page=1))
+
+        self.assertEqual(len(set(keys)), len(keys))
+        self.assertEqual(feed_cache_key('female', page=1), keys[-1])
+
+
+class FeedValidatorTests(FeedTestCase):
+
+    def test_page_is_validated_by_etag_only(self):
+        response = self.client.get(reverse('profile-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+
+        self.assertEqual(self.client.get(reverse('profile-list'), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_page_membership_change_is_not_a_304(self):
+        response = self.client.get(reverse('profile-list'))
+        # Leaves the newest change on the page untouched
+        self.candidates[0].delete()
+
+        again = self.client.get(reverse('profile-list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(len(again.data['results']), len(response.data['results']) - 1)
+
+
+class FeedPagingTests(FeedTestCase):
+    def test_pages_have_no_duplicates_or_gaps_across_tied_birth_dates(self):
+        twins = [
+            make_user(f'twin{i}', profile={'gender': 'Female', 'date_of_birth': date(1995, 1, 2)}).profile
+            for i in range(4)
+        ]
+        ids, cursor = [], None
+        while True:
+            params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+            response = self.client.get(reverse('profile-list'), params)
+            self.assertEqual(response.status_code, 200)
+            ids += [profile['id'] for profile in response.data['results']]
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+
+        # Closest age first, ties in id order
+        bride0, bride1, bride2 = self.candidates
+        self.assertEqual(ids, [bride0.pk, bride1.pk, *[twin.pk for twin in twins], bride2.pk])
+
+    def test_bad_cursor_is_a_400(self):
+        for cursor in ('not-a-cursor', 'WzFd', 'WyJ4IiwieSJd'):
+            response = self.client.get(reverse('profile-list'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+
+
+class SparseFieldsTests(FeedTestCase):
+    def feed_query(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('profile-list'), params)
+        self.assertEqual(response.status_code, 200)
+        [sql] = [query['sql'] for query in queries if 'FROM "api_profile"' in query['sql'] and 'LIMIT' in query['sql']]
+        return response.data['results'], sql
+
+    def test_fields_limit_the_keys_and_the_columns_read(self):
+        results, sql = self.feed_query({'fields': 'full_name,city'})
+
+        self.assertEqual({frozenset(profile) for profile in results}, {frozenset({'id', 'full_name', 'city'})})
+        self.assertIn('"api_profile"."city"', sql)
+        self.assertNotIn('"api_profile"."occupation"', sql)
+        self.assertNotIn('"api_profile"."about"', sql)
+
+    def test_cards_are_expanded_on_request(self):
+        results, sql = self.feed_query({})
+        self.assertNotIn('about', results[0])
+        self.assertNotIn('"api_profile"."about"', sql)
+
+        results, sql = self.feed_query({'expand': 'about'})
+        self.assertIn('about', results[0])
+        self.assertIn('"api_profile"."about"', sql)
+
+
+class PoruthamTests(FeedTestCase):
+    def test_known_pairs(self):
+        ashwini, rohini = nakshatra_code('Aswini'), nakshatra_code('Rohini')
+        mesham, rishabam = raasi_code('Aries'), raasi_code('Rishabham')
+        self.assertEqual((ashwini, rohini, mesham, rishabam), (0, 3, 0, 1))
+        self.assertEqual((nakshatra_code('Thiruvathirai'), raasi_code('Simha'), nakshatra_code('Pluto')), (5, 4, None))
+
+        # Same star and raasi: gana, yoni and vedha; raasi and its lord
+        self.assertEqual(porutham_score(ashwini, mesham, ashwini, mesham), 5)
+        # Rohini bride, Ashwini groom: all but dina; all but vasya
+        self.assertEqual(nakshatra_porutham(rohini, ashwini), 6)
+        self.assertEqual(raasi_porutham(rishabam, mesham), 2)
+        self.assertEqual(porutham_score(rohini, rishabam, ashwini, mesham), 8)
+
+    def feed(self, **params):
+        return self.client.get(reverse('profile-list'), {'fields': 'porutham', **params})
+
+    def test_feed_is_scored_and_filtered_by_porutham(self):
+        self.viewer.profile.nakshatram, self.viewer.profile.raasi = 'Ashwini', 'Mesham'
+        self.viewer.profile.save()
+        same, best, unknown = self.candidates
+        same.nakshatram, same.raasi = 'Ashwini', 'Mesham'
+        best.nakshatram, best.raasi = 'Rohini', 'Rishabam'
+        for profile in (same, best):
+            profile.save()
+
+        results = self.feed(order='compatibility').data['results']
+        self.assertEqual([(profile['id'], profile['porutham']) for profile in results], [(best.pk, 8), (same.pk, 5)])
+        results = self.feed(min_porutham=6).data['results']
+        self.assertEqual([profile['id'] for profile in results], [best.pk])
+
+    def test_min_porutham_is_validated(self):
+        for value in ('11', '-1', 'ten'):
+            self.assertEqual(self.feed(min_porutham=value).status_code, 400, value)
+        # Valid, but the viewer has no horoscope to score against
+        self.assertEqual(self.feed(min_porutham=5).status_code, 400)
+
+
+class RecommendedFeedTests(FeedTestCase):
+    def setUp(self):
+        super().setUp()
+        # Rank by location alone: same city, then same state, then the rest
+        self.viewer.profile.ranking_weights = {name: 0 for name in DEFAULT_RANKING_WEIGHTS} | {'location': 10}
+        self.viewer.profile.city, self.viewer.profile.state = 'Madurai', 'Tamil Nadu'
+        self.viewer.profile.save()
+        places = [('Chennai', 'Tamil Nadu'), ('Madurai', 'Tamil Nadu'), ('Pune', 'Maharashtra')]
+        for profile, (city, state) in zip(self.candidates, places):
+            profile.city, profile.state = city, state
+            profile.save()
+
+    def pages(self, limit):
+        ids, cursor = [], ''
+        while True:
+            params = {'order': 'recommended', 'limit': limit, 'cursor': cursor}
+            response = self.client.get(reverse('profile-list'), params)
+            self.assertEqual(response.status_code, 200)
+            ids += [profile['id'] for profile in response.data['results']]
+            cursor = response.data['next_cursor']
+            if not cursor:
+                return ids
+
+    def test_candidates_are_ranked_by_the_viewers_weights(self):
+        chennai, madurai, pune = self.candidates
+        self.assertEqual(self.pages(limit=10), [madurai.pk, chennai.pk, pune.pk])
+
+    def test_pages_slice_one_ranking(self):
+        with mock.patch.object(ranking, 'rank_candidates', wraps=ranking.rank_candidates) as rank:
+            ids = self.pages(limit=1)
+        self.assertEqual(ids, [self.candidates[1].pk, self.candidates[0].pk, self.candidates[2].pk])
+        self.assertEqual(rank.call_count, 1)
+
+    def test_pages_past_the_cached_ranking_are_scored_again(self):
+        with mock.patch.object(ranking, 'RANKING_CACHE_SIZE', 2):
+            ids = self.pages(limit=1)
+        self.assertEqual(ids, [self.candidates[1].pk, self.candidates[0].pk, self.candidates[2].pk])
+
+
+class ProfileDetailTests(FeedTestCase):
+    def detail(self, pk):
+        return self.client.get(reverse('profile-detail', args=[pk])).status_code
+
+    def test_ids_without_an_unlock_are_all_forbidden(self):
+        User.objects.filter(pk=self.viewer.pk).update(credits=5)
+        unlocked, deleted, locked = self.candidates
+        unlock_profiles(self.viewer, [unlocked.pk, deleted.pk])
+        deleted_id = deleted.pk
+        deleted.delete()
+
+        self.assertEqual(self.detail(unlocked.pk), 200)
+        self.assertEqual(self.detail(locked.pk), 403)
+        self.assertEqual(self.detail(locked.pk + 1000), 403)
+        # Unlocked before it was deleted
+        self.assertEqual(self.detail(deleted_id), 404)
+
+
+class AsyncViewTests(FeedTestCase):
+    """The async views (served over ASGI) answer exactly like the sync ones."""
+
+    def setUp(self):
+        super().setUp()
+        User.objects.filter(pk=self.viewer.pk).update(credits=5)
+        unlock_profiles(self.viewer, [self.candidates[0].pk])
+        # The async views authenticate the token themselves
+        self.authorization = f'Bearer {AccessToken.for_user(self.viewer)}'
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=self.authorization)
+
+    def assert_same_answer(self, view, url, params=None, **kwargs):
+        # A fresh generation each time, so neither answer comes from the other's cached page
+        bump_generation('female')
+        expected = self.client.get(url, params)
+        bump_generation('female')
+        request = RequestFactory().get(url, params, HTTP_AUTHORIZATION=self.authorization)
+        response = async_to_sync(view.as_view())(request, **kwargs)
+
+        self.assertEqual(response.status_code, expected.status_code, url)
+        self.assertEqual(json.loads(response.content), json.loads(expected.content), url)
+        return response
+
+    def test_feed(self):
+        url = reverse('profile-list')
+        response = self.assert_same_answer(async_views.ProfileFeedView, url, {'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        next_cursor = json.loads(response.content)['next_cursor']
+        self.assert_same_answer(async_views.ProfileFeedView, url, {'cursor': next_cursor})
+        self.assert_same_answer(async_views.ProfileFeedView, url, {'fields': 'city', 'expand': 'about'})
+        self.assert_same_answer(async_views.ProfileFeedView, url, {'cursor': 'WzFd'})
+
+    def test_profile_detail(self):
+        missing = self.candidates[-1].pk + 1000
+        for pk in (self.candidates[0].pk, self.candidates[1].pk, missing):
+            url = reverse('profile-detail', args=[pk])
+            self.assert_same_answer(async_views.ProfileDetailView, url, pk=pk)
+
+    def test_unlocked_profiles_and_user_detail(self):
+        self.assert_same_answer(async_views.UnlockedProfileListView, reverse('unlocked-profiles-list'))
+        url = reverse('user-detail', args=[self.viewer.pk])
+        self.assert_same_answer(async_views.UserDetailView, url, pk=self.viewer.pk)
+
+
+class FeedSyncTests(FeedTestCase):
+    def sync(self, token):
+        response = self.client.get(reverse('profile-list'), {'since': token})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_change_committed_after_a_later_one_is_not_skipped(self):
+        # Everything so far is long settled
+        ProfileChange.objects.update(changed_at=timezone.now() - timedelta(hours=1))
+        token = self.sync('')['sync_token']
+        last_id = ProfileChange.objects.order_by('-id').values_list('id', flat=True).first()
+        early, late = self.candidates[:2]
+
+        # Two transactions take ids in one order and commit in the other
+        ProfileChange.objects.create(id=last_id + 2, profile_id=late.pk, gender_key='female', kind='upsert')
+        first = self.sync(token)
+        ProfileChange.objects.create(id=last_id + 1, profile_id=early.pk, gender_key='female', kind='upsert')
+        second = self.sync(first['sync_token'])
+
+        self.assertEqual([profile['id'] for profile in first['changed']], [late.pk])
+        self.assertIn(early.pk, [profile['id'] for profile in second['changed']])
+
+    def test_settled_changes_are_not_served_again(self):
+        token = self.sync('')['sync_token']
+        self.candidates[0].save()
+        ProfileChange.objects.update(changed_at=timezone.now() - timedelta(hours=1))
+
+        first = self.sync(token)
+        second = self.sync(first['sync_token'])
+
+        self.assertIn(self.candidates[0].pk, [profile['id'] for profile in first['changed']])
+        self.assertEqual(second['changed'], [])
+
+
+class UnlockedSyncTests(TestCase):
+    def sync(self, user, token):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get(reverse('unlocked-profiles-list'), {'since': token})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_deletion_reaches_only_users_who_unlocked_the_profile(self):
+        unlocked, other = [
+            make_user(f'bride{i}', profile={'gender': 'Female', 'date_of_birth': date(1995, 1, 1)}).profile
+            for i in range(2)
+        ]
+        viewer = make_user('viewer', credits=5)
+        unlock_profiles(viewer, [unlocked.pk])
+        token = self.sync(viewer, '')['sync_token']
+        unlocked_id = unlocked.pk
+
+        unlocked.delete()
+        other.delete()
+        ProfileChange.objects.update(changed_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(self.sync(viewer, token)['deleted'], [unlocked_id])
+        stranger = make_user('stranger')
+        self.assertEqual(self.sync(stranger, token)['deleted'], [])
+
+
+class UnlockTests(TestCase):
+    def setUp(self):
+        self.viewer = make_user('viewer', credits=5)
+        self.brides = [
+            make_user(f'bride{i}', profile={'gender': 'Female', 'date_of_birth': date(1995, 1, 1)}).profile
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def unlock(self, pk):
+        return self.client.post(reverse('profile-unlock', args=[pk]))
+
+    def unlock_batch(self, profile_ids):
+        return self.client.post(reverse('profile-unlock-batch'), {'profile_ids': profile_ids}, format='json')
+
+    def assert_balance(self, credits, unlocks):
+        self.viewer.refresh_from_db()
+        self.assertEqual(self.viewer.credits, credits)
+        self.assertEqual(CreditTransaction.objects.filter(user=self.viewer, action='unlock').count(), unlocks)
+        self.assertEqual(CreditEntry.objects.filter(user=self.viewer, kind='unlock').count(), unlocks)
+
+    def test_unlock_without_credits_is_refused(self):
+        User.objects.filter(pk=self.viewer.pk).update(credits=0)
+
+        self.assertEqual(self.unlock(self.brides[0].pk).status_code, 400)
+        self.assert_balance(0, 0)
+
+    def test_batch_beyond_the_balance_debits_nothing(self):
+        User.objects.filter(pk=self.viewer.pk).update(credits=2)
+
+        response = self.unlock_batch([bride.pk for bride in self.brides])
+
+        self.assertEqual(response.status_code, 400)
+        self.assert_balance(2, 0)
+
+    def test_profile_is_charged_for_once(self):
+        first = self.unlock(self.brides[0].pk)
+        second = self.unlock(self.brides[0].pk)
+
+        self.assertEqual((first.status_code, first.data['remaining_credits']), (200, 4))
+        self.assertEqual(second.status_code, 400)
+        self.assert_balance(4, 1)
+
+    def test_batch_sorts_new_already_unlocked_and_missing_ids(self):
+        unlocked, new = self.brides[:2]
+        self.unlock(unlocked.pk)
+        missing = new.pk + 1000
+
+        response = self.unlock_batch([unlocked.pk, new.pk, missing, new.pk])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {key: response.data[key] for key in ('unlocked', 'already_unlocked', 'not_found', 'remaining_credits')},
+            {'unlocked': [new.pk], 'already_unlocked': [unlocked.pk], 'not_found': [missing], 'remaining_credits': 3},
+        )
+        self.assert_balance(3, 2)
+
+
+class UnlockedListTests(TestCase):
+    def test_pages_list_each_unlock_once_newest_first(self):
+        viewer = make_user('viewer', credits=5)
+        brides = [make_user(f'bride{i}').profile for i in range(4)]
+        unlock_profiles(viewer, [bride.pk for bride in brides])
+        unlock_profiles(make_user('other', credits=5), [brides[0].pk])
+        # The first two were unlocked together
+        now = timezone.now()
+        for bride, minutes in zip(brides, (10, 10, 5, 20)):
+            CreditTransaction.objects.filter(user=viewer, profile_unlocked=bride).update(
+                transaction_date=now - timedelta(minutes=minutes),
+            )
+        client = APIClient()
+        client.force_authenticate(viewer)
+
+        ids, cursor = [], None
+        while True:
+            params = {'limit': 1, **({'cursor': cursor} if cursor else {})}
+            response = client.get(reverse('unlocked-profiles-list'), params)
+            self.assertEqual(response.status_code, 200)
+            ids += [profile['id'] for profile in response.data['results']]
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(ids, [brides[2].pk, brides[1].pk, brides[0].pk, brides[3].pk])
+        self.assertEqual(client.get(reverse('unlocked-profiles-list'), {'cursor': 'WzFd'}).status_code, 400)
+
+
+class DuplicateUnlockMigrationTests(TransactionTestCase):
+    """0006 keeps one unlock per profile and refunds the rest."""
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('api', target)])
+        return executor.loader.project_state([('api', target)]).apps
+
+    def tearDown(self):
+        self.migrate(MigrationLoader(connection).graph.leaf_nodes('api')[0][1])
+
+    def test_duplicates_are_removed_and_refunded(self):
+        apps = self.migrate('0005_photojob_source')
+        User = apps.get_model('api', 'User')
+        Profile = apps.get_model('api', 'Profile')
+        CreditTransaction = apps.get_model('api', 'CreditTransaction')
+        viewer = User.objects.create(username='viewer', email='viewer@example.com', credits=2)
+        bride_user = User.objects.create(username='bride', email='bride@example.com')
+        bride = Profile.objects.create(user=bride_user)
+        for _ in range(3):
+            CreditTransaction.objects.create(user=viewer, profile_unlocked=bride, action='unlock', credits_spent=1)
+
+        apps = self.migrate('0006_unique_profile_unlock')
+
+        self.assertEqual(apps.get_model('api', 'User').objects.get(pk=viewer.pk).credits, 4)
+        self.assertEqual(apps.get_model('api', 'CreditTransaction').objects.filter(user_id=viewer.pk).count(), 1)
+
+
+class ScanSearchTests(TestCase):
+    def test_unsupported_database_falls_back_to_scanning(self):
+        backend = get_search_backend(SimpleNamespace(vendor='mysql'))
+        self.assertIsInstance(backend, ScanSearchBackend)
+        backend.index(None, 1, ['x'] * 5)
+
+        doctor = make_user('doctor', profile={'occupation': 'Doctor', 'city': 'Chennai'}).profile
+        make_user('teacher', profile={'occupation': 'Teacher', 'city': 'Chennai'})
+
+        found = backend.filter_and_rank(Profile.objects.all(), search_terms('chennai doc'))
+        self.assertEqual([profile.pk for profile in found], [doctor.pk])
+
+
+
+class MetricsRegistryTests(TestCase):
+    def write_snapshot(self, directory, name, requests):
+        with open(os.path.join(directory, name), 'w') as f:
+            json.dump({'requests_total': {'samples': [[[], requests]]}}, f)
+
+    def test_exited_workers_are_archived_and_keep_their_counts(self):
+        directory = tempfile.mkdtemp()
+        registry = Registry(directory)
+        registry.counter('requests_total', 'Requests.').inc(1)
+        # Two workers that were given the same pid, one after the other
+        self.write_snapshot(directory, '4242-1.json', 3)
+        self.write_snapshot(directory, '4242-2.json', 4)
+        self.write_snapshot(directory, '4343-1.json', 5)
+        self.assertEqual(registry.collect()['requests_total'][()], 13)
+
+        registry.mark_process_dead(4242)
+
+        self.assertEqual(sorted(os.listdir(directory)), ['4343-1.json', 'archive.json'])
+        self.assertEqual(registry.collect()['requests_total'][()], 13)
+        registry.mark_process_dead(4343)
+        self.assertEqual(registry.collect()['requests_total'][()], 13)
+
+        registry.clear()
+        self.assertEqual(os.listdir(directory), [])
+
+    def test_tests_write_snapshots_to_a_temporary_directory(self):
+        registry.flush(force=True)
+
+        self.assertNotEqual(registry.directory, os.path.join(settings.BASE_DIR, '.metrics'))
+        self.assertTrue(os.path.exists(registry.path()))
+
+
+class CreditLedgerTests(TestCase):
+    def setUp(self):
+        self.user = make_user('owner')
+        grant_registration_credits(self.user)
+
+    def balance(self):
+        return User.objects.values_list('credits', flat=True).get(pk=self.user.pk)
+
+    def test_spending_more_than_the_balance_changes_nothing(self):
+        overdraft = CreditEntry(user=self.user, kind='unlock', amount=-credits.REGISTRATION_GRANT - 1)
+        # Run in its own transaction, as its callers do
+        with self.assertRaises(InsufficientCredits), transaction.atomic():
+            post_entries(self.user.pk, [overdraft])
+
+        self.assertEqual(self.balance(), credits.REGISTRATION_GRANT)
+        self.assertEqual(CreditEntry.objects.filter(user=self.user).count(), 1)
+
+    def test_failed_registration_grant_creates_no_user(self):
+        serializer = RegisterSerializer(data={
+            'username': 'newcomer', 'email': 'newcomer@example.com', 'password': 'pw', 'password2': 'pw',
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+        # Fails after the balance moved and the grant entry was inserted
+        with mock.patch.object(credits, '_snapshot_if_due', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                serializer.save()
+
+        self.assertFalse(User.objects.filter(username='newcomer').exists())
+        self.assertEqual(CreditEntry.objects.count(), 1)
+
+    def test_payment_is_credited_once(self):
+        self.assertTrue(purchase_credits(self.user, 50, 'pay_1'))
+        self.assertFalse(purchase_credits(self.user, 50, 'pay_1'))
+
+        self.assertEqual(self.user.credits, credits.REGISTRATION_GRANT + 50)
+        self.assertEqual(self.balance(), credits.REGISTRATION_GRANT + 50)
+        self.assertEqual(CreditEntry.objects.filter(kind='purchase').count(), 1)
+
+    def test_deleting_an_unlocked_profile_leaves_its_entry_alone(self):
+        profile = make_user('bride').profile
+        profile_id = profile.pk
+        unlock_profiles(self.user, [profile_id])
+
+        profile.delete()
+
+        self.assertEqual(CreditEntry.objects.get(kind='unlock').profile_id, profile_id)
+
+    def test_reconcile_credits_finds_and_fixes_a_drifted_balance(self):
+        User.objects.filter(pk=self.user.pk).update(credits=7)
+
+        with self.assertRaises(CommandError):
+            call_command('reconcile_credits', stdout=StringIO())
+        call_command('reconcile_credits', fix=True, stdout=StringIO())
+
+        self.assertEqual(self.balance(), credits.REGISTRATION_GRANT)
+        self.assertEqual(
+            list(CreditSnapshot.objects.filter(user=self.user).values_list('balance', flat=True)),
+            [credits.REGISTRATION_GRANT],
+        )
+        call_command('reconcile_credits', stdout=StringIO())
@@ -1,11 +1,26 @@
+from django.conf import settings
 from django.urls import path
+from . import async_views
 from .views import (
     RegisterView, LoginView, LogoutView, ProfileViewSet, PhotoUploadView,
     UnlockedProfileListView, ProfileDetailView, UnlockProfileView, UserDetailView,
-    DebugEnvironmentView
+    DebugEnvironmentView, PhotoUploadTargetView, PhotoUploadConfirmView, LocalUploadView,
+    BatchUnlockProfileView
 )
 from rest_framework_simplejwt.views import TokenRefreshView
 
+# Served over ASGI, the read-heavy endpoints use the async views
+if settings.ASYNC_READ_VIEWS:
+    feed_view = async_views.ProfileFeedView.as_view()
+    profile_detail_view = async_views.ProfileDetailView.as_view()
+    unlocked_profiles_view = async_views.UnlockedProfileListView.as_view()
+    user_detail_view = async_views.UserDetailView.as_view()
+else:
+    feed_view = ProfileViewSet.as_view({'get': 'list'})
+    profile_detail_view = ProfileDetailView.as_view()
+    unlocked_profiles_view = UnlockedProfileListView.as_view()
+    user_detail_view = UserDetailView.as_view()
+
 urlpatterns = [
     path('auth/register/', RegisterView.as_view(), name='register'),
     path('auth/login/', LoginView.as_view(), name='login'),
@@ -13,16 +28,23 @@ urlpatterns = [
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     
     # Profile URLs
-    path('profiles/', ProfileViewSet.as_view({'get': 'list'}), name='profile-list'),
-    path('profiles/<int:pk>/', ProfileDetailView.as_view(), name='profile-detail'),
+    path('profiles/', feed_view, name='profile-list'),
+    path('profiles/search/', ProfileViewSet.as_view({'get': 'search'}), name='profile-search'),
+    path('profiles/<int:pk>/', profile_detail_view, name='profile-detail'),
     path('profiles/<int:pk>/unlock/', UnlockProfileView.as_view(), name='profile-unlock'),
+    path('profiles/unlock/', BatchUnlockProfileView.as_view(), name='profile-unlock-batch'),
     
     # Current User specific URLs
     path('me/profile/', ProfileViewSet.as_view({'get': 'retrieve', 'put': 'update'}), name='profile-me'),
     path('me/profile/upload-photos/', PhotoUploadView.as_view(), name='photo-upload'),
-    path('me/unlocked-profiles/', UnlockedProfileListView.as_view(), name='unlocked-profiles-list'),
-    path('users/<uuid:pk>/', UserDetailView.as_view(), name='user-detail'),
+    path('me/profile/photo-uploads/', PhotoUploadTargetView.as_view(), name='photo-upload-targets'),
+    path('me/profile/photo-uploads/confirm/', PhotoUploadConfirmView.as_view(), name='photo-upload-confirm'),
+    path('me/unlocked-profiles/', unlocked_profiles_view, name='unlocked-profiles-list'),
+    path('users/<uuid:pk>/', user_detail_view, name='user-detail'),
     
+    # Local stand-in for presigned storage uploads
+    path('uploads/local/', LocalUploadView.as_view(), name='direct-upload-local'),
+
     # Debug endpoint
     path('debug/environment/', DebugEnvironmentView.as_view(), name='debug-environment'),
 ] 
\ No newline at end of file
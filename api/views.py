@@ -1,19 +1,96 @@
 import logging
+from django.db import IntegrityError
+from django.db.models import Exists, F, OuterRef, Q, prefetch_related_objects
 from django.shortcuts import render
 from rest_framework import viewsets, status
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework_simplejwt.tokens import RefreshToken
-from .models import User, Profile, Photo, CreditTransaction
-from .serializers import RegisterSerializer, UserSerializer, ProfileSerializer, ProfileDetailSerializer, UnlockedProfileSerializer
+from .authentication import RevocableRefreshToken
+from .models import User, Profile, Photo, CreditTransaction, normalize_match_value
+from .serializers import (
+    RegisterSerializer, UserSerializer, ProfileSerializer, ProfileCardSerializer, ProfileDetailSerializer,
+    UnlockedProfileSerializer,
+)
+from .pagination import KeysetPagination, InvalidCursor
+from .cache import feed_cache_key, get_feed_page, invalidate_auth_user, ranking_cache_key, set_feed_page
+from .conditional import check_not_modified, make_etag, set_validators
+from .search import search_profiles
+from .instrumentation import timed
+from .metrics import photo_upload_bytes, photo_uploads, registry
+from .porutham import MAX_PORUTHAM, porutham_expression
+from .ranking import Ranker, get_ranked_page, get_ranking_weights
+from .sync import InvalidSyncToken, SyncTokenExpired, get_sync_data, is_sync_request
+from .images import is_image
+from .credits import InsufficientCredits, unlock_profiles
+from .jobs import enqueue_photos, enqueue_stored_photos
+from .direct_uploads import (
+    InvalidUpload, LocalUploadBackend, PHOTO_UPLOAD_MAX_SIZE, create_upload, get_upload_backend, verify_upload,
+)
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.generics import RetrieveAPIView
+from django.conf import settings
+from django.http import HttpResponse
+import hmac
 import os
 
 logger = logging.getLogger(__name__)
 
+
+def sync_response(request, queryset, scope, serializer_class, extra_queryset=None):
+    """Answer a ``?since=`` delta-sync request for a profile listing."""
+    def serialize(profiles):
+        with timed('serialize'):
+            return serializer_class(profiles, many=True, context={'request': request}).data
+
+    try:
+        data = get_sync_data(request, queryset, scope, serialize, extra_queryset)
+    except SyncTokenExpired as e:
+        return Response({'detail': str(e)}, status=status.HTTP_410_GONE)
+    except InvalidSyncToken as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(data)
+
+class FeedQuery:
+    """One feed request as built by ``ProfileViewSet.prepare_feed``."""
+
+    def __init__(self, queryset, serializer_class, selected_fields, candidate_gender, paginator, ranker, cache_params):
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self.selected_fields = selected_fields
+        self.candidate_gender = candidate_gender
+        self.paginator = paginator
+        self.ranker = ranker
+        # Feed cache key parameters; None when the page is not cached
+        self.cache_params = cache_params
+
+    def ranking_cache_key(self):
+        """Where the ranked candidates of a recommended feed are cached, shared by all its pages."""
+        if self.ranker is None or not self.cache_params:
+            return None
+        params = {
+            name: value for name, value in self.cache_params.items() if name not in ('fields', 'cursor', 'limit')
+        }
+        return ranking_cache_key(self.candidate_gender, **params)
+
+    def etag(self, page):
+        """
+        ETag of a page: which profiles are on it, how recently each changed
+        and the requested shape. Checked before serializing.
+
+        Feed pages have no ``Last-Modified``: a page also changes when
+        candidates join, leave or move between pages, which no timestamp of
+        the profiles left on it reflects.
+        """
+        return make_etag(
+            'feed', sorted(self.selected_fields), self.paginator.next_cursor,
+            [
+                (profile.pk, profile.updated_at, getattr(profile, 'porutham', None), getattr(profile, 'match_score', None))
+                for profile in page
+            ],
+        )
+
 # Create your views here.
 
 class RegisterView(APIView):
@@ -24,12 +101,12 @@ class RegisterView(APIView):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            logger.info(f"User '{user.username}' created successfully.")
+            logger.info("User '%s' created successfully.", user.username)
             return Response({
                 "user": UserSerializer(user, context=self.get_serializer_context()).data,
                 "message": "User Created Successfully. Now perform Login to get your token",
             }, status=status.HTTP_201_CREATED)
-        logger.error(f"User registration failed: {serializer.errors}")
+        logger.error("User registration failed: %s", serializer.errors)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def get_serializer(self, *args, **kwargs):
@@ -50,96 +127,298 @@ class LogoutView(APIView):
         try:
             refresh_token = request.data.get("refresh_token")
             if refresh_token:
-                token = RefreshToken(refresh_token)
+                token = RevocableRefreshToken(refresh_token)
                 token.blacklist()
+                invalidate_auth_user(token.payload.get('user_id'))
                 logger.info("User logged out successfully.")
                 return Response({"message": "Logout successful"}, status=status.HTTP_200_OK)
             else:
                 return Response({"error": "Refresh token required"}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            logger.error(f"Logout failed: {str(e)}")
+            logger.error("Logout failed: %s", e)
             return Response({"error": "Invalid token"}, status=status.HTTP_400_BAD_REQUEST)
 
 class ProfileViewSet(viewsets.ModelViewSet):
     serializer_class = ProfileSerializer
     permission_classes = [IsAuthenticated]
+    # ?order= values for the feed; the default is closest age first
+    feed_orderings = ('compatibility', 'recommended')
 
     def get_queryset(self):
-        logger.debug(f"Fetching profiles, excluding user '{self.request.user.username}'")
+        logger.debug("Fetching profiles, excluding user '%s'", self.request.user.username)
         # Optimize queryset with select_related and prefetch_related
         return Profile.objects.exclude(user=self.request.user).select_related('user').prefetch_related('photos')
 
+    def get_serializer_class(self):
+        # The feed sends compact cards; ?expand= / ?fields= add the rest
+        if self.action in ('list', 'search'):
+            return ProfileCardSerializer
+        return ProfileSerializer
+
     def get_object(self):
-        logger.debug(f"Fetching or creating profile for user '{self.request.user.username}'")
+        logger.debug("Fetching or creating profile for user '%s'", self.request.user.username)
+        # Usually already attached to the user by the authentication cache
+        try:
+            return self.request.user.profile
+        except Profile.DoesNotExist:
+            pass
         profile, created = Profile.objects.get_or_create(user=self.request.user)
         if created:
-            logger.info(f"New profile created for user '{self.request.user.username}'")
+            logger.info("New profile created for user '%s'", self.request.user.username)
         return profile
 
-    def list(self, request, *args, **kwargs):
-        logger.info("Listing user profiles with filters.")
-
+    def get_viewer_profile(self, request):
+        """
+        The caller's profile if it has what the match rules need (gender and
+        date of birth), else None.
+        """
         try:
             user_profile = request.user.profile
-            # Ensure the user has a date of birth to filter by
-            if user_profile.date_of_birth is None:
-                logger.warning(f"User {request.user.username} does not have a date of birth. Returning empty list.")
-                return Response([], status=status.HTTP_200_OK)
         except Profile.DoesNotExist:
-            logger.warning(f"User {request.user.username} does not have a profile. Returning empty list.")
-            return Response([], status=status.HTTP_200_OK)
-
-        # Start with a base queryset excluding the current user and profiles without a date of birth
-        # Use optimized queryset with select_related and prefetch_related
+            logger.warning("User %s does not have a profile. Returning empty list.", request.user.username)
+            return None
+        # Ensure the user has a date of birth to filter by
+        if user_profile.date_of_birth is None:
+            logger.warning("User %s does not have a date of birth. Returning empty list.", request.user.username)
+            return None
+        if not user_profile.gender:
+            # Return empty if gender is not set, as logic depends on it
+            logger.info("User %s has an incomplete profile. Skipping default gender/age filters.", request.user.username)
+            return None
+        return user_profile
+
+    def apply_match_rules(self, queryset, user_profile):
+        """
+        Apply gender and age filtering based on the user's profile. Returns
+        ``(queryset, candidate_gender, descending)``; the feed is ordered from
+        the closest age outwards, so ``descending`` follows the direction of
+        the date_of_birth range.
+        """
+        if user_profile.gender.lower() == 'male':
+            # Show younger females
+            queryset = queryset.filter(gender_key='female', date_of_birth__gt=user_profile.date_of_birth)
+            return queryset, 'female', False
+        if user_profile.gender.lower() == 'female':
+            # Show older males
+            queryset = queryset.filter(gender_key='male', date_of_birth__lt=user_profile.date_of_birth)
+            return queryset, 'male', True
+        return queryset, None, False
+
+    def apply_match_filters(self, queryset, request):
+        """
+        Additional filters from query parameters. Returns ``(queryset,
+        filters)`` with the normalized filter values.
+        """
+        filters = {
+            'caste': normalize_match_value(request.query_params.get('caste')),
+            'religion': normalize_match_value(request.query_params.get('religion')),
+            'mother_tongue': normalize_match_value(request.query_params.get('mother_tongue')),
+        }
+        # Filter on the normalized shadow columns so the composite indexes apply
+        for name, value in filters.items():
+            if value:
+                queryset = queryset.filter(**{Profile.MATCH_KEY_FIELDS[name]: value})
+        return queryset, filters
+
+    def apply_porutham(self, queryset, request, user_profile, candidate_gender):
+        """
+        ``?min_porutham=<0-10>`` / ``?order=compatibility``: score every
+        candidate against the viewer's nakshatram and raasi in the query.
+        Candidates whose horoscope is unknown are left out. Returns
+        ``(queryset, options)`` with ``options`` None when neither parameter
+        was given; raises ``ValueError`` with a message for the client.
+        """
+        order = request.query_params.get('order')
+        min_porutham = request.query_params.get('min_porutham') or None
+        if order != 'compatibility' and min_porutham is None:
+            return queryset, None
+
+        if min_porutham is not None:
+            try:
+                min_porutham = int(min_porutham)
+            except ValueError:
+                min_porutham = -1
+            if not 0 <= min_porutham <= MAX_PORUTHAM:
+                raise ValueError(f'min_porutham must be a number from 0 to {MAX_PORUTHAM}.')
+        if candidate_gender is None:
+            raise ValueError('Porutham scores are only available for male and female profiles.')
+        if user_profile.nakshatra_code is None or user_profile.raasi_code is None:
+            raise ValueError('Add your nakshatram and raasi to your profile to use porutham scores.')
+
+        score = porutham_expression(
+            user_profile.nakshatra_code, user_profile.raasi_code, viewer_is_bride=candidate_gender == 'male',
+        )
+        queryset = queryset.annotate(porutham=score).filter(porutham__isnull=False)
+        if min_porutham is not None:
+            queryset = queryset.filter(porutham__gte=min_porutham)
+        return queryset, {
+            'order': order if order == 'compatibility' else None,
+            'min_porutham': min_porutham,
+            'nakshatra': user_profile.nakshatra_code,
+            'raasi': user_profile.raasi_code,
+        }
+
+    def get_candidates(self, request, serializer_class):
+        """
+        Base queryset for feed-like listings: everyone but the current user
+        with a date of birth, reading only the columns the client asked for.
+        """
+        selected_fields = serializer_class.get_selected_fields(request)
         queryset = Profile.objects.exclude(user=request.user).filter(
             date_of_birth__isnull=False
-        ).select_related('user').prefetch_related('photos')
-
-        # Apply gender and age filtering based on the user's profile
-        if user_profile.gender:
-            if user_profile.gender.lower() == 'male':
-                # Show younger females
-                queryset = queryset.filter(gender__iexact='Female', date_of_birth__gt=user_profile.date_of_birth)
-            elif user_profile.gender.lower() == 'female':
-                # Show older males
-                queryset = queryset.filter(gender__iexact='Male', date_of_birth__lt=user_profile.date_of_birth)
+        ).only(*serializer_class.get_only_fields(selected_fields | {'date_of_birth', 'updated_at'}))
+        if 'photos' in selected_fields:
+            queryset = queryset.prefetch_related('photos')
+        return queryset, selected_fields
+
+    def prepare_feed(self, request):
+        """
+        Everything about a feed request that needs no I/O: the candidate
+        queryset, its pagination and ranking, and what shapes the cached
+        page. Shared by ``list`` and the async feed view. Returns a
+        ``Response`` instead when the request is answered without a query.
+        """
+        user_profile = self.get_viewer_profile(request)
+        if user_profile is None:
+            return Response({'next_cursor': None, 'results': []}, status=status.HTTP_200_OK)
+
+        serializer_class = self.get_serializer_class()
+        queryset, selected_fields = self.get_candidates(request, serializer_class)
+        queryset, candidate_gender, descending = self.apply_match_rules(queryset, user_profile)
+        queryset, filters = self.apply_match_filters(queryset, request)
+        order = request.query_params.get('order') or None
+        if order is not None and order not in self.feed_orderings:
+            return Response({'detail': f"order must be one of: {', '.join(self.feed_orderings)}."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            queryset, porutham = self.apply_porutham(queryset, request, user_profile, candidate_gender)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        ranker = None
+        if order == 'recommended':
+            # Scored in Python over the whole candidate set once per feed
+            # generation (see get_ranked_page); only the page is loaded
+            ranker = Ranker(user_profile, get_ranking_weights(user_profile))
+            paginator = KeysetPagination(keys=('match_score', 'id'), descending=True)
+        elif order == 'compatibility':
+            paginator = KeysetPagination(keys=('porutham', 'id'), descending=True)
         else:
-            logger.info(f"User {request.user.username} has an incomplete profile. Skipping default gender/age filters.")
-            # Return empty if gender is not set, as logic depends on it
-            return Response([], status=status.HTTP_200_OK)
+            paginator = KeysetPagination(keys=('date_of_birth', 'id'), descending=descending)
+
+        # Every viewer with the same gender, DOB and filters sees the same
+        # page, so it is shared through the cache until a candidate changes.
+        # Unrecognised genders see every candidate and are not cached.
+        cache_params = candidate_gender and dict(
+            viewer_gender=normalize_match_value(user_profile.gender),
+            viewer_dob=user_profile.date_of_birth,
+            fields=sorted(selected_fields),
+            cursor=request.query_params.get(paginator.cursor_query_param),
+            limit=paginator.get_limit(request),
+            porutham=porutham,
+            ranking=ranker and {
+                'weights': ranker.weights,
+                'viewer': [user_profile.height, user_profile.education, user_profile.city, user_profile.state],
+            },
+            **filters,
+        )
+        return FeedQuery(queryset, serializer_class, selected_fields, candidate_gender, paginator, ranker, cache_params)
+
+    def list(self, request, *args, **kwargs):
+        logger.info("Listing user profiles with filters.")
+        feed = self.prepare_feed(request)
+        if isinstance(feed, Response):
+            return feed
+
+        # ?since=<token>: only what changed in this feed after the token
+        if is_sync_request(request):
+            scope = Q(gender_key=feed.candidate_gender) if feed.candidate_gender else Q()
+            return sync_response(request, feed.queryset, scope, feed.serializer_class)
+
+        cache_key = feed.cache_params and feed_cache_key(feed.candidate_gender, **feed.cache_params)
+        cached = get_feed_page(cache_key) if cache_key else None
+        if cached is not None:
+            data, etag = cached
+            return check_not_modified(request, etag) or set_validators(Response(data), etag)
+
+        try:
+            if feed.ranker is not None:
+                with timed('rank'):
+                    page = get_ranked_page(
+                        feed.queryset, feed.ranker, feed.paginator, request, feed.ranking_cache_key(),
+                    )
+            else:
+                page = feed.paginator.paginate_queryset(feed.queryset, request)
+        except InvalidCursor as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        etag = feed.etag(page)
+        not_modified = check_not_modified(request, etag)
+        if not_modified:
+            return not_modified
+
+        with timed('serialize'):
+            data = feed.paginator.get_paginated_data(self.get_serializer(page, many=True).data)
+        if cache_key:
+            set_feed_page(cache_key, data, etag)
+        return set_validators(Response(data), etag)
+
+    def search(self, request, *args, **kwargs):
+        """
+        Full-text search over education, occupation, designation, city and
+        about, limited by the same match rules and filters as the feed and
+        ordered by relevance.
+        """
+        query = request.query_params.get('q', '')
+        user_profile = self.get_viewer_profile(request)
+        if user_profile is None:
+            return Response({'next_cursor': None, 'results': []}, status=status.HTTP_200_OK)
+
+        serializer_class = self.get_serializer_class()
+        queryset, selected_fields = self.get_candidates(request, serializer_class)
+        queryset, candidate_gender, descending = self.apply_match_rules(queryset, user_profile)
+        queryset, filters = self.apply_match_filters(queryset, request)
+        queryset = search_profiles(queryset, query)
+        if queryset is None:
+            return Response({'detail': 'A search query (q) is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        paginator = KeysetPagination(keys=('search_rank', 'id'), descending=True)
+        try:
+            page = paginator.paginate_queryset(queryset, request)
+        except InvalidCursor as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Additional filters from query parameters
-        caste = request.query_params.get('caste')
-        religion = request.query_params.get('religion')
-        mother_tongue = request.query_params.get('mother_tongue')
+        with timed('serialize'):
+            data = paginator.get_paginated_data(self.get_serializer(page, many=True).data)
+        return Response(data)
 
-        if caste:
-            queryset = queryset.filter(caste__iexact=caste)
-        if religion:
-            queryset = queryset.filter(religion__iexact=religion)
-        if mother_tongue:
-            queryset = queryset.filter(mother_tongue__iexact=mother_tongue)
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        selected_fields = self.get_serializer_class().get_selected_fields(request)
+        etag = make_etag('profile', instance.pk, instance.updated_at, sorted(selected_fields))
+        not_modified = check_not_modified(request, etag, instance.updated_at)
+        if not_modified:
+            return not_modified
 
-        logger.debug(f"Final filtered queryset count: {queryset.count()}")
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        with timed('serialize'):
+            data = self.get_serializer(instance).data
+        return set_validators(Response(data), etag, instance.updated_at)
 
     def perform_create(self, serializer):
-        logger.info(f"Creating profile for user '{self.request.user.username}'")
+        logger.info("Creating profile for user '%s'", self.request.user.username)
         serializer.save(user=self.request.user)
 
     def update(self, request, *args, **kwargs):
-        logger.info(f"Updating profile for user '{self.request.user.username}'")
-        logger.debug(f"Request data: {request.data}")
+        logger.info("Updating profile for user '%s'", self.request.user.username)
+        logger.debug("Request data: %s", request.data)
         partial = kwargs.pop('partial', True) # Always allow partial updates
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         if not serializer.is_valid():
-            logger.error(f"Profile update failed for user '{self.request.user.username}': {serializer.errors}")
+            logger.error("Profile update failed for user '%s': %s", self.request.user.username, serializer.errors)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         serializer.save()
-        logger.info(f"Profile updated successfully for user '{self.request.user.username}'")
+        logger.info("Profile updated successfully for user '%s'", self.request.user.username)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -152,19 +431,116 @@ class PhotoUploadView(APIView):
         images = request.FILES.getlist('photo')
 
         if not images:
-            logger.warning(f"Photo upload failed for user '{request.user.username}': No images provided.")
+            logger.warning("Photo upload failed for user '%s': No images provided.", request.user.username)
             return Response({'error': 'No images provided'}, status=status.HTTP_400_BAD_REQUEST)
 
         # Basic validation
         if len(images) > 3:
-            logger.warning(f"Photo upload failed for user '{request.user.username}': Too many images.")
+            logger.warning("Photo upload failed for user '%s': Too many images.", request.user.username)
             return Response({'error': 'You can upload a maximum of 3 images.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        for image in images:
-            Photo.objects.create(profile=profile, image=image)
-        
-        logger.info(f"{len(images)} photos uploaded successfully for user '{request.user.username}'.")
-        return Response({'message': 'Photos uploaded successfully'}, status=status.HTTP_201_CREATED)
+        if not all(is_image(image) for image in images):
+            logger.warning("Photo upload failed for user '%s': Invalid image.", request.user.username)
+            return Response({'error': 'Uploaded file is not a valid image.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Only spool the files here; resizing and the storage upload happen
+        # in the process_photo_jobs worker, off the request path
+        photos = enqueue_photos(profile, images)
+        photo_uploads.inc(len(images), path='multipart')
+        photo_upload_bytes.inc(sum(image.size for image in images), path='multipart')
+
+        logger.info("%d photos queued for user '%s'.", len(images), request.user.username)
+        return Response({
+            'message': 'Photos uploaded successfully and are being processed',
+            'photos': [{'id': photo.id, 'status': photo.status} for photo in photos],
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class PhotoUploadTargetView(APIView):
+    """
+    Step one of a direct upload: issue presigned targets so the client sends
+    image bytes straight to storage instead of through this server.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        try:
+            count = int(request.data.get('count', 1))
+        except (TypeError, ValueError):
+            count = 0
+        if not 1 <= count <= 3:
+            return Response({'error': 'You can upload between 1 and 3 images.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        targets = [create_upload(request.user, request) for _ in range(count)]
+        return Response({'uploads': targets}, status=status.HTTP_200_OK)
+
+
+class PhotoUploadConfirmView(APIView):
+    """
+    Step two of a direct upload: register the uploaded objects as photos and
+    queue them for processing.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        upload_ids = request.data.get('upload_ids')
+        if not isinstance(upload_ids, list) or not 1 <= len(upload_ids) <= 3:
+            return Response({'error': 'Provide between 1 and 3 upload_ids.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not all(isinstance(upload_id, str) and upload_id for upload_id in upload_ids):
+            return Response({'error': 'Invalid or expired upload id.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            names = [verify_upload(request.user, upload_id) for upload_id in upload_ids]
+        except InvalidUpload as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if len(set(names)) != len(names) or Photo.objects.filter(upload_name__in=names).exists():
+            return Response({'error': 'Upload already confirmed.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            photos = enqueue_stored_photos(request.user.profile, names)
+        except IntegrityError:
+            # The unique upload name: confirmed by a concurrent request
+            return Response({'error': 'Upload already confirmed.'}, status=status.HTTP_400_BAD_REQUEST)
+        photo_uploads.inc(len(photos), path='direct')
+
+        logger.info("%d direct uploads confirmed for user '%s'.", len(photos), request.user.username)
+        return Response({
+            'message': 'Photos uploaded successfully and are being processed',
+            'photos': [{'id': photo.id, 'status': photo.status} for photo in photos],
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class LocalUploadView(APIView):
+    """
+    Filesystem stand-in for the S3 presigned POST endpoint, used when media
+    is stored locally. The signed token in the form takes the place of the
+    S3 policy signature.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        backend = get_upload_backend()
+        if not isinstance(backend, LocalUploadBackend):
+            return Response({'error': 'Direct uploads go to the storage bucket.'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            name = backend.read_token(request.data.get('token', ''))
+        except InvalidUpload as e:
+            return Response({'error': str(e)}, status=status.HTTP_403_FORBIDDEN)
+
+        upload = request.FILES.get('file')
+        if upload is None or not 0 < upload.size <= PHOTO_UPLOAD_MAX_SIZE:
+            max_mb = PHOTO_UPLOAD_MAX_SIZE // (1024 * 1024)
+            return Response({'error': f'A file of at most {max_mb} MB is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        if backend.storage.exists(name):
+            return Response({'error': 'Upload already received.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        backend.storage.save(name, upload)
+        # Direct uploads to S3 never pass through here, so only these count
+        photo_upload_bytes.inc(upload.size, path='direct')
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class ProfileDetailView(APIView):
@@ -173,24 +549,47 @@ class ProfileDetailView(APIView):
     """
     permission_classes = [IsAuthenticated]
 
-    def get(self, request, pk):
-        # Check if the user has unlocked this profile
-        has_unlocked = CreditTransaction.objects.filter(
-            user=request.user,
-            profile_unlocked_id=pk,
-            action='unlock'
-        ).exists()
-
-        if not has_unlocked:
-            return Response({'detail': 'You have not unlocked this profile.'}, status=status.HTTP_403_FORBIDDEN)
+    @staticmethod
+    def get_unlocks(request):
+        return CreditTransaction.objects.filter(user=request.user, action='unlock')
+
+    @classmethod
+    def get_profile_queryset(cls, request):
+        """``(queryset, selected_fields)``; profiles are annotated with ``has_unlocked``."""
+        # The unlock check rides along with the profile fetch as an EXISTS
+        # subquery, and photos are only loaded once access is granted
+        has_unlocked = cls.get_unlocks(request).filter(profile_unlocked=OuterRef('pk'))
+        selected_fields = ProfileDetailSerializer.get_selected_fields(request)
+        queryset = Profile.objects.annotate(has_unlocked=Exists(has_unlocked)).only(
+            *ProfileDetailSerializer.get_only_fields(selected_fields | {'updated_at'})
+        )
+        return queryset, selected_fields
 
+    def get(self, request, pk):
+        queryset, selected_fields = self.get_profile_queryset(request)
         try:
-            profile = Profile.objects.get(pk=pk)
-            serializer = ProfileDetailSerializer(profile)
-            return Response(serializer.data)
+            profile = queryset.get(pk=pk)
         except Profile.DoesNotExist:
+            # 403 as for any profile not unlocked, so the answer never tells
+            # which ids exist; 404 only for an unlocked profile since deleted
+            if not self.get_unlocks(request).filter(profile_unlocked_id=pk).exists():
+                return Response({'detail': 'You have not unlocked this profile.'}, status=status.HTTP_403_FORBIDDEN)
             return Response({'detail': 'Profile not found.'}, status=status.HTTP_404_NOT_FOUND)
 
+        if not profile.has_unlocked:
+            return Response({'detail': 'You have not unlocked this profile.'}, status=status.HTTP_403_FORBIDDEN)
+
+        etag = make_etag('profile-detail', profile.pk, profile.updated_at, sorted(selected_fields))
+        not_modified = check_not_modified(request, etag, profile.updated_at)
+        if not_modified:
+            return not_modified
+
+        if 'photos' in selected_fields:
+            prefetch_related_objects([profile], 'photos')
+        with timed('serialize'):
+            data = ProfileDetailSerializer(profile, context={'request': request}).data
+        return set_validators(Response(data), etag, profile.updated_at)
+
 
 class UnlockedProfileListView(APIView):
     """
@@ -198,23 +597,45 @@ class UnlockedProfileListView(APIView):
     """
     permission_classes = [IsAuthenticated]
 
+    @staticmethod
+    def get_unlocked_queryset(request):
+        # One query joins the user's unlock transactions to the profiles,
+        # newest unlock first; the unique unlock constraint guarantees one
+        # row per profile. Photos come from a single prefetch query.
+        selected_fields = UnlockedProfileSerializer.get_selected_fields(request)
+        queryset = Profile.objects.filter(
+            unlocked_by__user=request.user,
+            unlocked_by__action='unlock',
+        ).annotate(
+            unlocked_at=F('unlocked_by__transaction_date'),
+        ).only(*UnlockedProfileSerializer.get_only_fields(selected_fields))
+        if 'photos' in selected_fields:
+            queryset = queryset.prefetch_related('photos')
+        return queryset
+
     def get(self, request):
-        # Get the IDs of profiles unlocked by the user
-        unlocked_profile_ids = CreditTransaction.objects.filter(
-            user=request.user,
-            action='unlock'
-        ).order_by('-transaction_date').values_list('profile_unlocked_id', flat=True)
-
-        # Fetch the profiles with optimization
-        unlocked_profiles = Profile.objects.filter(
-            pk__in=list(unlocked_profile_ids)
-        ).select_related('user').prefetch_related('photos')
-        
-        # We need to preserve the order from the transaction log
-        preserved_order_profiles = sorted(unlocked_profiles, key=lambda p: list(unlocked_profile_ids).index(p.pk))
+        queryset = self.get_unlocked_queryset(request)
+
+        # ?since=<token>: changes to unlocked profiles plus new unlocks. The
+        # unlock rows outlive a deleted profile, so its deletion is in scope.
+        if is_sync_request(request):
+            unlocked_ids = CreditTransaction.objects.filter(
+                user=request.user, action='unlock',
+            ).values('profile_unlocked_id')
+            return sync_response(
+                request, queryset, Q(profile_id__in=unlocked_ids), UnlockedProfileSerializer,
+                extra_queryset=lambda since: queryset.filter(unlocked_at__gte=since),
+            )
+
+        paginator = KeysetPagination(keys=('unlocked_at', 'id'), descending=True)
+        try:
+            page = paginator.paginate_queryset(queryset, request)
+        except InvalidCursor as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = UnlockedProfileSerializer(preserved_order_profiles, many=True)
-        return Response(serializer.data)
+        with timed('serialize'):
+            data = paginator.get_paginated_data(UnlockedProfileSerializer(page, many=True, context={'request': request}).data)
+        return Response(data)
 
 
 class UnlockProfileView(APIView):
@@ -225,42 +646,75 @@ class UnlockProfileView(APIView):
 
     def post(self, request, pk):
         try:
-            profile_to_unlock = Profile.objects.get(pk=pk)
-        except Profile.DoesNotExist:
-            return Response({'detail': 'Profile not found.'}, status=status.HTTP_404_NOT_FOUND)
-
-        # Check if user has enough credits
-        if request.user.credits < 1:
+            unlocked, already_unlocked, not_found = unlock_profiles(request.user, [pk])
+        except InsufficientCredits:
             return Response({'detail': 'Insufficient credits. You need at least 1 credit to unlock a profile.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Check if the profile is already unlocked to prevent duplicate transactions
-        if CreditTransaction.objects.filter(user=request.user, profile_unlocked=profile_to_unlock, action='unlock').exists():
+        if not_found:
+            return Response({'detail': 'Profile not found.'}, status=status.HTTP_404_NOT_FOUND)
+        if already_unlocked:
             return Response({'detail': 'Profile already unlocked.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Deduct credits from user balance
-        request.user.credits -= 1
-        request.user.save()
-
-        # Create the transaction record
-        CreditTransaction.objects.create(
-            user=request.user,
-            profile_unlocked=profile_to_unlock,
-            action='unlock',
-            credits_spent=1
-        )
-
         return Response({
             'detail': 'Profile unlocked successfully.',
             'remaining_credits': request.user.credits
         }, status=status.HTTP_200_OK)
 
 
+class BatchUnlockProfileView(APIView):
+    """
+    Unlock several profiles in one transaction. Either all of the profiles
+    that are not yet unlocked are charged for and unlocked, or none are.
+    """
+    permission_classes = [IsAuthenticated]
+    max_batch_size = 50
+
+    def post(self, request):
+        profile_ids = request.data.get('profile_ids')
+        if (
+            not isinstance(profile_ids, list) or not 1 <= len(profile_ids) <= self.max_batch_size
+            or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in profile_ids)
+        ):
+            return Response({'detail': f'profile_ids must be a list of 1 to {self.max_batch_size} profile ids.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            unlocked, already_unlocked, not_found = unlock_profiles(request.user, profile_ids)
+        except InsufficientCredits as e:
+            return Response({'detail': f'Insufficient credits. You need {e.args[0]} credits to unlock these profiles.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info("User '%s' unlocked %d profiles in a batch.", request.user.username, len(unlocked))
+        return Response({
+            'unlocked': unlocked,
+            'already_unlocked': already_unlocked,
+            'not_found': not_found,
+            'remaining_credits': request.user.credits,
+        }, status=status.HTTP_200_OK)
+
+
 class UserDetailView(RetrieveAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
 
+class MetricsView(APIView):
+    """
+    Metrics of all workers in the Prometheus text format. Scrapers
+    authenticate with ``Authorization: Bearer <METRICS_TOKEN>``; without a
+    configured token the endpoint does not exist.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request):
+        token = getattr(settings, 'METRICS_TOKEN', None)
+        if not token:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        if not hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+            return Response({'detail': 'Invalid metrics token.'}, status=status.HTTP_401_UNAUTHORIZED)
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 class DebugEnvironmentView(APIView):
     """
     Debug endpoint to check environment variables (without exposing sensitive data)
@@ -0,0 +1,113 @@
+"""
+Start-up work for the gunicorn hooks in gunicorn.conf.py.
+
+With ``preload_app`` the master imports the app once, then runs
+``warm_master`` to build everything that is safe to share: imports, the URL
+configuration, image plugins, the porutham tables and the revocation
+filter. Forked workers inherit all of it copy-on-write, so a new or
+recycled worker starts serving in milliseconds. Connections are not shared
+across a fork: the master closes its own before forking, and every worker
+opens its database connection, cache connection and storage client in
+``warm_worker`` before it accepts requests.
+
+A failing step is logged and skipped; warm-up never stops a worker from
+starting.
+"""
+import logging
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+
+def _run(stage, steps):
+    started = perf_counter()
+    for name, step in steps:
+        step_started = perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.warning('%s warm-up: %s failed', stage, name, exc_info=True)
+            continue
+        logger.debug('%s warm-up: %s in %.0f ms', stage, name, (perf_counter() - step_started) * 1000)
+    logger.info('%s warm-up done in %.0f ms', stage, (perf_counter() - started) * 1000)
+
+
+def load_urls():
+    # Imports every view module, and with them serializers, storage and DRF
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+
+
+def load_image_plugins():
+    from PIL import Image
+
+    Image.init()
+
+
+def build_porutham_tables():
+    from .porutham import nakshatra_table, raasi_table
+
+    nakshatra_table()
+    raasi_table()
+
+
+def load_revocations():
+    from .revocation import index
+
+    index.sync()
+
+
+def connect_database():
+    from django.db import connections
+
+    for conn in connections.all():
+        conn.ensure_connection()
+
+
+def connect_cache():
+    # Also fetches the generations every feed and authenticated request reads
+    from . import revocation
+    from .cache import get_generation
+
+    for gender_key in ('male', 'female'):
+        get_generation(gender_key)
+    revocation.get_generation()
+
+
+def build_storage_client():
+    from .models import Photo
+
+    storage = Photo._meta.get_field('image').storage
+    # S3 storage creates its boto3 session, client and bucket on first use;
+    # the service model it loads is what makes the first upload slow
+    if hasattr(storage, 'bucket'):
+        storage.bucket.meta.client
+
+
+def close_connections():
+    """Close what the master opened, so no socket is shared with a worker."""
+    from django.core.cache import caches
+    from django.db import connections
+
+    connections.close_all()
+    for cache in caches.all(initialized_only=True):
+        cache.close()
+
+
+def warm_master():
+    _run('Master', [
+        ('URLs and views', load_urls),
+        ('image plugins', load_image_plugins),
+        ('porutham tables', build_porutham_tables),
+        ('revoked tokens', load_revocations),
+    ])
+    close_connections()
+
+
+def warm_worker():
+    _run('Worker', [
+        ('database', connect_database),
+        ('cache', connect_cache),
+        ('storage client', build_storage_client),
+    ])
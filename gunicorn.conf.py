@@ -0,0 +1,58 @@
+"""
+gunicorn settings, read automatically when started from this directory:
+
+    gunicorn vivaham_backend.wsgi:application
+
+The app is imported once in the master (``preload_app``) and warmed there,
+then forked, so workers start, restart after ``max_requests`` and scale
+out without paying for Django's start-up again. See api/warmup.py.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+preload_app = True
+# Recycle workers now and then, staggered, to bound any slow leak
+max_requests = 5000
+max_requests_jitter = 500
+accesslog = None
+
+
+def on_starting(server):
+    # The app is loaded by now; hooks import from it lazily, since this
+    # file is read before the project is on sys.path. Metrics start from
+    # zero with the master, not from the last run's workers
+    from api.metrics import registry
+
+    registry.clear()
+
+
+def when_ready(server):
+    from api.warmup import warm_master
+
+    warm_master()
+
+
+def pre_fork(server, worker):
+    # Nothing the master opened after warming up may reach a worker
+    from api.warmup import close_connections
+
+    close_connections()
+
+
+def post_fork(server, worker):
+    from api.metrics import registry
+    from api.warmup import warm_worker
+
+    registry.flush_at_exit()
+    warm_worker()
+
+
+def child_exit(server, worker):
+    # Keep the exited worker's counts, in the archive, and drop its file
+    from api.metrics import registry
+
+    registry.mark_process_dead(worker.pid)
@@ -0,0 +1,23 @@
+"""
+gunicorn settings for serving the API over ASGI, next to the WSGI setup:
+
+    gunicorn -c gunicorn_asgi.conf.py vivaham_backend.asgi:application
+
+Each uvicorn worker runs an event loop, so one process keeps serving while
+requests wait on Postgres, the cache or S3; add workers for CPU, not for
+concurrency. Queries still run in threads, one connection per in-flight
+request, so put PgBouncer in front of Postgres.
+
+Everything else, preloading and the warm-up hooks included, is shared with
+gunicorn.conf.py.
+"""
+import os
+import runpy
+
+globals().update(
+    (name, value)
+    for name, value in runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py')).items()
+    if not name.startswith('__')
+)
+
+worker_class = 'uvicorn_worker.UvicornWorker'
@@ -83,6 +83,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'vivaham_backend.wsgi.application'
+# Async feed, profile detail, unlocked list and user detail views (see
+# api/async_views.py); set by vivaham_backend/asgi.py, so WSGI workers keep
+# the sync DRF views
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS') == '1'
 
 
 # Database
@@ -97,6 +101,10 @@ if DATABASE_URL:
             conn_health_checks=True,
         )
     }
+    if ASYNC_READ_VIEWS:
+        # Under ASGI each request runs its queries in a thread of its own,
+        # so persistent connections would pile up; pool them in PgBouncer
+        DATABASES['default']['CONN_MAX_AGE'] = 0
 else:
     DATABASES = {
         'default': {
@@ -188,15 +196,19 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'if-modified-since',
+    'if-none-match',
     'origin',
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
 ]
+# Let browser clients read the validators for conditional requests
+CORS_EXPOSE_HEADERS = ['etag', 'last-modified', 'server-timing', 'x-request-id']
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -223,6 +235,9 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    # Refresh tokens are revoked through api/revocation.py
+    'TOKEN_OBTAIN_SERIALIZER': 'api.serializers.RevocableTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'api.serializers.RevocableTokenRefreshSerializer',
 }
 
 # Performance optimizations
@@ -230,13 +245,65 @@ CONN_MAX_AGE = 600  # Database connection pooling
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB max upload size
 
 # Caching configuration
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-        'TIMEOUT': 300,  # 5 minutes
+# The cache must be shared by all gunicorn workers, otherwise each worker
+# keeps its own cold copy and feed invalidation only reaches one of them.
+# Use Redis when REDIS_URL is set, else a file-based cache on local disk.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'TIMEOUT': 300,  # 5 minutes
+        }
     }
-}
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR', os.path.join(BASE_DIR, '.cache')),
+            'TIMEOUT': 300,  # 5 minutes
+        }
+    }
+
+# Raw uploads wait here for the process_photo_jobs worker (see api/jobs.py).
+# Must be shared between the web and worker processes.
+PHOTO_SPOOL_ROOT = os.environ.get('PHOTO_SPOOL_ROOT', os.path.join(BASE_DIR, 'spool'))
+PHOTO_JOB_MAX_ATTEMPTS = 5
+PHOTO_JOB_RETRY_DELAY = 10  # seconds, doubled after every failed attempt
+
+# Metrics served on /metrics (see api/metrics.py). Each worker writes its
+# snapshot to METRICS_DIR, which must be shared by all workers on the host;
+# gunicorn.conf.py empties it when the master starts.
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(BASE_DIR, '.metrics'))
+# Bearer token the Prometheus scraper sends; /metrics is disabled without it
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Direct-to-storage uploads (see api/direct_uploads.py)
+PHOTO_UPLOAD_MAX_SIZE = 10 * 1024 * 1024  # 10MB
+PHOTO_UPLOAD_EXPIRY = 15 * 60  # seconds a presigned target stays valid
+
+# Delta sync (see api/sync.py); prune with manage.py prune_profile_changes
+SYNC_BATCH_SIZE = 500
+SYNC_RETENTION_DAYS = 30
+SYNC_OVERLAP_SECONDS = 60
+
+# Match feed pages (see api/cache.py)
+FEED_CACHE_ALIAS = 'default'
+FEED_CACHE_TIMEOUT = 300
+# Best candidates kept per ?order=recommended feed, which pages slice (see api/ranking.py)
+RANKING_CACHE_SIZE = 1000
+# Authenticated user + profile, looked up by CachedJWTAuthentication
+AUTH_CACHE_ALIAS = 'default'
+AUTH_CACHE_TIMEOUT = 60
+# Per-process Bloom filter of revoked refresh tokens (see api/revocation.py);
+# run prune_revoked_tokens periodically to drop the expired ones
+REVOCATION_FILTER_CAPACITY = 100_000
+REVOCATION_FILTER_ERROR_RATE = 0.01
+
+# Entries between per-user balance snapshots in the credit ledger (see
+# api/credits.py); run reconcile_credits periodically to audit balances
+CREDIT_SNAPSHOT_INTERVAL = 100
 
 # TEMPORARY AWS S3 Storage settings - DELETE IAM USER AFTER TESTING
 # WARNING: This is a security risk - remove immediately after testing
@@ -36,6 +36,14 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 # Whitenoise for static files
 MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
+
+# Per-request query count, SQL/serializer/auth time as Server-Timing headers,
+# plus a warning with the slowest queries for requests over the threshold.
+# First, so its total covers the rest of the middleware.
+MIDDLEWARE.insert(0, 'api.middleware.RequestTimingMiddleware')
+SLOW_REQUEST_THRESHOLD_MS = int(os.environ.get('SLOW_REQUEST_THRESHOLD_MS', 500))
+# Per-view request/latency/query metrics for /metrics; reuses the timings above
+MIDDLEWARE.insert(1, 'api.middleware.MetricsMiddleware')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 # CORS settings for production
@@ -67,20 +75,34 @@ SIMPLE_JWT.update({
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
 })
 
-# Logging for production - simplified for Heroku (override settings.py)
+# Logging for production (override settings.py): JSON lines written by a
+# background thread (see api/log.py), so requests never wait on log output.
+# Every line carries the request's id; only LOG_DEBUG_SAMPLE_RATE of the
+# requests keep their debug lines when LOG_LEVEL=DEBUG.
+MIDDLEWARE.insert(0, 'api.middleware.RequestIdMiddleware')
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {
+            '()': 'api.log.RequestIdFilter',
+        },
+        'sample_debug': {
+            '()': 'api.log.SampleFilter',
+            'rate': float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.1)),
+        },
+    },
     'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
-            'style': '{',
+        'json': {
+            '()': 'api.log.JSONFormatter',
         },
     },
     'handlers': {
         'console': {
-            'class': 'logging.StreamHandler',
-            'formatter': 'verbose',
+            '()': 'api.log.BackgroundHandler',
+            'formatter': 'json',
+            'filters': ['request_id', 'sample_debug'],
         },
     },
     'root': {
@@ -95,7 +117,7 @@ LOGGING = {
         },
         'api': {
             'handlers': ['console'],
-            'level': 'INFO',
+            'level': LOG_LEVEL,
             'propagate': False,
         },
     },